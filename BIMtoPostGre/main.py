@@ -60,6 +60,17 @@ def upsert_element(cur, data):
         data['max_x'], data['max_y'], data['max_z']
     ))
 
+def camera_geometry_installed(cur):
+    # camera_object_geometry and its triggers exist once the pipeline's SQL
+    # functions were installed ("python db_utils.py", never done here)
+    cur.execute("SELECT to_regprocedure('sr_refresh_camera_geometry(integer)') IS NOT NULL;")
+    return cur.fetchone()[0]
+
+def refresh_camera_geometry(cur):
+    # Rebuild the per-camera geometry of the re-ingested objects
+    cur.execute("SELECT sr_refresh_camera_geometry(NULL);")
+    print(f"Refreshed camera geometry ({cur.fetchone()[0]} rows)")
+
 def extract_and_upload(ifc_path, db_params):
     # Open IFC and set up world‐coords geometry
     ifc = ifcopenshell.open(ifc_path)
@@ -71,6 +82,11 @@ def extract_and_upload(ifc_path, db_params):
     cur = conn.cursor()
     init_table(cur)
 
+    has_camera_geometry = camera_geometry_installed(cur)
+    if has_camera_geometry:
+        # one refresh at the end instead of the per-row trigger on every upsert
+        cur.execute(f"ALTER TABLE {TABLE_NAME} DISABLE TRIGGER object_geometry_refresh;")
+
     # Iterate IfcProduct elements
     for elem in ifc.by_type("IfcProduct"):
         if not getattr(elem, 'Representation', None):
@@ -111,6 +127,9 @@ def extract_and_upload(ifc_path, db_params):
         ))
         print("-" * 60)
 
+    if has_camera_geometry:
+        cur.execute(f"ALTER TABLE {TABLE_NAME} ENABLE TRIGGER object_geometry_refresh;")
+        refresh_camera_geometry(cur)
     conn.commit()
     cur.close()
     conn.close()
@@ -0,0 +1,142 @@
+﻿"""
+Check and time the vectorised box distance kernel (spatial_engine/kernels.py)
+against the exact distance of the bbox surfaces, on the validation exports.
+
+near_far.sql measures ST_3DDistance between the two MULTIPOLYGONZ bboxes,
+i.e. the smallest distance between any two of their faces.  The faces are
+axis-aligned rectangles, so the exact value is the minimum over the 6 × 6
+face pairs of the gap between the faces; the script computes it from the
+parsed polygons and compares it with the kernel on every ordered pair, then
+compares the near/far (--threshold) and touch (--touch) flags.
+
+With --db the same comparison is made against flags/near_far.sql itself on a
+sample of pairs (the database in config.DB_CONFIG must hold the exported
+model).
+
+    python benchmarks/bench_box_distance.py validation/room1-r2m_db_full_data.csv
+"""
+import argparse
+import csv
+import random
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from spatial_engine.graph import TOUCH_TOLERANCE
+from spatial_engine.kernels import distance_blocks, within_distance
+from spatial_engine.snapshot import ModelSnapshot
+from spatial_engine.wkb import read_polygons
+
+DEFAULT_CSVS = [
+    "validation/room1-r2m_db_full_data.csv",
+    "validation/room2-r2m-room-objects-bbox.csv",
+]
+
+
+def face_boxes(path: Path) -> List[np.ndarray]:
+    """Per object (in id order), the (6, 6) boxes of its faces."""
+    with open(path, newline="", encoding="utf-8") as f:
+        rows = sorted(csv.DictReader(f), key=lambda r: int(r["id"]))
+    faces = []
+    for r in rows:
+        polys = read_polygons(r["bbox"])
+        faces.append(np.array([np.concatenate([p.min(axis=0), p.max(axis=0)]) for p in polys]))
+    return faces
+
+
+def exact_distances(faces: List[np.ndarray]) -> np.ndarray:
+    """Minimum gap between any face of object i and any face of object j."""
+    n = len(faces)
+    all_faces = np.concatenate(faces)
+    owner = np.repeat(np.arange(n), [len(f) for f in faces])
+    lo, hi = all_faces[:, :3], all_faces[:, 3:]
+    gap = np.maximum(np.maximum(lo[None, :, :] - hi[:, None, :], lo[:, None, :] - hi[None, :, :]), 0)
+    face_dist = np.sqrt((gap ** 2).sum(axis=2))
+
+    out = np.full((n, n), np.inf)
+    np.minimum.at(out, (owner[:, None].repeat(len(owner), 1), owner[None, :].repeat(len(owner), 0)), face_dist)
+    return out
+
+
+def check_model(path: Path, threshold: float, touch: float, tile: int, repeats: int) -> ModelSnapshot:
+    snapshot = ModelSnapshot.from_csv(path)
+    faces = face_boxes(path)
+    flat = [(f[:, 3:] - f[:, :3] == 0).any(axis=1).all() for f in faces]
+    print(f"{path}: {len(snapshot)} objects, {sum(flat)} with axis-aligned faces only")
+
+    n = len(snapshot)
+    kernel = np.empty((n, n))
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for r0, c0, block in distance_blocks(snapshot.boxes, snapshot.boxes, tile, tile):
+            kernel[r0:r0 + block.shape[0], c0:c0 + block.shape[1]] = block
+        best = min(best, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    exact = exact_distances(faces)
+    exact_time = time.perf_counter() - start
+
+    off = ~np.eye(n, dtype=bool)
+    diff = np.abs(kernel - exact)[off]
+    flags_k = within_distance(kernel[off], threshold, touch)
+    flags_e = within_distance(exact[off], threshold, touch)
+    print(f"  pairs            {off.sum()}")
+    print(f"  kernel           {1000 * best:.2f} ms ({1e9 * best / off.sum():.1f} ns/pair)")
+    print(f"  face reference   {1000 * exact_time:.2f} ms")
+    print(f"  max |diff|       {diff.max():.3e}")
+    for name, k, e in zip(("touches", "near", "far"), flags_k, flags_e):
+        print(f"  {name:<8} {int(e.sum()):>7} pairs, {int((k != e).sum())} disagree")
+    return snapshot
+
+
+def check_db(snapshot: ModelSnapshot, threshold: float, n_pairs: int, seed: int) -> None:
+    from db_utils import get_connection, load_query, run_query
+
+    sql_text = load_query(Path(__file__).resolve().parent.parent / "sql" / "flags" / "near_far.sql")
+    rng = random.Random(seed)
+    ids = snapshot.ids.tolist()
+    pairs = [tuple(rng.sample(ids, 2)) for _ in range(n_pairs)]
+
+    conn = get_connection()
+    try:
+        worst, flips = 0.0, 0
+        for a, b in pairs:
+            dist, is_near, _ = run_query(conn, sql_text, (a, b, threshold))[0]
+            d = distance_blocks(snapshot.boxes_of([a]), snapshot.boxes_of([b]))
+            k = float(next(d)[2][0, 0])
+            worst = max(worst, abs(k - dist))
+            flips += (k < threshold) != bool(is_near)
+        print(f"  near_far.sql     {len(pairs)} pairs, max |diff| {worst:.3e}, {flips} near/far flags disagree")
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("csv", nargs="*", default=DEFAULT_CSVS, help="room_objects exports (default: validation CSVs)")
+    parser.add_argument("--threshold", type=float, default=1.0, help="near/far threshold in metres")
+    parser.add_argument("--touch", type=float, default=TOUCH_TOLERANCE, help="touch tolerance in metres")
+    parser.add_argument("--tile", type=int, default=64, help="rows and columns per distance block")
+    parser.add_argument("--repeats", type=int, default=3, help="kernel runs, best is kept")
+    parser.add_argument("--db", action="store_true", help="also compare with flags/near_far.sql")
+    parser.add_argument("--pairs", type=int, default=200, help="sampled pairs for --db")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    root = Path(__file__).resolve().parent.parent
+    for name in args.csv:
+        path = Path(name) if Path(name).is_absolute() else root / name
+        snapshot = check_model(path, args.threshold, args.touch, args.tile, args.repeats)
+        if args.db:
+            check_db(snapshot, args.threshold, args.pairs, args.seed)
+        print()
+
+
+if __name__ == "__main__":
+    main()
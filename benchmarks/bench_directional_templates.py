@@ -0,0 +1,109 @@
+﻿"""
+Micro-benchmark of the six directional templates in their three flavours:
+
+  text   : sql/<rel>.sql         (metrics, flag and relation text)
+  flags  : sql/flags/<rel>.sql   (metrics and flag)
+  exists : sql/exists/<rel>.sql  (boolean EXISTS only, double precision)
+
+Every flavour is run on the same sample of object pairs against the database
+in config.DB_CONFIG; the script reports the time per call and checks that the
+three flavours agree on every flag.
+
+    python benchmarks/bench_directional_templates.py --camera 1 --pairs 200
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from db_utils import TEMPLATE_MODE_DIRS, get_connection, load_query, run_query
+
+DIRECTIONALS = ["front", "behind", "left", "right", "above", "below"]
+MODES = ["text", "flags", "exists"]
+
+
+def _flag(mode: str, row: tuple) -> bool:
+    # text/flags: (metric, metric, metric, flag, ...); exists: (flag,)
+    return bool(row[0]) if mode == "exists" else bool(row[3])
+
+
+def sample_pairs(conn, n_pairs: int, seed: int) -> List[Tuple[int, int]]:
+    ids = [r[0] for r in run_query(conn, "SELECT id FROM room_objects ORDER BY id")]
+    rng = random.Random(seed)
+    pairs = set()
+    while len(pairs) < min(n_pairs, len(ids) * (len(ids) - 1)):
+        a, b = rng.sample(ids, 2)
+        pairs.add((a, b))
+    return sorted(pairs)
+
+
+def bench_template(
+    conn,
+    rel: str,
+    pairs: List[Tuple[int, int]],
+    camera_id: int,
+    s: float,
+    tol: float,
+    repeats: int
+) -> Tuple[Dict[str, float], int]:
+    """Return (mode → ms per call, number of pairs where the flags disagree)."""
+    timings: Dict[str, float] = {}
+    flags: Dict[str, List[bool]] = {}
+    for mode in MODES:
+        sql_text = load_query(TEMPLATE_MODE_DIRS[mode] / f"{rel}.sql")
+        best = float("inf")
+        for _ in range(repeats):
+            mode_flags = []
+            start = time.perf_counter()
+            for x_id, y_id in pairs:
+                # above/below are called with the pair swapped, as in run_spatial_call
+                if rel in {"above", "below"}:
+                    x_id, y_id = y_id, x_id
+                rows = run_query(conn, sql_text, (x_id, y_id, camera_id, s, tol))
+                mode_flags.append(_flag(mode, rows[0]) if rows and rows[0][0] is not None else False)
+            best = min(best, time.perf_counter() - start)
+        timings[mode] = 1000.0 * best / max(len(pairs), 1)
+        flags[mode] = mode_flags
+
+    mismatches = sum(
+        1 for i in range(len(pairs))
+        if len({flags[mode][i] for mode in MODES}) > 1
+    )
+    return timings, mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--camera", type=int, default=1, help="camera id (default 1)")
+    parser.add_argument("--pairs", type=int, default=200, help="number of sampled object pairs")
+    parser.add_argument("--repeats", type=int, default=3, help="runs per flavour, best is kept")
+    parser.add_argument("--s", type=float, default=5, help="half-space scale factor")
+    parser.add_argument("--tol", type=float, default=0.1, help="padding tolerance in metres")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    conn = get_connection()
+    try:
+        pairs = sample_pairs(conn, args.pairs, args.seed)
+        print(f"{len(pairs)} pairs, camera {args.camera}, best of {args.repeats}\n")
+        print(f"{'template':<8} " + " ".join(f"{m + ' ms':>10}" for m in MODES) + f" {'speed-up':>9} {'diff':>5}")
+        for rel in DIRECTIONALS:
+            timings, mismatches = bench_template(
+                conn, rel, pairs, args.camera, args.s, args.tol, args.repeats
+            )
+            speedup = timings["text"] / timings["exists"] if timings["exists"] else float("nan")
+            print(
+                f"{rel:<8} "
+                + " ".join(f"{timings[m]:>10.3f}" for m in MODES)
+                + f" {speedup:>8.2f}x {mismatches:>5}"
+            )
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
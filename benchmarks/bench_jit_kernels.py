@@ -0,0 +1,118 @@
+﻿"""
+NumPy vs compiled (Numba) kernels of spatial_engine/jit.py on a synthetic
+model: corner-in-prism, containment ratio and box distance, for one
+reference against every object and for a tile of references, then the full
+relation profile of a reference (spatial_engine/relations.py).
+
+Both paths are checked to return identical results; the compile time of the
+first JIT call is reported separately and not counted in the timings.
+Without Numba installed only the NumPy column is printed.
+
+    python benchmarks/bench_jit_kernels.py --objects 4000 --refs 256
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from spatial_engine import jit
+from spatial_engine.relations import RelationProfiler
+from spatial_engine.snapshot import ModelSnapshot
+
+
+def synthetic_snapshot(n_objects: int, seed: int) -> ModelSnapshot:
+    """Boxes scattered over storeys of a square floor plan, camera at the edge."""
+    rng = np.random.default_rng(seed)
+    side = 10.0 * np.sqrt(n_objects / 100.0)
+    lo = np.column_stack([
+        rng.uniform(0, side, n_objects),
+        rng.uniform(0, side, n_objects),
+        rng.integers(0, 3, n_objects) * 3.0 + rng.choice([0.0, 0.45, 0.9], n_objects),
+    ])
+    size = rng.uniform(0.2, 2.0, (n_objects, 3))
+    types = np.where(rng.random(n_objects) < 0.05, "IfcSlab", "IfcFurnishingElement")
+    cameras = {1: (side / 2, -2.0, 60.0, None)}
+    return ModelSnapshot(range(1, n_objects + 1), np.hstack([lo, lo + size]), cameras, types)
+
+
+def best_of(fn: Callable, repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run_both(fn: Callable, repeats: int) -> Dict[str, float]:
+    """Time *fn* with the JIT off and (when available) on; check the outputs match."""
+    timings, results = {}, {}
+    modes = [False, True] if jit.HAVE_NUMBA else [False]
+    for enabled in modes:
+        jit.JIT_ENABLED = enabled
+        results[enabled] = fn()
+        timings["jit" if enabled else "numpy"] = best_of(fn, repeats)
+    if len(results) == 2 and not np.array_equal(results[False], results[True], equal_nan=True):
+        raise AssertionError("JIT and NumPy results differ")
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--objects", type=int, default=4000, help="number of synthetic objects")
+    parser.add_argument("--refs", type=int, default=256, help="references per tile")
+    parser.add_argument("--profiles", type=int, default=200, help="reference profiles to time")
+    parser.add_argument("--repeats", type=int, default=3, help="runs per kernel, best is kept")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    jit_setting = jit.JIT_ENABLED
+    snap = synthetic_snapshot(args.objects, args.seed)
+    profiler = RelationProfiler(snap, 1, 2.0, 0.1, 1.0)
+    boxes = snap.boxes
+    refs = np.arange(min(args.refs, len(snap)))
+    prisms, thetas, cam_xy = profiler.prisms["front"], profiler.theta, profiler.cam_xy
+
+    if jit.HAVE_NUMBA:
+        jit.JIT_ENABLED = True
+        start = time.perf_counter()
+        jit.prism_corner_hits(prisms[:1], thetas[:1], boxes, cam_xy)
+        jit.containment_matrix(boxes[:1], boxes)
+        jit.distance_matrix(boxes[:1], boxes)
+        print(f"JIT compile / cache load: {time.perf_counter() - start:.2f} s")
+    else:
+        print("numba is not installed: NumPy fallback only")
+    print(f"{len(snap)} objects, tiles of {len(refs)} references, best of {args.repeats}\n")
+
+    cases = {
+        "prism 1×n":     lambda: jit.prism_corner_hits(prisms[:1], thetas[:1], boxes, cam_xy),
+        "prism tile":    lambda: jit.prism_corner_hits(prisms[refs], thetas[refs], boxes, cam_xy),
+        "contain 1×n":   lambda: jit.containment_matrix(boxes[:1], boxes),
+        "contain tile":  lambda: jit.containment_matrix(boxes[refs], boxes),
+        "distance 1×n":  lambda: jit.distance_matrix(boxes[:1], boxes),
+        "distance tile": lambda: jit.distance_matrix(boxes[refs], boxes),
+    }
+
+    def profiles():
+        # masks only: enough to compare the two paths
+        return np.stack([profiler.compute(int(oid)).mask for oid in snap.ids[:args.profiles]])
+
+    print(f"{'kernel':<14} {'numpy ms':>10} {'jit ms':>10} {'speed-up':>9}")
+    for name, fn in list(cases.items()) + [(f"{args.profiles} profiles", profiles)]:
+        timings = run_both(fn, args.repeats)
+        numpy_ms = 1000 * timings["numpy"]
+        if "jit" in timings:
+            jit_ms = 1000 * timings["jit"]
+            print(f"{name:<14} {numpy_ms:>10.3f} {jit_ms:>10.3f} {numpy_ms / jit_ms:>8.1f}x")
+        else:
+            print(f"{name:<14} {numpy_ms:>10.3f} {'-':>10} {'-':>9}")
+    jit.JIT_ENABLED = jit_setting
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,28 @@
 
 MY_OPENAI_KEY = os.getenv("MY_OPENAI_KEY")
 
+# Disk cache of LLM responses (llm_cache.py); set SR_DISABLE_LLM_CACHE to
+# always call the API
+LLM_CACHE = {
+    "enabled": not os.getenv("SR_DISABLE_LLM_CACHE"),
+    "path": os.getenv("SR_LLM_CACHE_PATH", ".llm_cache/responses.sqlite"),
+    "max_bytes": 256 * 1024 * 1024,
+}
+
+# Reuse of decompositions and plans for reworded rules (rule_cache.py); a
+# stored rule is reused when its lexical similarity to the new one reaches
+# the threshold and both use the same negation and relation words.
+# Lossy, so opt-in: set SR_RULE_CACHE to enable it.
+RULE_CACHE = {
+    "enabled": bool(os.getenv("SR_RULE_CACHE")),
+    "path": os.getenv("SR_RULE_CACHE_PATH", ".llm_cache/rules.sqlite"),
+    "threshold": float(os.getenv("SR_RULE_CACHE_THRESHOLD", "0.7")),
+}
+
+# Rules evaluated at once by main.main / method3.main, each holding at most
+# one database connection of the shared pool
+RULE_CONCURRENCY = int(os.getenv("SR_RULE_CONCURRENCY", "4"))
+
 
 #ROOM 5 CONFIG
 '''
@@ -24,4 +46,7 @@ DB_CONFIG = {
     "user": "postgres",
     "password": "burnout96",
     "port": 5432  # default PostgreSQL port
-}
\ No newline at end of file
+}
+
+# Databases of the rooms evaluated together by main.main_rooms
+ROOM_DBS = ["room5", "r2m_office", "r2m_officeV2"]
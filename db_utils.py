@@ -1,33 +1,124 @@
 ﻿# db_utils.py
-import os
-import psycopg2
-from pathlib import Path
-from typing import Tuple, Any
-from config import DB_CONFIG
 import importlib.util
+import os
 import sys
+import threading
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Any, Tuple
+from typing import Any, Dict, Iterator, Optional, Sequence, Tuple
+
+import psycopg2
+import psycopg2.pool
+from config import DB_CONFIG
 
 
 
 # ---------------------------------------------------------------------------
 # Original helpers (unchanged)
 # ---------------------------------------------------------------------------
-def get_connection():
+def connection_params(dbname: str = None) -> Dict[str, Any]:
+    """psycopg2.connect() arguments for DB_CONFIG, or database *dbname* on the same server."""
+    return {
+        "host": DB_CONFIG["host"],
+        "port": DB_CONFIG["port"],
+        "dbname": dbname or DB_CONFIG["dbname"],
+        "user": DB_CONFIG["user"],
+        "password": DB_CONFIG["password"],
+    }
+
+
+def get_connection(dbname: str = None):
+    """Connection to DB_CONFIG, or to database *dbname* on the same server."""
     try:
-        return psycopg2.connect(
-            host=DB_CONFIG["host"],
-            port=DB_CONFIG["port"],
-            dbname=DB_CONFIG["dbname"],
-            user=DB_CONFIG["user"],
-            password=DB_CONFIG["password"]
-        )
+        return psycopg2.connect(**connection_params(dbname))
     except Exception as e:
         print("Error connecting to database:", e)
         raise
 
 
+class ConnectionPool:
+    """
+    At most *maxconn* open connections to one database, shared by threads.
+
+    A psycopg2 ThreadedConnectionPool, which raises PoolError when every
+    connection is in use, behind a semaphore so connection() blocks instead.
+    The pool only keeps minconn connections between uses, so all *maxconn*
+    are opened up front and kept.
+    """
+
+    def __init__(self, dbname: Optional[str] = None, maxconn: int = 4):
+        self.dbname = dbname
+        self.maxconn = maxconn
+        self._slots = threading.BoundedSemaphore(maxconn)
+        try:
+            self._pool = psycopg2.pool.ThreadedConnectionPool(maxconn, maxconn, **connection_params(dbname))
+        except Exception as e:
+            print("Error connecting to database:", e)
+            raise
+
+    @contextmanager
+    def connection(self) -> Iterator[Any]:
+        with self._slots:
+            conn = self._pool.getconn()
+            while conn.closed:
+                # dropped by the server since its last use
+                self._pool.putconn(conn, close=True)
+                conn = self._pool.getconn()
+            try:
+                yield conn
+            finally:
+                if self._pool.closed:
+                    conn.close()
+                else:
+                    # rolled back, or dropped if the server went away
+                    self._pool.putconn(conn)
+
+    def close(self) -> None:
+        if not self._pool.closed:
+            self._pool.closeall()
+
+
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def open_connection_pool(maxconn: int, dbname: Optional[str] = None) -> ConnectionPool:
+    """Share at most *maxconn* connections to *dbname* between every borrow_connection()."""
+    key = dbname or DB_CONFIG["dbname"]
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(key, maxconn)
+        return _pools[key]
+
+
+def close_connection_pools() -> None:
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
+
+@contextmanager
+def borrow_connection(dbname: Optional[str] = None) -> Iterator[Any]:
+    """
+    Connection to *dbname* (default DB_CONFIG["dbname"]) for the duration of
+    the block: from its pool when open_connection_pool() was called for it,
+    otherwise a new connection closed afterwards.
+    """
+    with _pools_lock:
+        pool = _pools.get(dbname or DB_CONFIG["dbname"])
+    if pool is not None:
+        with pool.connection() as conn:
+            yield conn
+        return
+    conn = get_connection(dbname)
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
 def load_query(filename_or_path):
     if isinstance(filename_or_path, Path):
         path = filename_or_path
@@ -53,6 +144,173 @@ def run_query(conn, query: str, params: Tuple[Any, ...] = None):
 # ---------------------------------------------------------------------------
 SQL_DIR = Path(__file__).with_suffix("").parent / "sql"
 
+# Template mode → directory holding that flavour of every template file.
+#   text  : metrics, flag and a human-readable relation column (original files)
+#   flags : metrics and flag only; relation text is rendered in Python
+#   exists: boolean-only EXISTS variants of the directional templates; the
+#           other templates fall back to their "flags" file
+TEMPLATE_MODE_DIRS: Dict[str, Path] = {
+    "text":   SQL_DIR,
+    "flags":  SQL_DIR / "flags",
+    "exists": SQL_DIR / "exists",
+}
+
+# Multi-camera directional templates: one query evaluates a pair from every
+# camera in a list and returns (camera_id, flag) rows (see run_spatial_call)
+MULTI_CAMERA_DIR = SQL_DIR / "cameras"
+
+# One-to-many templates: all the objects in a relation with one reference
+# object in a single, index-assisted query (see run_near_many)
+ONE_TO_MANY_DIR = SQL_DIR / "many"
+
+# Templates testing a half-space prism in camera space
+DIRECTIONAL_TEMPLATES = {"front", "behind", "left", "right", "above", "below"}
+
+# Templates whose outcome depends on the point of view; the others
+# (touches, near, far, contains) are evaluated once whatever the camera
+CAMERA_TEMPLATES = DIRECTIONAL_TEMPLATES | {"on_top_of", "leans_on", "affixed_to"}
+
+# Mode to borrow a template from when a mode directory has no file for it
+TEMPLATE_MODE_FALLBACK: Dict[str, str] = {
+    "exists": "flags",
+}
+
+
+def template_file(template_mode: str, fname: str) -> Path:
+    """
+    Path of template *fname* in *template_mode*, following
+    TEMPLATE_MODE_FALLBACK when that mode does not provide the file.
+    """
+    mode = template_mode
+    while True:
+        path = TEMPLATE_MODE_DIRS[mode] / fname
+        if path.exists() or mode not in TEMPLATE_MODE_FALLBACK:
+            return path
+        mode = TEMPLATE_MODE_FALLBACK[mode]
+
+
+# Helper SQL functions the templates call, with the table, triggers and
+# index they rely on, in installation order (camera_object_geometry.sql
+# calls the functions of camera_space.sql)
+SQL_FUNCTIONS_DIR = SQL_DIR / "functions"
+SQL_FUNCTION_FILES = ["camera_space.sql", "camera_object_geometry.sql", "indexes.sql"]
+
+
+def install_sql_functions(conn) -> None:
+    """
+    Create (or replace) the helper functions of sql/functions in the
+    database of *conn*, with the camera_object_geometry table, its triggers
+    on camera and room_objects and the room_objects index.
+
+    This is the schema migration of the pipeline: it takes exclusive locks
+    on camera and room_objects, so it only runs when asked for, with
+    "python db_utils.py [dbname ...]" once per database and again after a
+    function file changed.  Connections never run it.
+    """
+    with conn.cursor() as cur:
+        try:
+            for fname in SQL_FUNCTION_FILES:
+                cur.execute(load_query(SQL_FUNCTIONS_DIR / fname))
+        except Exception as e:
+            conn.rollback()
+            print("Error installing SQL functions:", e)
+            raise
+    conn.commit()
+
+
+def sql_functions_installed(conn) -> bool:
+    """Whether install_sql_functions() has been run in the database of *conn*."""
+    return run_query(
+        conn,
+        "SELECT to_regclass('camera_object_geometry') IS NOT NULL "
+        "AND to_regprocedure('sr_camera_geometry(integer, integer)') IS NOT NULL;"
+    )[0][0]
+
+
+# ---------------------------------------------------------------------------
+# Per-camera geometry table (sql/functions/camera_object_geometry.sql)
+# ---------------------------------------------------------------------------
+def refresh_camera_geometry(conn, camera_id: int = None) -> int:
+    """
+    Rebuild camera_object_geometry for *camera_id* (every camera when None)
+    and return the number of rows written.
+    """
+    rows = run_query(conn, "SELECT sr_refresh_camera_geometry(%s);", (camera_id,))
+    conn.commit()
+    return rows[0][0]
+
+
+def ensure_camera_geometry(conn, camera_id: int) -> None:
+    """
+    Rebuild the rows of *camera_id* if any object in room_objects has none
+    or a row belongs to an object no longer there, e.g. after the model was
+    re-ingested without a refresh, or has rows written before the view-cone
+    column existed.  Edits of room_objects
+    keep the rows current through the object_geometry_refresh trigger; this
+    check covers the databases edited before it was installed.
+
+    Raises RuntimeError when install_sql_functions() was never run in the
+    database.
+    """
+    if not sql_functions_installed(conn):
+        dbname = conn.info.dbname
+        raise RuntimeError(
+            f"The SQL functions are not installed in database {dbname!r}; "
+            f"run 'python db_utils.py {dbname}' first"
+        )
+    missing = run_query(
+        conn,
+        """
+        SELECT EXISTS (
+          SELECT 1
+          FROM room_objects o
+          LEFT JOIN camera_object_geometry g
+            ON g.camera_id = %s AND g.object_id = o.id
+          WHERE g.object_id IS NULL OR g.in_view IS NULL
+        ) OR EXISTS (
+          SELECT 1
+          FROM camera_object_geometry g
+          WHERE g.camera_id = %s
+            AND NOT EXISTS (SELECT 1 FROM room_objects o WHERE o.id = g.object_id)
+        );
+        """,
+        (camera_id, camera_id)
+    )[0][0]
+    if missing:
+        n = refresh_camera_geometry(conn, camera_id)
+        print(f"DEBUG: Rebuilt camera geometry for camera {camera_id} ({n} objects)")
+
+
+def visible_object_ids(conn, camera_ids) -> Optional[set]:
+    """
+    IDs of the objects inside the view cone of at least one of *camera_ids*
+    (camera_object_geometry.in_view); the frustum prefilter of directional
+    candidates.  None when some camera has no cone, i.e. no view_azimuth or
+    a fov that is NULL or 360 or more: that camera sees every object, so
+    there is nothing to cull.
+    """
+    cones = run_query(
+        conn,
+        """
+        SELECT bool_and(view_azimuth IS NOT NULL AND fov IS NOT NULL AND fov < 360)
+        FROM camera
+        WHERE id = ANY (%s)
+        """,
+        (list(camera_ids),)
+    )[0][0]
+    if not cones:
+        return None
+    rows = run_query(
+        conn,
+        """
+        SELECT DISTINCT object_id
+        FROM camera_object_geometry
+        WHERE camera_id = ANY (%s) AND in_view
+        """,
+        (list(camera_ids),)
+    )
+    return {r[0] for r in rows}
+
 # ---------------------------------------------------------------------------
 # Composed‑relation Python functions
 # ---------------------------------------------------------------------------
@@ -91,15 +349,19 @@ def load_query(file_or_path: str | Path) -> str:
     """
     Return the text of a .sql file.
 
-    Accepts either the bare filename (e.g. 'above.sql') or an absolute/relative
-    Path object.  Always resolves against the ./sql directory first.
+    Accepts either the bare filename (e.g. 'above.sql'), a path relative to
+    ./sql (e.g. 'flags/above.sql') or an absolute Path object.  Relative
+    paths always resolve against the ./sql directory.
     """
     path = Path(file_or_path)
     if not path.suffix:                 # maybe they passed "above" w/o .sql
         path = path.with_suffix(".sql")
 
     if not path.is_absolute():
-        path = SQL_DIR / path.name      # resolve relative to ./sql
+        parts = path.parts
+        if parts and parts[0] == SQL_DIR.name:
+            parts = parts[1:]
+        path = SQL_DIR.joinpath(*parts)  # resolve relative to ./sql
 
     text = path.read_text(encoding="utf-8")
     return text.lstrip("\ufeff")        # strip UTF‑8 BOM if present
@@ -125,6 +387,66 @@ def run_template_query2(conn, tpl, id1, id2):
     return _template_query(conn, tpl, (id1, id2))
 
 
+def _directional_args(call: dict, template_paths: dict, tpl_key: str, pov_id: int):
+    """
+    Template file and camera argument of a directional call.  A call with a
+    "camera_ids" list runs the multi-camera form of the template instead,
+    which returns one (camera_id, flag) row per camera.
+    """
+    if call.get("camera_ids"):
+        return MULTI_CAMERA_DIR / f"{tpl_key}.sql", list(call["camera_ids"])
+    return template_paths[tpl_key], call.get("camera_id", pov_id)
+
+
+def run_near_many(conn, ref_id: int, near_far_threshold: float) -> Dict[int, float]:
+    """
+    Every object nearer than *near_far_threshold* to *ref_id*, as
+    {object_id: distance}, from one query (sql/many/near.sql).
+    """
+    rows = _template_query(conn, ONE_TO_MANY_DIR / "near.sql", (ref_id, near_far_threshold))
+    return {object_id: distance for object_id, distance in rows}
+
+
+def run_directional_many(
+    conn,
+    tpl_key: str,
+    ref_id: int,
+    camera_id: int,
+    extrusion_factor_s: float,
+    tolerance_metre: float,
+) -> set:
+    """
+    Every object b for which the directional pair (a_id=ref_id, b_id=b)
+    holds, from one query (sql/many/<tpl_key>.sql): for front/behind/left/
+    right the objects in the prism of *ref_id*, for above/below the objects
+    whose prism contains *ref_id*, matching the roles run_spatial_call uses.
+    """
+    rows = _template_query(
+        conn,
+        ONE_TO_MANY_DIR / f"{tpl_key}.sql",
+        (ref_id, camera_id, extrusion_factor_s, tolerance_metre)
+    )
+    return {r[0] for r in rows}
+
+
+def run_contains_many(
+    conn,
+    a_ids: Sequence[int],
+    b_ids: Sequence[int],
+) -> Dict[Tuple[int, int], float]:
+    """
+    Containment ratio of every overlapping (a, b) pair of the two id sets, as
+    {(a_id, b_id): pct_contained}, from one query (sql/many/contains.sql).
+    A pair missing from the result is not contained.
+    """
+    rows = _template_query(
+        conn,
+        ONE_TO_MANY_DIR / "contains.sql",
+        (sorted(set(a_ids)), sorted(set(b_ids)))
+    )
+    return {(a_id, b_id): pct for a_id, b_id, pct in rows}
+
+
 # ---------------------------------------------------------------------------
 # Master executor
 # ---------------------------------------------------------------------------
@@ -161,23 +483,25 @@ def run_spatial_call(
 
             # 4-param directionals
             if tpl_key in {"front", "behind", "left", "right"}:
+                tpl_file, camera = _directional_args(call, template_paths, tpl_key, pov_id)
                 rows = run_template_query4(
                     conn,
-                    template_paths[tpl_key],
+                    tpl_file,
                     call["a_id"],                   # x_id (tested)
                     call["b_id"],                   # y_id (reference)
-                    call.get("camera_id", pov_id),
+                    camera,
                     call.get("s", extrusion_factor_s),
                     call.get("tol", tolerance_metre)
                 )
             
             elif tpl_key in {"above", "below"}:
+                tpl_file, camera = _directional_args(call, template_paths, tpl_key, pov_id)
                 rows = run_template_query4(
                     conn,
-                    template_paths[tpl_key],
+                    tpl_file,
                     call["b_id"],                   # x_id (tested)
                     call["a_id"],                   # Check if this object is above or below the other
-                    call.get("camera_id", pov_id),
+                    camera,
                     call.get("s", extrusion_factor_s),
                     call.get("tol", tolerance_metre)
                 )
@@ -210,6 +534,7 @@ def run_spatial_call(
                     call["a_id"],
                     call.get("camera_id", pov_id),
                     call.get("s", extrusion_factor_s),
+                    conn=conn,          # the database being evaluated
                 )
                 rows = [result]
 
@@ -327,4 +652,18 @@ def test_r2m_office_db():
                 print("    " + line)
 
     finally:
-        conn.close()
\ No newline at end of file
+        conn.close()
+
+
+if __name__ == "__main__":
+    # Schema setup: python db_utils.py [dbname ...] installs the SQL
+    # functions in each database (default: DB_CONFIG and config.ROOM_DBS)
+    from config import ROOM_DBS
+
+    for name in sys.argv[1:] or dict.fromkeys([DB_CONFIG["dbname"], *ROOM_DBS]):
+        conn = get_connection(name)
+        try:
+            install_sql_functions(conn)
+            print(f"Installed the SQL functions in database {name}")
+        finally:
+            conn.close()
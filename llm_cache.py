@@ -0,0 +1,189 @@
+﻿"""
+Persistent cache of LLM responses.
+
+Every prompt stage (decompose_rule, extract_entities, spatial_planner,
+evaluate_rule) renders its messages and calls client.invoke(messages,
+model=...).  Rerunning a gold standard with only a spatial parameter changed
+renders exactly the same messages again, so their responses are stored on
+disk, keyed by the model name and a hash of the rendered messages (and of
+any other invoke arguments), and replayed instead of calling the API.
+
+The store is one SQLite file (LLM_CACHE["path"] in config.py).  When it
+grows past LLM_CACHE["max_bytes"] of response text the least recently used
+entries are evicted.  CachedChatModel wraps the client returned by
+pipeline_helpers.get_llm and counts its hits and misses; every other
+attribute is passed through to the wrapped client.
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional
+
+from langchain_core.messages import AIMessage
+
+from config import LLM_CACHE
+
+
+def _message_fields(message: Any) -> Dict[str, Any]:
+    """Role and content of one message (BaseMessage, (role, content) tuple or str)."""
+    if isinstance(message, str):
+        return {"type": "human", "content": message}
+    if isinstance(message, (tuple, list)) and len(message) == 2:
+        return {"type": str(message[0]), "content": message[1]}
+    return {"type": getattr(message, "type", type(message).__name__), "content": getattr(message, "content", str(message))}
+
+
+def messages_key(model: str, messages: Any, **kwargs) -> str:
+    """Cache key of one call: model name plus a hash of the rendered messages and arguments."""
+    if hasattr(messages, "to_messages"):
+        messages = messages.to_messages()
+    if isinstance(messages, str):
+        messages = [messages]
+    payload = json.dumps(
+        {"messages": [_message_fields(m) for m in messages], "kwargs": kwargs},
+        sort_keys=True, ensure_ascii=False, default=str
+    )
+    return f"{model}:{hashlib.sha256(payload.encode('utf-8')).hexdigest()}"
+
+
+class ResponseCache:
+    """Size-bounded, least-recently-used store of response texts in SQLite."""
+
+    def __init__(self, path: Path, max_bytes: int):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+        with self._db:
+            self._db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS responses (
+                    key       TEXT PRIMARY KEY,
+                    model     TEXT NOT NULL,
+                    content   TEXT NOT NULL,
+                    size      INTEGER NOT NULL,
+                    last_used REAL NOT NULL
+                )
+                """
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute("SELECT content FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            with self._db:
+                self._db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+            return row[0]
+
+    def put(self, key: str, model: str, content: str) -> None:
+        size = len(content.encode("utf-8"))
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, model, content, size, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, model, content, size, time.time())
+            )
+            self._evict()
+
+    def _evict(self) -> None:
+        """Drop the least recently used entries until the texts fit in max_bytes."""
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._db.execute("SELECT key, size FROM responses ORDER BY last_used").fetchall()
+        dropped = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            dropped.append((key,))
+            total -= size
+        self._db.executemany("DELETE FROM responses WHERE key = ?", dropped)
+        self.evictions += len(dropped)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            entries, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "entries": entries, "bytes": size}
+
+
+class CachedChatModel:
+    """
+    Chat model wrapper answering invoke() from the response cache when the
+    same model was already asked the same messages.
+
+    Concurrent calls with the same key (rules evaluated side by side that
+    render the same prompt) are made one at a time: the first one asks the
+    API, the others wait for it and are answered from the cache.
+    """
+
+    def __init__(self, client, cache: ResponseCache):
+        self.client = client
+        self.cache = cache
+        self._inflight_lock = threading.Lock()
+        self._inflight: Dict[str, list] = {}
+
+    def __getattr__(self, name: str):
+        if name in {"client", "cache", "_inflight_lock", "_inflight"}:
+            raise AttributeError(name)
+        return getattr(self.client, name)
+
+    @contextmanager
+    def _single_flight(self, key: str) -> Iterator[None]:
+        """Hold the lock of *key* (shared by every caller of that key while in use)."""
+        with self._inflight_lock:
+            entry = self._inflight.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._inflight_lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._inflight[key]
+
+    def invoke(self, messages, model: Optional[str] = None, **kwargs):
+        # the model passed to invoke overrides the one the client was built with
+        model_name = model or getattr(self.client, "model_name", None) or getattr(self.client, "model", "")
+        key = messages_key(model_name, messages, **kwargs)
+        with self._single_flight(key):
+            content = self.cache.get(key)
+            if content is not None:
+                return AIMessage(content=content)
+
+            if model is not None:
+                kwargs["model"] = model
+            result = self.client.invoke(messages, **kwargs)
+            content = getattr(result, "content", None)
+            if isinstance(content, str):
+                self.cache.put(key, model_name, content)
+            return result
+
+
+_default_cache: Optional[ResponseCache] = None
+_default_lock = threading.Lock()
+
+
+def default_cache() -> Optional[ResponseCache]:
+    """The process-wide cache configured by LLM_CACHE, or None when it is disabled."""
+    global _default_cache
+    if not LLM_CACHE.get("enabled", True):
+        return None
+    with _default_lock:
+        if _default_cache is None:
+            path = Path(LLM_CACHE["path"])
+            if not path.is_absolute():
+                path = Path(__file__).resolve().parent / path
+            _default_cache = ResponseCache(path, LLM_CACHE["max_bytes"])
+    return _default_cache
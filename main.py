@@ -1,5 +1,5 @@
 ﻿from optparse import Option
-from typing import Any, Dict, Optional, List, Literal, TypedDict
+from typing import Any, Dict, Optional, List, Literal, Set, TypedDict
 from langgraph.graph import END, StateGraph, START
 from langgraph.graph.message import add_messages
 from pydantic import BaseModel, Field
@@ -13,9 +13,14 @@ from prompts.create_summaries import summarise_spatial_results
 from prompts.evaluate_rule import evaluate_rule
 
 import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import time
 
+from config import ROOM_DBS, RULE_CONCURRENCY
+from rule_cache import default_rule_cache
+
 
 # ──────────────────────────────────────────────────────────────────────────
 #  Template catalogue  (key → SQL filename or None for composed funcs)
@@ -62,14 +67,18 @@ TEMPLATE_CATALOGUE = {
     "contains":   "Check containment between A and B"
 }
 
-def prepare_template_paths() -> Dict[str, Path]:
+def prepare_template_paths(template_mode: str = "text") -> Dict[str, Path]:
     """
     Prepare and return a dictionary mapping template names to their SQL file paths.
+
+    *template_mode* picks the flavour of the files (see db_utils.TEMPLATE_MODE_DIRS):
+    "flags" returns flags and metrics only, "text" also builds the relation text in SQL,
+    "exists" swaps the directional templates for their boolean-only EXISTS form.
     """
-    SQL_DIR = Path(__file__).parent / "sql"
+    SQL_DIR = TEMPLATE_MODE_DIRS[template_mode]
     print(f"DEBUG: SQL directory is {SQL_DIR}")
     template_paths: Dict[str, Path] = {
-        name: (SQL_DIR / fname) for name, fname in TEMPLATE_MAP.items() if fname
+        name: template_file(template_mode, fname) for name, fname in TEMPLATE_MAP.items() if fname
     }
     print(f"DEBUG: Prepared template paths for {len(template_paths)} SQL files.\n")
     return template_paths
@@ -77,10 +86,13 @@ def prepare_template_paths() -> Dict[str, Path]:
 class PipeState(TypedDict):
 
     pov_id: int
+    camera_ids: List[int]
     extrusion_factor_s: int
     tolerance_metre: float
     near_far_threshold: float
 
+    dbname: Optional[str]
+    rule_id: Optional[str]
     rule_text: str
     decomposed_checks: Optional[dict]
 
@@ -94,7 +106,7 @@ class PipeState(TypedDict):
 
     enriched_checks: Optional[dict]
     spatial_plan: Optional[dict]
-    relations: Optional[Any]
+    relations: Optional[RelationResults]
     summaries: Optional[List[str]]
     evaluation: Optional[dict]
 
@@ -102,14 +114,43 @@ class Evaluate_Hs_Rule:
     """
     A class for evaluating health and safety rules
     """
-    def __init__(self, pov_id, extrusion_factor_s, tolerance_metre, near_far_threshold, model_name: str = "gpt-4.1-mini-2025-04-14"):
+    def __init__(self, pov_id, extrusion_factor_s, tolerance_metre, near_far_threshold, model_name: str = "gpt-4.1-mini-2025-04-14", template_mode: str = "text", relation_engine: str = "sql", spatial_workers: int = 1, use_rule_cache: bool = True, fov_culling: bool = False):
+        """
+        *pov_id* is a camera id, or a list of camera ids to evaluate the
+        camera-dependent relations from every one of them in the same run
+        (the first one is the main point of view).  *relation_engine* is
+        "sql", "profile" or "matrix" (see pipeline_helpers.RELATION_ENGINES);
+        with an in-process engine, *spatial_workers* > 1 shards the spatial
+        evaluation over that many processes.  With *use_rule_cache* and
+        RULE_CACHE enabled (SR_RULE_CACHE), the decomposition and plan of a
+        rule already seen in other words are reused (see rule_cache.py).
+        *template_mode* "text" (the default) lets SQL write the relation
+        text of every pair; "flags" and "exists" return flags and metrics
+        only and render the text for the summarised pairs alone, so the
+        relation_value of the rows that do not hold is not a sentence.
+        With *fov_culling*, the directional relations are only evaluated
+        for the objects inside the view cone of some camera (cameras stored
+        with a view_azimuth and a fov); the references left out are
+        reported as not visible rather than as having no relation.
+        """
         self.llm = get_llm(model_name=model_name)
+        self.rule_cache = default_rule_cache() if use_rule_cache else None
         self.chain = None
         self.build_workflow()
-        self.pov_id = pov_id
+        self.camera_ids = list(pov_id) if isinstance(pov_id, (list, tuple)) else [pov_id]
+        self.pov_id = self.camera_ids[0]
         self.extrusion_factor_s = extrusion_factor_s
         self.tolerance_metre = tolerance_metre
         self.near_far_threshold = near_far_threshold
+        self.template_mode = template_mode
+        self.relation_engine = relation_engine
+        self.spatial_workers = spatial_workers
+        self.fov_culling = fov_culling
+
+        # object catalogue and UDTs of each database, loaded by the first rule
+        # and shared by every rule run on this validator (see main)
+        self.catalogues: Dict[tuple, Dict[str, Any]] = {}
+        self._catalogue_lock = threading.Lock()
 
     def build_workflow(self):
         workflow = StateGraph(PipeState)
@@ -124,10 +165,12 @@ class Evaluate_Hs_Rule:
         workflow.add_node("summarise results", self.summarise_results)
         workflow.add_node("evaluate results", self.evaluate_rule)
 
-        workflow.add_edge(START,"load Database objects")
-        workflow.add_edge("load Database objects", "create user defined types" )
-        workflow.add_edge("create user defined types", "decompose rule" )
-        workflow.add_edge("decompose rule", "match udts with rule entities")
+        # The decomposition needs only the rule text, so it runs while the
+        # objects are loaded and typed; both branches join before matching.
+        workflow.add_edge(START, "decompose rule")
+        workflow.add_edge(START, "load Database objects")
+        workflow.add_edge("load Database objects", "create user defined types")
+        workflow.add_edge(["decompose rule", "create user defined types"], "match udts with rule entities")
         workflow.add_edge("match udts with rule entities", "plan relation to be run")
 
         workflow.add_edge("plan relation to be run","execute planned relations")
@@ -140,83 +183,132 @@ class Evaluate_Hs_Rule:
         self.chain = workflow.compile()
         return self.chain
 
-    def decompose_rule(self, state: PipeState) -> PipeState:
-        state["decomposed_checks"] = decompose_rule(state["rule_text"], self.llm)
-        return state
-
-    def load_objects(self, state: PipeState) -> PipeState:
-        all_objs, id2obj, ids, type2ids = load_objects_and_maps()
-        state["all_objects"] = all_objs
-        state["id_to_obj"] = id2obj
-        state["all_ids"] = ids
-        state["type_to_ids"] = type2ids
-        return state
-
-    def extract_user_defined_types(self, state:PipeState) -> PipeState:
-        user_defined_types_list = extract_user_defined_types(state["all_objects"])
-        state["user_defined_types"] = user_defined_types_list
-
-        # 2) compute udt_to_ids once:
-        udt_to_ids = ids_from_udts(user_defined_types_list, state["all_objects"])
-        state["udt_to_ids"] = udt_to_ids
-
-        return state
-
-    def entities_matching(self, state: PipeState) -> PipeState:
+    # Every node returns only the keys it sets: "decompose rule" and the
+    # object loading branch run in the same step, and LangGraph merges their
+    # partial updates into the state.
+
+    def decompose_rule(self, state: PipeState) -> Dict[str, Any]:
+        cached = self.rule_cache.decomposition(state["rule_text"]) if self.rule_cache else None
+        if cached is not None:
+            return {"decomposed_checks": cached}
+        decomposed = decompose_rule(state["rule_text"], self.llm)
+        if self.rule_cache:
+            self.rule_cache.store_decomposition(state["rule_text"], decomposed)
+        return {"decomposed_checks": decomposed}
+
+    def shared_catalogue(self, node: str, dbname: Optional[str], build) -> Dict[str, Any]:
+        """Update of *node* for *dbname*: built by the first rule that needs it, then reused."""
+        with self._catalogue_lock:
+            if (node, dbname) not in self.catalogues:
+                self.catalogues[(node, dbname)] = build()
+            return self.catalogues[(node, dbname)]
+
+    def load_objects(self, state: PipeState) -> Dict[str, Any]:
+        def load() -> Dict[str, Any]:
+            all_objs, id2obj, ids, type2ids = load_objects_and_maps(state.get("dbname"))
+            return {
+                "all_objects": all_objs,
+                "id_to_obj": id2obj,
+                "all_ids": ids,
+                "type_to_ids": type2ids,
+            }
+        return self.shared_catalogue("objects", state.get("dbname"), load)
+
+    def extract_user_defined_types(self, state:PipeState) -> Dict[str, Any]:
+        def extract() -> Dict[str, Any]:
+            user_defined_types_list = extract_user_defined_types(state["all_objects"])
+
+            # 2) compute udt_to_ids once:
+            udt_to_ids = ids_from_udts(user_defined_types_list, state["all_objects"])
+
+            return {"user_defined_types": user_defined_types_list, "udt_to_ids": udt_to_ids}
+        return self.shared_catalogue("udts", state.get("dbname"), extract)
+
+    def entities_matching(self, state: PipeState) -> Dict[str, Any]:
         enriched = extract_entities(
             state["decomposed_checks"],
             state["user_defined_types"],
             self.llm
         )
-        state["enriched_checks"] = enriched
-        return state
-
-    def spatial_plan(self, state: PipeState) -> PipeState:
+        return {"enriched_checks": enriched}
+
+    def spatial_plan(self, state: PipeState) -> Dict[str, Any]:
+        if self.rule_cache:
+            cached = self.rule_cache.plan(state["rule_text"], state["enriched_checks"])
+            if cached is not None:
+                print("DEBUG: Reusing the cached spatial plan")
+                return {"spatial_plan": cached}
         plan = spatial_planner(
             state["enriched_checks"],
             TEMPLATE_CATALOGUE,
             self.llm
         )
-        state["spatial_plan"] = plan
-        return state
+        if self.rule_cache:
+            self.rule_cache.store_plan(state["rule_text"], state["enriched_checks"], plan, TEMPLATE_CATALOGUE)
+        return {"spatial_plan": plan}
 
-    def decide_polarity(self, state: PipeState) -> PipeState:
+    def decide_polarity(self, state: PipeState) -> Dict[str, Any]:
         decisioned = decide_plan_polarity(
             state["rule_text"],
             state.get("spatial_plan", {}),
             self.llm
         )
-        state["spatial_plan"] = decisioned
-        return state
+        return {"spatial_plan": decisioned}
 
-    def execute_planned_relations(self, state: PipeState) -> PipeState:
+    def execute_planned_relations(self, state: PipeState) -> Dict[str, Any]:
 
-        state["pov_id"] = self.pov_id
-        state["extrusion_factor_s"] = self.extrusion_factor_s
-        state["tolerance_metre"] = self.tolerance_metre
-        state["near_far_threshold"] = self.near_far_threshold
+        params = {
+            "pov_id": self.pov_id,
+            "camera_ids": self.camera_ids,
+            "extrusion_factor_s": self.extrusion_factor_s,
+            "tolerance_metre": self.tolerance_metre,
+            "near_far_threshold": self.near_far_threshold,
+        }
 
-        template_paths = prepare_template_paths()
+        template_paths = prepare_template_paths(self.template_mode)
 
-        log_path = Path(__file__).parent / "spatial_calls.log"
+        # one log per database and rule, so rooms and rules evaluated side
+        # by side do not share it
+        dbname = state.get("dbname")
+        tags = [t for t in (dbname, state.get("rule_id")) if t]
+        log_path = Path(__file__).parent / ".".join(["spatial_calls", *tags, "log"])
 
+        # Results are streamed straight into the summariser: a check's summary
+        # block is ready as soon as its last pair is evaluated, while later
+        # checks are still running.
+        relations = RelationResults(state["id_to_obj"])
+        summaries: List[str] = []
+        culled: Dict[int, Set[int]] = {}
         with open(log_path, "w", encoding="utf-8") as log_file:
-            relations = execute_spatial_calls(
+            results = iter_spatial_results(
                 state["spatial_plan"],
                 state["all_objects"],
                 template_paths,
                 log_file,
                 state["udt_to_ids"],
-                state["pov_id"],
-                state["extrusion_factor_s"],
-                state["tolerance_metre"],
-                state["near_far_threshold"]
+                params["pov_id"],
+                params["extrusion_factor_s"],
+                params["tolerance_metre"],
+                params["near_far_threshold"],
+                template_mode=self.template_mode,
+                camera_ids=params["camera_ids"],
+                fov_culling=self.fov_culling,
+                relation_engine=self.relation_engine,
+                workers=self.spatial_workers,
+                dbname=dbname,
+                culled=culled
             )
+            for chk, block in iter_plan_summaries(
+                state["spatial_plan"], results, state["udt_to_ids"], state["id_to_obj"],
+                sink=relations, culled=culled, camera_ids=params["camera_ids"]
+            ):
+                print(f"DEBUG: Summary for check_index={chk} ready.")
+                summaries.append(block)
 
-        state["relations"] = relations
-        return state
+        print(f"DEBUG: Collected {len(relations)} results matching use_positive.\n")
+        return {**params, "relations": relations, "summaries": summaries}
 
-    def summarise_results(self, state: PipeState) -> PipeState:
+    def summarise_results(self, state: PipeState) -> Dict[str, Any]:
         '''
         summaries = summarise_spatial_results(
             state.get("spatial_plan", {}),
@@ -224,23 +316,24 @@ class Evaluate_Hs_Rule:
             self.llm
         )
             '''
+        if state.get("summaries") is not None:
+            # already built while the relations were streaming in
+            return {}
         summaries = summarize_plan_results_to_list(state["spatial_plan"], state["relations"],state["udt_to_ids"],state["id_to_obj"])
-        state["summaries"] = summaries
-        return state
+        return {"summaries": summaries}
 
-    def evaluate_rule(self, state: PipeState) -> PipeState:
+    def evaluate_rule(self, state: PipeState) -> Dict[str, Any]:
         evaluation = evaluate_rule(
             state["rule_text"],
             state.get("summaries", []),
             self.llm
         )
-        state["evaluation"] = evaluation
-        return state
+        return {"evaluation": evaluation}
 
-    def run_hs_rule_validator(self, rule_text: str) -> Dict[str, Any]:
-        if self.chain is None:
-            self.build_workflow()
-        initial_state: PipeState = {
+    def initial_state(self, rule_text: str, dbname: Optional[str] = None, rule_id: Optional[str] = None) -> PipeState:
+        return {
+            "dbname": dbname,
+            "rule_id": rule_id,
             "rule_text": rule_text,
             "decomposed_checks": None,
             "all_objects": None,
@@ -253,69 +346,104 @@ class Evaluate_Hs_Rule:
             "summaries": None,
             "evaluation": None,
         }
-        return self.chain.invoke(initial_state)
-
-def main(gold_standard, pov_id=1, extrusion_factor_s=2, tolerance_metre=0.2, near_far_threshold=1):
-    # Prepare output directory
-    outputs_dir = Path(__file__).parent / "outputs_results"
-    outputs_dir.mkdir(exist_ok=True)
 
-    validator = Evaluate_Hs_Rule(pov_id, extrusion_factor_s, tolerance_metre, near_far_threshold)
-
-    # --- Here we initialize final_summary with the desired structure ---
-    final_summary: Dict[str, Any] = {"results": {}}
-
-    # To collect per-check times
-    exec_times: Dict[str, float] = {}
-
-    # Iterate over each rule and run pipeline
-    for rule_id, gs in gold_standard.items():
-        start_time = time.perf_counter()  # ⏱️ start
-
-        question       = gs["rule_text"]
-        gs_compliant   = gs["overall_compliant"]
-        gs_explanation = gs["explanation_summary"]
-
-        print(f"DEBUG: Processing rule '{rule_id}'...'{question}'")
-        results = validator.run_hs_rule_validator(question)
-
-        # Filter out large fields
-        filtered = {k: v for k, v in results.items()
-                    if k not in ("all_objects", "all_ids", "id_to_obj", "type_to_ids", "user_defined_types", "udt_to_ids")}
-
-        # Stop timing
-        end_time = time.perf_counter()
-        duration = end_time - start_time
-        exec_times[rule_id] = duration
-        filtered["execution_time_sec"] = duration  # also write in per-rule file
-
-        # Write per-rule file
-        rule_file = outputs_dir / f"{rule_id}.json"
-        json_str = json.dumps(filtered, ensure_ascii=False, indent=2).replace('\\n', '\n')
-        with open(rule_file, "w", encoding="utf-8") as f:
-            f.write(json_str)
-
-        # --- Now extract the evaluation and compare to gold standard ---
-        eval_dict      = filtered.get("evaluation", {})
-        llm_compliant  = eval_dict.get("overall_compliant")
-        llm_explanation = eval_dict.get("overall_explanation", "")
-
-        correct = (
-            (llm_compliant is True  and gs_compliant is True) or
-            (llm_compliant is False and gs_compliant is False)
-        )
+    def run_hs_rule_validator(self, rule_text: str, rule_id: Optional[str] = None) -> Dict[str, Any]:
+        if self.chain is None:
+            self.build_workflow()
+        return self.chain.invoke(self.initial_state(rule_text, rule_id=rule_id))
+
+    def run_hs_rule_on_rooms(self, rule_text: str, rooms: List[str] = ROOM_DBS) -> Dict[str, Dict[str, Any]]:
+        """
+        Evaluate *rule_text* on every database in *rooms* and return the
+        final state of each, by database name.
+
+        The decomposition depends on the rule text alone and is run once,
+        while the rooms' objects are being loaded; entity matching and planning depend on it and on the user defined
+        types, so they run once per distinct UDT set and the plan is shared
+        by every room with that set.  Spatial execution and evaluation then
+        run for all rooms in parallel.
+        """
+        states: Dict[str, PipeState] = {}
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            decomposing = pool.submit(self.decompose_rule, self.initial_state(rule_text))
+            for room in rooms:
+                state = self.initial_state(rule_text, room)
+                state.update(self.load_objects(state))
+                state.update(self.extract_user_defined_types(state))
+                states[room] = state
+            decomposed = decomposing.result()["decomposed_checks"]
+        for state in states.values():
+            state["decomposed_checks"] = decomposed
+
+        plans: Dict[tuple, tuple] = {}
+        for room, state in states.items():
+            udt_key = tuple(sorted(state["user_defined_types"]))
+            if udt_key in plans:
+                print(f"DEBUG: Reusing the spatial plan for '{room}' (same user defined types)")
+            else:
+                state.update(self.entities_matching(state))
+                state.update(self.spatial_plan(state))
+                plans[udt_key] = (state["enriched_checks"], state["spatial_plan"])
+            state["enriched_checks"], state["spatial_plan"] = plans[udt_key]
+
+        def finish(state: PipeState) -> PipeState:
+            for node in (self.execute_planned_relations, self.summarise_results, self.evaluate_rule):
+                state.update(node(state))
+            return state
+
+        with ThreadPoolExecutor(max_workers=max(len(states), 1)) as pool:
+            return dict(zip(states, pool.map(finish, states.values())))
+
+def record_rule_result(
+    outputs_dir: Path,
+    rule_id: str,
+    gs: Dict[str, Any],
+    results: Dict[str, Any],
+    duration: float,
+    final_summary: Dict[str, Any],
+    exec_times: Dict[str, float]
+) -> None:
+    """Write the per-rule file of *rule_id* and add its entry to *final_summary*."""
+    # Filter out large fields
+    filtered = {k: v for k, v in results.items()
+                if k not in ("all_objects", "all_ids", "id_to_obj", "type_to_ids", "user_defined_types", "udt_to_ids")}
+    if isinstance(filtered.get("relations"), RelationResults):
+        filtered["relations"] = filtered["relations"].to_records()
+
+    exec_times[rule_id] = duration
+    filtered["execution_time_sec"] = duration  # also write in per-rule file
+
+    # Write per-rule file
+    rule_file = outputs_dir / f"{rule_id}.json"
+    json_str = json.dumps(filtered, ensure_ascii=False, indent=2).replace('\\n', '\n')
+    with open(rule_file, "w", encoding="utf-8") as f:
+        f.write(json_str)
+
+    # --- Now extract the evaluation and compare to gold standard ---
+    gs_compliant   = gs["overall_compliant"]
+    eval_dict      = filtered.get("evaluation", {})
+    llm_compliant  = eval_dict.get("overall_compliant")
+    llm_explanation = eval_dict.get("overall_explanation", "")
+
+    correct = (
+        (llm_compliant is True  and gs_compliant is True) or
+        (llm_compliant is False and gs_compliant is False)
+    )
+
+    # --- Populate final_summary["results"][rule_id] as requested ---
+    final_summary["results"][rule_id] = {
+        "rule_text":        gs["rule_text"],
+        "llm_compliant":    llm_compliant,
+        "llm_explanation":  llm_explanation,
+        "gold_compliant":   gs_compliant,
+        "gold_explanation": gs["explanation_summary"],
+        "correct":          correct,
+        "execution_time_sec": duration
+    }
 
-        # --- Populate final_summary["results"][rule_id] as requested ---
-        final_summary["results"][rule_id] = {
-            "rule_text":        question,
-            "llm_compliant":    llm_compliant,
-            "llm_explanation":  llm_explanation,
-            "gold_compliant":   gs_compliant,
-            "gold_explanation": gs_explanation,
-            "correct":          correct,
-            "execution_time_sec": duration
-        }
 
+def write_final_summary(outputs_dir: Path, final_summary: Dict[str, Any], exec_times: Dict[str, float]) -> None:
+    """Add the execution time aggregates to *final_summary* and write final_results.json."""
     # --- Aggregate execution time stats ---
     total_time = sum(exec_times.values())
     avg_time   = total_time / len(exec_times) if exec_times else 0
@@ -337,8 +465,113 @@ def main(gold_standard, pov_id=1, extrusion_factor_s=2, tolerance_metre=0.2, nea
     with open(summary_file, "w", encoding="utf-8") as sf:
         json.dump(final_summary, sf, ensure_ascii=False, indent=2)
 
+
+def main(gold_standard, pov_id=1, extrusion_factor_s=2, tolerance_metre=0.2, near_far_threshold=1, max_concurrent_rules: int = RULE_CONCURRENCY):
+    """
+    Evaluate every rule of *gold_standard* and write the per-rule files and
+    final_results.json to outputs_results/.
+
+    Up to *max_concurrent_rules* rules run at once on one validator: they
+    share its object catalogue, the LLM client and its caches, and a pool
+    of that many database connections (a rule holds one at a time; the
+    composed relations run on the connection of the spatial execution).
+    Results are recorded in gold standard order, so the output matches a
+    sequential run (max_concurrent_rules=1).
+    """
+    # Prepare output directory
+    outputs_dir = Path(__file__).parent / "outputs_results"
+    outputs_dir.mkdir(exist_ok=True)
+
+    validator = Evaluate_Hs_Rule(pov_id, extrusion_factor_s, tolerance_metre, near_far_threshold)
+
+    # --- Here we initialize final_summary with the desired structure ---
+    final_summary: Dict[str, Any] = {"results": {}}
+
+    # To collect per-check times
+    exec_times: Dict[str, float] = {}
+
+    def run_rule(rule_id: str, gs: Dict[str, Any]) -> Tuple[Dict[str, Any], float]:
+        start_time = time.perf_counter()  # ⏱️ start
+
+        question = gs["rule_text"]
+        print(f"DEBUG: Processing rule '{rule_id}'...'{question}'")
+        results = validator.run_hs_rule_validator(question, rule_id=rule_id)
+
+        # Stop timing
+        return results, time.perf_counter() - start_time
+
+    # Run the rules concurrently, record them in order
+    batch_start = time.perf_counter()
+    open_connection_pool(max(max_concurrent_rules, 1))
+    try:
+        with ThreadPoolExecutor(max_workers=max(max_concurrent_rules, 1)) as pool:
+            futures = {rule_id: pool.submit(run_rule, rule_id, gs) for rule_id, gs in gold_standard.items()}
+            for rule_id, future in futures.items():
+                results, duration = future.result()
+                record_rule_result(outputs_dir, rule_id, gold_standard[rule_id], results, duration, final_summary, exec_times)
+    finally:
+        close_connection_pools()
+    # the per-rule times overlap: this is the time the whole batch took
+    final_summary["wall_time_sec"] = time.perf_counter() - batch_start
+
+    # Hit / miss counters of the LLM response cache for this run
+    if isinstance(validator.llm, CachedChatModel):
+        final_summary["llm_cache"] = validator.llm.cache.stats()
+        print(f"DEBUG: LLM cache {final_summary['llm_cache']}")
+    if validator.rule_cache is not None:
+        final_summary["rule_cache"] = validator.rule_cache.stats()
+        print(f"DEBUG: Rule cache {final_summary['rule_cache']}")
+
+    write_final_summary(outputs_dir, final_summary, exec_times)
+
     print("Done! Individual rule outputs and final summary written to 'outputs_results'.")
 
+
+def main_rooms(gold_standards: Dict[str, Dict[str, Any]], pov_id=1, extrusion_factor_s=2, tolerance_metre=0.2, near_far_threshold=1):
+    """
+    Batch mode over several rooms: *gold_standards* maps a database name
+    (see config.ROOM_DBS) to its gold standard.  Every rule is evaluated
+    with Evaluate_Hs_Rule.run_hs_rule_on_rooms on all the rooms that phrase
+    it the same way; each room gets the usual per-rule files and
+    final_results.json in outputs_results/<database>/.  The time recorded
+    for a rule is that of the whole batch it ran in.
+    """
+    outputs_root = Path(__file__).parent / "outputs_results"
+    validator = Evaluate_Hs_Rule(pov_id, extrusion_factor_s, tolerance_metre, near_far_threshold)
+
+    final_summaries: Dict[str, Dict[str, Any]] = {room: {"results": {}} for room in gold_standards}
+    exec_times: Dict[str, Dict[str, float]] = {room: {} for room in gold_standards}
+    for room in gold_standards:
+        (outputs_root / room).mkdir(parents=True, exist_ok=True)
+
+    rule_ids = list(dict.fromkeys(rule_id for gs in gold_standards.values() for rule_id in gs))
+    for rule_id in rule_ids:
+        # rooms asking the same question are evaluated together
+        by_text: Dict[str, List[str]] = {}
+        for room, gs in gold_standards.items():
+            if rule_id in gs:
+                by_text.setdefault(gs[rule_id]["rule_text"], []).append(room)
+
+        for question, rooms in by_text.items():
+            start_time = time.perf_counter()
+            print(f"DEBUG: Processing rule '{rule_id}' on {rooms}...'{question}'")
+            per_room = validator.run_hs_rule_on_rooms(question, rooms)
+            duration = time.perf_counter() - start_time
+            for room, results in per_room.items():
+                record_rule_result(
+                    outputs_root / room, rule_id, gold_standards[room][rule_id], results, duration,
+                    final_summaries[room], exec_times[room]
+                )
+
+    for room in gold_standards:
+        if isinstance(validator.llm, CachedChatModel):
+            final_summaries[room]["llm_cache"] = validator.llm.cache.stats()
+        if validator.rule_cache is not None:
+            final_summaries[room]["rule_cache"] = validator.rule_cache.stats()
+        write_final_summary(outputs_root / room, final_summaries[room], exec_times[room])
+
+    print("Done! Individual rule outputs and final summaries written to 'outputs_results/<database>'.")
+
     
 if __name__ == "__main__":
     # ————— Define your checks ————— 
@@ -1,7 +1,10 @@
-﻿import json
+﻿import io
+import json
+import multiprocessing
 import re
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
 from langchain_openai import ChatOpenAI
 import os
 import yaml
@@ -9,6 +12,15 @@ from dotenv import load_dotenv
 from db_utils import *
 from psycopg2 import sql
 from collections import defaultdict
+from math import isnan
+from relation_results import RelationHit, RelationResults, render_relation_text
+from config import DB_CONFIG
+from llm_cache import CachedChatModel, default_cache
+from spatial_engine.bvh import BoxTree
+from spatial_engine.graph import NEAR, TOUCH, AdjacencyGraph
+from spatial_engine.matrices import RelationMatrices, matrices_path
+from spatial_engine.relations import RelationProfiler, on_top_text
+from spatial_engine.snapshot import ModelSnapshot, snapshot_path
 
 load_dotenv()
 
@@ -29,11 +41,17 @@ def get_openrouter_llm(model_name="deepseek/deepseek-r1-0528:free"):
     )
 
 # Default LLM getter that can be modified based on preference
-def get_llm(model_name='gpt-4.1-mini-2025-04-14'):
-    """Get the default LLM instance."""
+def get_llm(model_name='gpt-4.1-mini-2025-04-14', use_cache: bool = True):
+    """
+    Get the default LLM instance.  Unless *use_cache* is False (or the cache
+    is disabled in config.LLM_CACHE), its responses are served from and
+    stored in the disk cache of llm_cache.py.
+    """
     # Change this function to use your preferred LLM
+    llm = get_openai_llm(model_name)
 
-    return get_openai_llm(model_name)
+    cache = default_cache() if use_cache else None
+    return CachedChatModel(llm, cache) if cache is not None else llm
 
     """Get the default LLM instance via OpenRouter."""
     #return get_openrouter_llm(model_name, max_tokens= 20000)
@@ -58,7 +76,8 @@ def fetch_types_and_names(
     *,
     outfile: Optional[Path | str] = "ifc_types_names.txt",  # set to None to skip writing
     file_mode: str = "w",                                   # or "a" to append
-    line_template: str = "{id}  -  {type}  -  {name}\n"     # customise if you like
+    line_template: str = "{id}  -  {type}  -  {name}\n",    # customise if you like
+    dbname: Optional[str] = None                             # default: DB_CONFIG["dbname"]
 ) -> List[Tuple[int, str, str]]:
     """
     Fetch (id, type, name) tuples from the given table/columns.
@@ -77,10 +96,10 @@ def fetch_types_and_names(
         'w' = overwrite (default), 'a' = append, etc.
     line_template : str
         Format string for each line; supports {id}, {type}, {name}.
+    dbname : str | None
+        Database to read from instead of the one in DB_CONFIG.
     """
-    conn = get_connection()
-
-    try:
+    with borrow_connection(dbname) as conn:
         with conn.cursor() as cur:
             query = sql.SQL("SELECT {id_col}, {type_col}, {name_col} FROM {tbl}").format(
                 id_col=sql.Identifier(id_column),
@@ -110,12 +129,10 @@ def fetch_types_and_names(
 
         return rows
 
-    finally:
-        conn.close()
-
-def load_objects_and_maps() -> Tuple[List[Tuple[int, str, str]], Dict[int, Tuple[str, str]], List[int], Dict[str, List[int]]]:
+def load_objects_and_maps(dbname: Optional[str] = None) -> Tuple[List[Tuple[int, str, str]], Dict[int, Tuple[str, str]], List[int], Dict[str, List[int]]]:
     """
-    Load all objects from the PostgreSQL DB and build helpful lookup maps.
+    Load all objects from the PostgreSQL DB (*dbname*, default the one in
+    DB_CONFIG) and build helpful lookup maps.
 
     Returns
     -------
@@ -125,7 +142,10 @@ def load_objects_and_maps() -> Tuple[List[Tuple[int, str, str]], Dict[int, Tuple
     type_to_ids  : Dict mapping ifc_type → list of IDs
     """
     print("DEBUG: Fetching all objects (id, type, name) from DB...")
-    all_objects = fetch_types_and_names()
+    if dbname is None:
+        all_objects = fetch_types_and_names()
+    else:
+        all_objects = fetch_types_and_names(outfile=f"ifc_types_names.{dbname}.txt", dbname=dbname)
     print(f"DEBUG: Retrieved {len(all_objects)} objects.\n")
 
     # Build id_to_obj mapping: ID → (ifc_type, name)
@@ -143,7 +163,499 @@ def load_objects_and_maps() -> Tuple[List[Tuple[int, str, str]], Dict[int, Tuple
     return all_objects, id_to_obj, all_ids, type_to_ids
 
 
-def execute_spatial_calls(
+# Upper bound on the number of (a_id, b_id) pairs held in memory at once while
+# expanding a plan entry.  Each tile is evaluated on its own and only the pairs
+# that expose a violation survive it, so peak memory does not depend on how
+# many objects room_objects holds.
+PAIR_TILE_SIZE = 2048
+
+# How the relations of a plan are evaluated:
+#   sql    : the SQL templates, pair by pair or one query per reference
+#   profile: in-process relation profiles (spatial_engine/relations.py), every
+#            relation of a reference against all objects in one evaluation
+#   matrix : packed bit matrices of every relation for every ordered pair
+#            (spatial_engine/matrices.py), built once per model snapshot and
+#            parameter set and persisted next to the snapshot
+RELATION_ENGINES = ("sql", "profile", "matrix")
+
+# References per work unit when an in-process evaluation is sharded over a
+# process pool (see iter_spatial_results, workers)
+SHARD_REFERENCES = 64
+
+# Templates an any-vs-any entry answers from the touch / near edges of a
+# sweep-and-prune pass over all boxes instead of n² pair queries
+ALL_PAIRS_TEMPLATES = {"touches", "near"}
+
+
+def iter_pair_tiles(
+    a_ids: Sequence[int],
+    b_ids: Sequence[int],
+    tile_size: int = PAIR_TILE_SIZE,
+) -> Iterator[List[Tuple[int, int]]]:
+    """
+    Yield the cross product a_ids × b_ids, without self pairs, in tiles of at
+    most *tile_size* pairs.
+
+    The full N×M grid is never materialised: a tile is filled lazily and
+    handed to the caller, which is expected to evaluate it and drop it before
+    asking for the next one.
+    """
+    if tile_size < 1:
+        raise ValueError(f"tile_size must be >= 1, got {tile_size}")
+
+    tile: List[Tuple[int, int]] = []
+    for a_id in a_ids:
+        for b_id in b_ids:
+            if a_id == b_id:
+                continue
+            tile.append((a_id, b_id))
+            if len(tile) == tile_size:
+                yield tile
+                tile = []
+    if tile:
+        yield tile
+
+
+def _interpret_spatial_rows(
+    tpl_name: str,
+    rows: List[tuple],
+    template_mode: str = "text"
+) -> Tuple[bool, Optional[float], Any]:
+    """
+    Turn the rows returned by run_spatial_call into (held, metric, text)
+    according to the column layout of each template in *template_mode*.
+    *metric* is the numeric measure a template reports (distance, containment
+    ratio), *text* its relation phrase; both are only filled in for held
+    pairs.  Flag-mode templates return no phrase: it is rendered later by
+    RelationResults for the pairs that are summarised.
+    """
+    held = False
+    metric = None
+    text = None
+    if not rows:
+        return held, metric, text
+
+    first = rows[0]
+    if template_mode in {"flags", "exists"} and tpl_name not in COMPOSED_FUNCS:
+        if tpl_name == "touches":
+            held = bool(first[0])
+        elif tpl_name in {"front", "left", "right", "behind", "above", "below"}:
+            # exists mode returns the flag alone
+            held = bool(first[0]) if template_mode == "exists" else bool(first[3])
+        elif tpl_name in {"near", "far"}:
+            # first = (distance, is_near, is_far)
+            held = bool(first[1]) if tpl_name == "near" else bool(first[2])
+            if held:
+                metric = first[0]
+        elif tpl_name == "contains":
+            # first = (is contained flag, float percentage contained x in y)
+            held = bool(first[0])
+            if held:
+                metric = first[1]
+        return held, metric, text
+
+    if tpl_name == "touches":
+        held = bool(first[0])
+        text = first[1]
+    elif tpl_name in {"front", "left", "right", "behind", "above", "below"}:
+        held = bool(first[3])
+        if held:
+            text = first[4]
+    elif tpl_name in {"near", "far"}:
+        # first = (phrase explaining relation, distance, is_near, is_far)
+        is_near = bool(first[2])
+        is_far  = bool(first[3])
+        held = is_near if tpl_name == "near" else is_far
+        if held:
+            metric = first[1]
+            text = first[0]
+    elif tpl_name == "contains":
+        # first = rows[0] = (is contained flag, float percentage contained x in y , phrase explaining relation)
+        is_contained = bool(first[0])
+        held = is_contained
+        if held:
+            metric = first[1]
+            text = first[2]
+    else:
+        # composed relations should return (flag, text)
+        held = bool(first[0])
+        if len(first) > 1:
+            text = first[1]
+
+    return held, metric, text
+
+
+def _evaluate_pair_tile(
+    conn,
+    tile: List[Tuple[int, int]],
+    tpl_name: str,
+    use_positive: bool,
+    template_paths: Dict[str, Path],
+    log_file,
+    pov_id: int,
+    extrusion_factor_s: int,
+    tolerance_metre: float,
+    near_far_threshold: float,
+    template_mode: str = "text",
+    camera_ids: Optional[Sequence[int]] = None,
+) -> Iterator[Tuple[int, int, Optional[float], Any, bool, Optional[int]]]:
+    """
+    Run *tpl_name* for every pair of one tile and yield (a_id, b_id, metric,
+    text, held, camera_id) only for the pairs whose outcome equals use_positive.
+
+    With more than one camera in *camera_ids*, camera-dependent templates are
+    evaluated from each of them (directionals in one multi-camera query per
+    pair) and yield one outcome per camera; camera_id is None otherwise.
+    """
+    per_camera = bool(camera_ids) and len(camera_ids) > 1 and tpl_name in CAMERA_TEMPLATES
+
+    for a_id, b_id in tile:
+        call = {
+            "type":     "template",
+            "template": tpl_name,
+            "a_id":     a_id,
+            "b_id":     b_id
+        }
+        if per_camera and tpl_name not in COMPOSED_FUNCS:
+            call["camera_ids"] = list(camera_ids)
+            calls = [call]
+        elif per_camera:
+            calls = [dict(call, camera_id=cam) for cam in camera_ids]
+        else:
+            calls = [call]
+
+        for call in calls:
+            # --- log the call ---
+            log_file.write("=== SPATIAL CALL ===\n")
+            log_file.write(json.dumps(call, ensure_ascii=False) + "\n")
+
+            resp = run_spatial_call(conn, call, template_paths, pov_id, extrusion_factor_s, tolerance_metre, near_far_threshold)
+
+            # --- log the result ---
+            log_file.write("RESULT:\n")
+            log_file.write(json.dumps(resp, ensure_ascii=False) + "\n\n")
+            log_file.flush()
+
+            # --- interpret held vs. not-held ---
+            if "camera_ids" in call:
+                # multi-camera directional: one (camera_id, flag) row per camera
+                outcomes = [
+                    (cam, bool(flag), None, None)
+                    for cam, flag in resp.get("rows", [])
+                ]
+            else:
+                held, metric, text = _interpret_spatial_rows(tpl_name, resp.get("rows", []), template_mode)
+                outcomes = [(call.get("camera_id"), held, metric, text)]
+
+            # keep only matches that expose a violation
+            for cam, held, metric, text in outcomes:
+                if held == use_positive:
+                    yield a_id, b_id, metric, text, held, cam
+
+
+def _evaluate_one_to_many(
+    conn,
+    tpl_name: str,
+    a_id: int,
+    b_ids: Sequence[int],
+    use_positive: bool,
+    log_file,
+    pov_id: int,
+    extrusion_factor_s: int,
+    tolerance_metre: float,
+    near_far_threshold: float,
+) -> Iterator[Tuple[int, int, Optional[float], Any, bool, Optional[int]]]:
+    """
+    One reference against many candidates with a single one-to-many query
+    (sql/many) instead of one call per pair: "near" through
+    db_utils.run_near_many, directionals through run_directional_many.
+    Yields the same tuples, in the same b_ids order, as _evaluate_pair_tile.
+    """
+    call = {"type": "template", "template": tpl_name, "a_id": a_id, "b_source": "any_nearby"}
+    log_file.write("=== SPATIAL CALL ===\n")
+    log_file.write(json.dumps(call, ensure_ascii=False) + "\n")
+
+    if tpl_name == "near":
+        held_metric = run_near_many(conn, a_id, near_far_threshold)
+    else:
+        held_metric = dict.fromkeys(run_directional_many(
+            conn, tpl_name, a_id, pov_id, extrusion_factor_s, tolerance_metre
+        ))
+
+    log_file.write("RESULT:\n")
+    log_file.write(json.dumps({"call": call, "held": held_metric}, ensure_ascii=False) + "\n\n")
+    log_file.flush()
+
+    for b_id in b_ids:
+        if b_id == a_id:
+            continue
+        held = b_id in held_metric
+        if held == use_positive:
+            yield a_id, b_id, held_metric.get(b_id), None, held, None
+
+
+def _evaluate_contains_batch(
+    conn,
+    a_ids: Sequence[int],
+    b_ids: Sequence[int],
+    use_positive: bool,
+    log_file,
+) -> Iterator[Tuple[int, int, Optional[float], Any, bool, Optional[int]]]:
+    """
+    "contains" for the whole a_ids × b_ids grid with one batched query
+    (db_utils.run_contains_many): only pairs whose boxes overlap are
+    measured, every other pair is not contained.  Yields the same tuples, in
+    the same pair order, as _evaluate_pair_tile.
+    """
+    call = {"type": "template", "template": "contains", "a_ids": len(a_ids), "b_ids": len(b_ids)}
+    log_file.write("=== SPATIAL CALL ===\n")
+    log_file.write(json.dumps(call, ensure_ascii=False) + "\n")
+
+    ratios = run_contains_many(conn, a_ids, b_ids)
+
+    log_file.write("RESULT:\n")
+    log_file.write(json.dumps(
+        {"call": call, "held": [[a, b, pct] for (a, b), pct in ratios.items()]},
+        ensure_ascii=False
+    ) + "\n\n")
+    log_file.flush()
+
+    for a_id in a_ids:
+        for b_id in b_ids:
+            if a_id == b_id:
+                continue
+            held = (a_id, b_id) in ratios
+            if held == use_positive:
+                yield a_id, b_id, ratios.get((a_id, b_id)), None, held, None
+
+
+def _evaluate_in_process(
+    evaluators: Dict[int, Any],
+    tpl_name: str,
+    a_ids: Sequence[int],
+    b_ids: Sequence[int],
+    use_positive: bool,
+    log_file,
+    camera_ids: Sequence[int],
+) -> Iterator[Tuple[int, int, Optional[float], Any, bool, Optional[int]]]:
+    """
+    Answer *tpl_name* for the a_ids × b_ids grid in-process, from one
+    evaluator per camera: RelationProfiler (profiles of the a_ids, computed
+    once and shared by every template of the plan) or RelationMatrices (one
+    packed row per reference).  Camera-dependent templates are answered from
+    each camera when there are several, like _evaluate_pair_tile.  Yields
+    the same tuples, in the same pair order.
+    """
+    per_camera = len(camera_ids) > 1 and tpl_name in CAMERA_TEMPLATES
+    cams = list(camera_ids) if per_camera else [camera_ids[0]]
+
+    call = {"type": "in_process", "template": tpl_name, "a_ids": len(a_ids), "b_ids": len(b_ids), "camera_ids": cams}
+    log_file.write("=== SPATIAL CALL ===\n")
+    log_file.write(json.dumps(call, ensure_ascii=False) + "\n\n")
+    log_file.flush()
+
+    for a_id in a_ids:
+        others = [b_id for b_id in b_ids if b_id != a_id]
+        if not others:
+            continue
+        outcomes = []
+        for cam in cams:
+            held, metric = evaluators[cam].evaluate(tpl_name, a_id, others)
+            a_above_b = evaluators[cam].evaluate("above", a_id, others)[0] if tpl_name == "on_top_of" else None
+            outcomes.append((cam, held, metric, a_above_b))
+
+        # only the neighbours with a matching outcome from some camera are visited
+        hits = sorted(set().union(*(
+            map(int, (held == use_positive).nonzero()[0]) for _, held, _, _ in outcomes
+        )))
+        for k in hits:
+            b_id = others[k]
+            for cam, held, metric, a_above_b in outcomes:
+                if bool(held[k]) != use_positive:
+                    continue
+                text = None
+                if tpl_name == "on_top_of":
+                    text = (
+                        on_top_text(a_id, b_id, bool(a_above_b[k])) if held[k]
+                        else "No object is on top of the other."
+                    )
+                value = None if isnan(metric[k]) else float(metric[k])
+                yield a_id, b_id, value, text, bool(held[k]), cam if per_camera else None
+
+
+def _evaluate_from_graph(
+    graph: AdjacencyGraph,
+    snapshot: ModelSnapshot,
+    tpl_name: str,
+    a_ids: Sequence[int],
+    b_ids: Sequence[int],
+    use_positive: bool,
+    log_file,
+    id_to_obj: Optional[Dict[int, Tuple[str, str]]] = None,
+) -> Iterator[Tuple[int, int, Optional[float], Any, bool, Optional[int]]]:
+    """
+    "touches" / "near" for the a_ids × b_ids grid from the edges of the
+    adjacency graph (built by one sweep-and-prune pass): a held pair is an
+    edge, so with use_positive only the edges of each reference are visited.
+    Yields the same tuples, in the same pair order, as _evaluate_pair_tile;
+    with *id_to_obj* (the text mode) they carry the relation text the text
+    templates write, i.e. for the held pairs and every "touches" pair.
+    """
+    kind = TOUCH if tpl_name == "touches" else NEAR
+    call = {"type": "all_pairs", "template": tpl_name, "a_ids": len(a_ids), "b_ids": len(b_ids), "edges": graph.n_edges}
+    log_file.write("=== SPATIAL CALL ===\n")
+    log_file.write(json.dumps(call, ensure_ascii=False) + "\n\n")
+    log_file.flush()
+
+    position = {b_id: k for k, b_id in enumerate(b_ids)}
+    for a_id in a_ids:
+        rows, dists = graph.edges(snapshot.row(a_id), kind)
+        held = {
+            int(b_id): (float(d) if tpl_name == "near" else None)
+            for b_id, d in zip(snapshot.ids[rows], dists)
+            if int(b_id) in position
+        }
+        if use_positive:
+            for b_id in sorted(held, key=position.__getitem__):
+                text = render_relation_text(tpl_name, a_id, b_id, id_to_obj) if id_to_obj else None
+                yield a_id, b_id, held[b_id], text, True, None
+        else:
+            for b_id in b_ids:
+                if b_id != a_id and b_id not in held:
+                    text = (
+                        render_relation_text(tpl_name, a_id, b_id, id_to_obj)
+                        if id_to_obj and tpl_name == "touches" else None
+                    )
+                    yield a_id, b_id, None, text, False, None
+
+
+# In-process evaluators of a shard worker, set once by _init_shard_worker
+_SHARD_EVALUATORS: Dict[int, Any] = {}
+
+
+def _build_evaluators(
+    snapshot: ModelSnapshot,
+    relation_engine: str,
+    camera_ids: Sequence[int],
+    extrusion_factor_s: int,
+    tolerance_metre: float,
+    near_far_threshold: float,
+    snap_file: Optional[Path] = None,
+) -> Dict[int, Any]:
+    """One relation profiler or one set of relation matrices per camera."""
+    graph = AdjacencyGraph.build(snapshot, near_far_threshold)
+    print(f"DEBUG: Adjacency graph: {graph.n_edges} touch/near edges")
+    tree = BoxTree(snapshot.boxes)
+    if relation_engine == "profile":
+        return {
+            cam: RelationProfiler(
+                snapshot, cam, extrusion_factor_s, tolerance_metre, near_far_threshold, graph=graph, tree=tree
+            )
+            for cam in camera_ids
+        }
+    return {
+        cam: RelationMatrices.load_or_build(
+            snapshot, cam, extrusion_factor_s, tolerance_metre, near_far_threshold,
+            matrices_path(snap_file, cam), graph=graph, tree=tree
+        )
+        for cam in camera_ids
+    }
+
+
+def _init_shard_worker(
+    snap_file: Path,
+    relation_engine: str,
+    camera_ids: Sequence[int],
+    extrusion_factor_s: int,
+    tolerance_metre: float,
+    near_far_threshold: float,
+) -> None:
+    """
+    Process-pool initializer: attach the worker to the snapshot saved by the
+    parent (and, for the matrix engine, to the matrices saved next to it).
+    """
+    snapshot = ModelSnapshot.load(snap_file)
+    _SHARD_EVALUATORS.update(_build_evaluators(
+        snapshot, relation_engine, camera_ids, extrusion_factor_s, tolerance_metre, near_far_threshold, snap_file
+    ))
+
+
+def _evaluate_shard(
+    unit: Tuple[List[Tuple[str, List[int], List[int]]], bool, List[int]]
+) -> List[Tuple[str, List[Tuple[int, int, Optional[float], Any, bool, Optional[int]]]]]:
+    """
+    Work unit of a shard worker: one chunk of reference IDs of every
+    template of a plan entry.  Returns, per template, its log text and its
+    matching outcomes.
+    """
+    templates, use_positive, camera_ids = unit
+    out = []
+    for tpl_name, a_ids, b_ids in templates:
+        log = io.StringIO()
+        hits = list(_evaluate_in_process(_SHARD_EVALUATORS, tpl_name, a_ids, b_ids, use_positive, log, camera_ids))
+        out.append((log.getvalue(), hits))
+    return out
+
+
+def _iter_plan_entries_sharded(
+    executor: ProcessPoolExecutor,
+    plan: Dict,
+    all_ids: List[int],
+    log_file,
+    udt_to_ids: Dict[str, List[int]],
+    camera_ids: Sequence[int],
+    visible_ids: Optional[Set[int]] = None,
+    shard_size: int = SHARD_REFERENCES,
+    culled: Optional[Dict[int, Set[int]]] = None,
+) -> Iterator[RelationHit]:
+    """
+    In-process evaluation of the whole plan on a process pool.
+
+    Every plan entry is cut into (entry, reference-ID chunk) work units,
+    each holding the k-th chunk of the reference IDs of every template of
+    the entry, so a worker computes the profile of a reference once for all
+    the templates.  All units are submitted up front and collected in
+    submission order; the hits of an entry are then yielded template by
+    template, chunk by chunk, i.e. in exactly the order of the serial
+    evaluation, whatever the number of workers.
+    """
+    entries = []
+    for entry in plan.get("plans", []):
+        use_positive = entry.get("use_positive", True)
+        hidden = culled.setdefault(entry["check_index"], set()) if culled is not None else None
+        templates = [
+            (tmpl["template"], *_expand_template_ids(entry, tmpl, all_ids, udt_to_ids, visible_ids, log_file, hidden))
+            for tmpl in entry["templates"]
+        ]
+        n_chunks = max([-(-len(a_ids) // shard_size) for _, a_ids, _ in templates] + [1])
+        units = [
+            (
+                [(tpl_name, list(a_ids[k * shard_size:(k + 1) * shard_size]), list(b_ids))
+                 for tpl_name, a_ids, b_ids in templates],
+                use_positive,
+                list(camera_ids),
+            )
+            for k in range(n_chunks)
+        ]
+        entries.append((entry, templates, units))
+
+    print(f"DEBUG: Sharded the plan into {sum(len(u) for _, _, u in entries)} work units")
+    results = executor.map(_evaluate_shard, [unit for _, _, units in entries for unit in units])
+
+    for entry, templates, units in entries:
+        idx = entry["check_index"]
+        print(f"DEBUG: check_index={idx}, use_positive={entry.get('use_positive', True)}")
+        chunks = [next(results) for _ in units]
+        for t, (tpl_name, _, _) in enumerate(templates):
+            for chunk in chunks:
+                log_text, hits = chunk[t]
+                log_file.write(log_text)
+                for a_id, b_id, metric, text, held, cam in hits:
+                    yield RelationHit(idx, tpl_name, a_id, b_id, metric, text, held, cam)
+        log_file.flush()
+
+
+def iter_spatial_results(
     plan: Dict,
     all_objects: List[Tuple[int, str, str]],
     template_paths: Dict[str, Path],
@@ -153,11 +665,32 @@ def execute_spatial_calls(
     extrusion_factor_s: int,
     tolerance_metre: float,
     near_far_threshold: float,
-
-) -> List[Dict]:
+    pair_tile_size: int = PAIR_TILE_SIZE,
+    template_mode: str = "text",
+    camera_ids: Optional[Sequence[int]] = None,
+    fov_culling: bool = False,
+    relation_engine: str = "sql",
+    workers: int = 1,
+    dbname: Optional[str] = None,
+    culled: Optional[Dict[int, Set[int]]] = None,
+) -> Iterator[RelationHit]:
     """
     Execute spatial calls (SQL templates) for each entry in the plan,
-    using a provided udt_to_ids map to expand any IFC-type UDTs into real object IDs.
+    using a provided udt_to_ids map to expand any IFC-type UDTs into real object IDs,
+    and yield every result as soon as its pair has been evaluated.
+
+    Results come out in plan order, one check_index after the other, which is
+    what iter_plan_summaries relies on to close a check's summary while later
+    checks are still running.
+
+    Candidate pairs are generated and evaluated in tiles of at most
+    *pair_tile_size* pairs (see iter_pair_tiles); a tile only contributes its
+    held pairs, so an any-vs-any entry never builds the dense N×N pair list.
+    "near" and (single-camera) directional templates against any_nearby
+    candidates skip the pairs and run one index-assisted query per reference
+    instead (see _evaluate_one_to_many), and any-vs-any "touches" / "near"
+    entries come from one sweep-and-prune pass over all boxes (see
+    _evaluate_from_graph).
 
     Args:
       plan: the spatial_plan dict (with plans[*].reference_ifc_types / against_ifc_types)
@@ -165,130 +698,311 @@ def execute_spatial_calls(
       template_paths: mapping from template name to .sql Path
       log_file: open file handle for debugging
       udt_to_ids: dict mapping each UDT string → list of matching object IDs
-
-    Returns:
-      A list of result dicts for those object pairs that expose a violation
-      (i.e. held == use_positive).
+      pair_tile_size: maximum number of candidate pairs evaluated per tile
+      template_mode: flavour of the files in template_paths ("text",
+        "flags" or "exists", see db_utils.TEMPLATE_MODE_DIRS); outside "text"
+        mode no SQL builds relation text, it is rendered only for the pairs
+        summarised
+      camera_ids: cameras to evaluate the camera-dependent templates from
+        (default [pov_id]).  With several cameras every directional pair is
+        run once for all of them and yields one hit per camera, tagged with
+        its camera_id; touches/near/far/contains are still run once.
+      fov_culling: opt in to dropping the references and candidates of
+        directional templates outside the view cone of every camera
+        (camera_object_geometry.in_view) before any template runs, and log
+        them (see _expand_template_ids).  This answers the check for the
+        scene the cameras show, so it changes front/behind/left/right
+        results.  Nothing is culled unless every camera has a stored
+        view_azimuth and a fov below 360 (see visible_object_ids).
+      relation_engine: "sql" runs the SQL templates; "profile" loads a
+        ModelSnapshot once and answers every template from in-process
+        relation profiles (see RELATION_ENGINES), so the templates of one
+        entry cost a single evaluation per reference object; "matrix"
+        answers them from the packed relation matrices of the snapshot,
+        loaded from snapshots/ or built and saved there on first use.
+      workers: with more than one and an in-process engine, the plan is
+        sharded into (plan entry, reference-ID chunk) work units evaluated
+        on a pool of that many processes, each attached to the snapshot
+        saved under snapshots/ (see _iter_plan_entries_sharded); the hits
+        come out in the same order as with a single process.  The sql
+        engine ignores it.
+      dbname: database holding the model (default DB_CONFIG["dbname"]);
+        the snapshot of the in-process engines is saved under its name.
+      culled: filled, as the plan runs, with {check_index: reference IDs
+        dropped by fov_culling}; pass it to iter_plan_summaries so those
+        references read "not visible from camera N" rather than "No
+        relation".  A check's set is complete before its first hit.
+
+    Yields:
+      One RelationHit per object pair that exposes a violation
+      (i.e. held == use_positive).  Names and types are not copied into it;
+      they are resolved from the catalogue when a record is needed.
     """
 
-    # Build quick lookup from ID to (type,name)
-    id_to_obj = {oid: (ifc, name) for oid, ifc, name in all_objects}
+    if relation_engine not in RELATION_ENGINES:
+        raise ValueError(f"relation_engine must be one of {RELATION_ENGINES}, got {relation_engine!r}")
+
     all_ids = [obj_id for obj_id, _, _ in all_objects]
 
-    conn = get_connection()
-    results: List[Dict] = []
+    camera_ids = list(camera_ids) if camera_ids else [pov_id]
+
+    # from the shared pool when rules run concurrently (see main.main)
+    with borrow_connection(dbname) as conn:
+        for cam in camera_ids:
+            ensure_camera_geometry(conn, cam)
+        visible_ids = visible_object_ids(conn, camera_ids) if fov_culling else None
+        if fov_culling and visible_ids is None:
+            print(f"DEBUG: No view cone for cameras {camera_ids}, nothing is culled")
+
+        evaluators = None
+        if relation_engine != "sql":
+            snapshot = ModelSnapshot.from_db(conn)
+            print(f"DEBUG: Loaded model snapshot ({len(snapshot)} objects) for the {relation_engine} engine")
+            snap_file = snapshot_path(dbname or DB_CONFIG["dbname"])
+            if relation_engine == "matrix" or workers > 1:
+                snapshot.save(snap_file)
+
+            if workers > 1:
+                if relation_engine == "matrix":
+                    # built (or loaded) once here, so every worker only loads them
+                    _build_evaluators(
+                        snapshot, relation_engine, camera_ids,
+                        extrusion_factor_s, tolerance_metre, near_far_threshold, snap_file
+                    )
+                print(f"DEBUG: Sharding the {relation_engine} engine over {workers} processes")
+                # spawn, not fork: the parent may already run compiled
+                # kernels on a thread pool (spatial_engine/jit.py)
+                with ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_shard_worker,
+                    initargs=(snap_file, relation_engine, camera_ids,
+                              extrusion_factor_s, tolerance_metre, near_far_threshold),
+                ) as executor:
+                    yield from _iter_plan_entries_sharded(
+                        executor, plan, all_ids, log_file, udt_to_ids, camera_ids, visible_ids,
+                        culled=culled
+                    )
+                return
+
+            evaluators = _build_evaluators(
+                snapshot, relation_engine, camera_ids,
+                extrusion_factor_s, tolerance_metre, near_far_threshold, snap_file
+            )
+
+        id_to_obj = (
+            {oid: (ifc, name) for oid, ifc, name in all_objects} if template_mode == "text" else None
+        )
+        yield from _iter_plan_entries(
+            conn, plan, all_ids, template_paths, log_file, udt_to_ids,
+            pov_id, extrusion_factor_s, tolerance_metre, near_far_threshold, pair_tile_size,
+            template_mode, camera_ids, visible_ids, evaluators, culled, id_to_obj
+        )
 
+
+def _expand_template_ids(
+    entry: Dict,
+    tmpl: Dict,
+    all_ids: List[int],
+    udt_to_ids: Dict[str, List[int]],
+    visible_ids: Optional[Set[int]] = None,
+    log_file=None,
+    culled: Optional[Set[int]] = None,
+) -> Tuple[List[int], List[int]]:
+    """
+    (a_ids, b_ids) of one template of a plan entry: the UDTs of its sources
+    expanded into object IDs.
+
+    When *visible_ids* is given, a directional template only sees the
+    objects inside some camera's view cone: references and candidates
+    outside every cone are both dropped, for either polarity of the entry.
+    The check then answers for the scene the cameras show, rather than
+    checking every reference against only part of its candidates.  The
+    dropped IDs are written to *log_file*, and the dropped references are
+    added to *culled* when given.
+    """
+    tpl_name = tmpl["template"]
+    a_src, b_src = tmpl["a_source"], tmpl["b_source"]
+
+    # Expand reference IDs
+    if a_src == "reference_ifc_types":
+        # flatten the lists of IDs for each UDT
+        a_ids = [
+            oid
+            for udt in entry["reference"].get("reference_ifc_types", [])
+            for oid in udt_to_ids.get(udt, [])
+        ]
+    else:  # any_nearby or reference_ids
+        # if they provided explicit reference_ids, use them; otherwise all IDs
+        a_ids = entry["reference"].get("reference_ids", all_ids)
+
+    # Expand against IDs
+    if b_src == "against_ifc_types":
+        b_ids = [
+            oid
+            for udt in entry["against"].get("against_ifc_types", [])
+            for oid in udt_to_ids.get(udt, [])
+        ]
+    else:  # any_nearby or against_ids
+        b_ids = (
+            entry["against"].get("against_ids", all_ids)
+            if b_src == "against_ids"
+            else all_ids
+        )
+
+    # Frustum prefilter: objects no camera sees are dropped on both sides
+    if visible_ids is not None and tpl_name in DIRECTIONAL_TEMPLATES:
+        culled_a = sorted({oid for oid in a_ids if oid not in visible_ids})
+        culled_b = sorted({oid for oid in b_ids if oid not in visible_ids})
+        a_ids = [oid for oid in a_ids if oid in visible_ids]
+        b_ids = [oid for oid in b_ids if oid in visible_ids]
+        print(f"DEBUG: {tpl_name}: {len(culled_a)} references and {len(culled_b)} candidates outside the view cone")
+        if culled is not None:
+            culled.update(culled_a)
+        if log_file is not None and (culled_a or culled_b):
+            log_file.write(
+                f"FOV culled for check_index={entry.get('check_index')} {tpl_name}: "
+                f"references {culled_a}, candidates {culled_b}\n"
+            )
+
+    return a_ids, b_ids
+
+
+def _iter_plan_entries(
+    conn,
+    plan: Dict,
+    all_ids: List[int],
+    template_paths: Dict[str, Path],
+    log_file,
+    udt_to_ids: Dict[str, List[int]],
+    pov_id: int,
+    extrusion_factor_s: int,
+    tolerance_metre: float,
+    near_far_threshold: float,
+    pair_tile_size: int,
+    template_mode: str,
+    camera_ids: Optional[Sequence[int]] = None,
+    visible_ids: Optional[Set[int]] = None,
+    evaluators: Optional[Dict[int, Any]] = None,
+    culled: Optional[Dict[int, Set[int]]] = None,
+    id_to_obj: Optional[Dict[int, Tuple[str, str]]] = None,
+) -> Iterator[RelationHit]:
+    """
+    Body of iter_spatial_results, run against an already open connection.
+    *visible_ids*, when given, restricts the references and candidates of
+    directional templates to the objects some camera can see, and the
+    references dropped are recorded per check in *culled*; *evaluators* (relation
+    profilers or matrices, one per camera), when given, answer every
+    template instead of the SQL.  *id_to_obj*, the object catalogue, lets
+    the pairs answered from the adjacency graph carry the relation text in
+    the text mode.
+    """
+    graph = snapshot = None     # built on the first any-vs-any touches / near entry
     for entry in plan.get("plans", []):
         idx          = entry["check_index"]
         use_positive = entry.get("use_positive", True)
         print(f"DEBUG: check_index={idx}, use_positive={use_positive}")
+        hidden = culled.setdefault(idx, set()) if culled is not None else None
 
         for tmpl in entry["templates"]:
             tpl_name = tmpl["template"]
             a_src, b_src = tmpl["a_source"], tmpl["b_source"]
 
-            
-            # Expand reference IDs
-            if a_src == "reference_ifc_types":
-                # flatten the lists of IDs for each UDT
-                a_ids = [
-                    oid
-                    for udt in entry["reference"].get("reference_ifc_types", [])
-                    for oid in udt_to_ids.get(udt, [])
-                ]
-            else:  # any_nearby or reference_ids
-                # if they provided explicit reference_ids, use them; otherwise all IDs
-                a_ids = entry["reference"].get("reference_ids", list(id_to_obj))
-
-            # Expand against IDs
-            if b_src == "against_ifc_types":
-                b_ids = [
-                    oid
-                    for udt in entry["against"].get("against_ifc_types", [])
-                    for oid in udt_to_ids.get(udt, [])
-                ]
-            else:  # any_nearby or against_ids
-                b_ids = (
-                    entry["against"].get("against_ids", list(id_to_obj))
-                    if b_src == "against_ids"
-                    else list(id_to_obj)
-                )
-            
-
-            for a_id in a_ids:
-                a_type, a_name = id_to_obj[a_id]
-                for b_id in b_ids:
-                    if a_id == b_id:
-                        continue
-                    b_type, b_name = id_to_obj[b_id]
-
-                    call = {
-                        "type":     "template",
-                        "template": tpl_name,
-                        "a_id":     a_id,
-                        "b_id":     b_id
-                    }
-
-                    # --- log the call ---
-                    log_file.write("=== SPATIAL CALL ===\n")
-                    log_file.write(json.dumps(call, ensure_ascii=False) + "\n")
-
-                    resp = run_spatial_call(conn, call, template_paths, pov_id, extrusion_factor_s, tolerance_metre, near_far_threshold)
-
-                    # --- log the result ---
-                    log_file.write("RESULT:\n")
-                    log_file.write(json.dumps(resp, ensure_ascii=False) + "\n\n")
-                    log_file.flush()
-
-                    # --- interpret held vs. not-held ---
-                    held = False
-                    relation_value = None
-                    rows = resp.get("rows", [])
-                    if rows:
-                        first = rows[0]
-                        if tpl_name == "touches":
-                            held = bool(first[0])
-                            relation_value = first[1]
-                        elif tpl_name in {"front", "left", "right", "behind", "above", "below"}:
-                            held = bool(first[3])
-                            if held:
-                                relation_value = first[4]
-                        elif tpl_name in {"near", "far"}:
-                            is_near = bool(first[2])
-                            is_far  = bool(first[3])
-                            held = is_near if tpl_name == "near" else is_far
-                            if held:
-                                relation_value = first[0]
-                        elif tpl_name == "contains":
-                            # first = rows[0] = (is contained flag, float percentage contained x in y , phrase explaining relation)
-                            is_contained = bool(first[0])
-                            held = is_contained
-                            if held:
-                                relation_value = first[2]
+            a_ids, b_ids = _expand_template_ids(entry, tmpl, all_ids, udt_to_ids, visible_ids, log_file, hidden)
 
-                        else:
-                            # composed relations should return (flag, text)
-                            held = bool(first[0])
-                            if len(first) > 1:
-                                relation_value = first[1]
-
-                    # save only matches that expose a violation
-                    if held == use_positive:
-                        results.append({
-                            "check_index":    idx,
-                            "template":       tpl_name,
-                            "a_id":           a_id,
-                            "a_name":         a_name,
-                            "a_type":         a_type,
-                            "b_id":           b_id,
-                            "b_name":         b_name,
-                            "b_type":         b_type,
-                            "relation_value": relation_value
-                        })
+            # profiles / matrices: every template of the plan answered in-process
+            if evaluators is not None:
+                for a_id, b_id, metric, text, held, cam in _evaluate_in_process(
+                    evaluators, tpl_name, a_ids, b_ids, use_positive, log_file,
+                    camera_ids or [pov_id]
+                ):
+                    yield RelationHit(idx, tpl_name, a_id, b_id, metric, text, held, cam)
+                continue
+
+            # any-vs-any touches / near: every pair from the sweep-and-prune graph
+            if tpl_name in ALL_PAIRS_TEMPLATES and a_src == "any_nearby" and b_src == "any_nearby":
+                if graph is None:
+                    snapshot = ModelSnapshot.from_db(conn)
+                    graph = AdjacencyGraph.build(snapshot, near_far_threshold)
+                    print(f"DEBUG: Swept {len(snapshot)} objects into {graph.n_edges} touch/near edges")
+                for a_id, b_id, metric, text, held, cam in _evaluate_from_graph(
+                    graph, snapshot, tpl_name, a_ids, b_ids, use_positive, log_file,
+                    id_to_obj if template_mode == "text" else None
+                ):
+                    yield RelationHit(idx, tpl_name, a_id, b_id, metric, text, held, cam)
+                continue
+
+            # near / directionals against any_nearby: one query per reference
+            single_camera = not camera_ids or len(camera_ids) == 1
+            if b_src == "any_nearby" and (
+                tpl_name == "near" or (tpl_name in DIRECTIONAL_TEMPLATES and single_camera)
+            ):
+                for a_id in a_ids:
+                    for a, b_id, metric, text, held, cam in _evaluate_one_to_many(
+                        conn, tpl_name, a_id, b_ids, use_positive, log_file,
+                        camera_ids[0] if camera_ids else pov_id,
+                        extrusion_factor_s, tolerance_metre, near_far_threshold
+                    ):
+                        yield RelationHit(idx, tpl_name, a, b_id, metric, text, held, cam)
+                continue
 
+            # contains: one batched, overlap-pruned query for the whole grid;
+            # the text mode keeps the per-pair template for its relation text
+            if tpl_name == "contains" and template_mode != "text":
+                for a_id, b_id, metric, text, held, cam in _evaluate_contains_batch(
+                    conn, a_ids, b_ids, use_positive, log_file
+                ):
+                    yield RelationHit(idx, tpl_name, a_id, b_id, metric, text, held, cam)
+                continue
+
+            for tile in iter_pair_tiles(a_ids, b_ids, pair_tile_size):
+                for a_id, b_id, metric, text, held, cam in _evaluate_pair_tile(
+                    conn, tile, tpl_name, use_positive, template_paths, log_file,
+                    pov_id, extrusion_factor_s, tolerance_metre, near_far_threshold,
+                    template_mode, camera_ids
+                ):
+                    yield RelationHit(idx, tpl_name, a_id, b_id, metric, text, held, cam)
+
+
+def execute_spatial_calls(
+    plan: Dict,
+    all_objects: List[Tuple[int, str, str]],
+    template_paths: Dict[str, Path],
+    log_file,
+    udt_to_ids: Dict[str, List[int]],
+    pov_id: int,
+    extrusion_factor_s: int,
+    tolerance_metre: float,
+    near_far_threshold: float,
+    pair_tile_size: int = PAIR_TILE_SIZE,
+    template_mode: str = "text",
+    camera_ids: Optional[Sequence[int]] = None,
+    fov_culling: bool = False,
+    relation_engine: str = "sql",
+    workers: int = 1,
+    dbname: Optional[str] = None,
+    culled: Optional[Dict[int, Set[int]]] = None,
+) -> RelationResults:
+    """
+    Collect iter_spatial_results() into a RelationResults store.
+
+    Returns:
+      The relations of those object pairs that expose a violation
+      (i.e. held == use_positive).  Iterating the store yields the usual
+      result dicts; to_records() materialises them as a list.
+    """
+    id_to_obj = {oid: (ifc, name) for oid, ifc, name in all_objects}
+    results = RelationResults(id_to_obj)
+    for hit in iter_spatial_results(
+        plan, all_objects, template_paths, log_file, udt_to_ids,
+        pov_id, extrusion_factor_s, tolerance_metre, near_far_threshold,
+        pair_tile_size, template_mode, camera_ids, fov_culling, relation_engine, workers, dbname, culled
+    ):
+        results.append_hit(hit)
     print(f"DEBUG: Collected {len(results)} results matching use_positive.\n")
     return results
 
+
 def extract_user_defined_types(
     elements: List[Tuple[int, str, str]]
 ) -> List[str]:
@@ -395,111 +1109,206 @@ def ids_from_udts(
     return mapping
 
 
-def summarize_plan_results_to_list(
-    spatial_plan: Dict[str, Any],
-    results: List[Dict[str, Any]],
+def _summarize_plan_block(
+    chk: int,
+    plan: Dict[str, Any],
+    idx: Dict[Tuple[int, str], List[Dict[str, Any]]],
+    result_a_ids: Iterable[int],
     udt_to_ids: Optional[Dict[str, List[int]]],
-    id_to_obj: Dict[int, Tuple[str, str]]
-) -> List[str]:
+    id_to_obj: Dict[int, Tuple[str, str]],
+    culled: Iterable[int] = (),
+    camera_ids: Optional[Sequence[int]] = None,
+) -> str:
     """
-    Produce compact, multi-line summaries grouped by plan and reference object.
-    - One block per plan, with a header.
-    - Under each header, one subsection per reference ID, listing each tested template
-      and its targets (or 'none').
-    - Special cases:
-      • 'contains': raw relation_value(s).
-      • 'on_top_of': parse relation_value to extract X/Y IDs and lookup names.
+    Build the summary block of a single plan entry.
+
+    *idx* holds only this check's results, keyed by (a_id, template), and
+    *result_a_ids* the reference IDs that produced at least one result.
+    The directional templates of the references in *culled* were not
+    evaluated (see _expand_template_ids) and read "not visible from camera
+    N", N listing *camera_ids*; a reference of type "any" is only listed
+    when it has results, culled or not.
     """
-    # Build plan map
-    plan_map = {e["check_index"]: e for e in spatial_plan.get("plans", [])}
+    # 1) Header
+    rels = [t["template"] for t in plan["templates"]]
+    rels_str = ", ".join(rels)
+    rt = plan.get("relation_text", "")
+    against = plan["against"]
+    if against["type"] == "any":
+        against_desc = "any object instances"
+    else:
+        ag = against.get("against_ifc_types", [])
+        against_desc = ", ".join(ag) + " instances"
+
+    header = f"Plan {chk} (\"{rt}\"): tested [{rels_str}] against {against_desc}"
+
+    # 2) Reference IDs
+    if plan["reference"]["type"] == "any" or udt_to_ids is None:
+        a_ids = set(result_a_ids)
+    else:
+        a_ids = set()
+        for udt in plan["reference"]["reference_ifc_types"]:
+            a_ids.update(udt_to_ids.get(udt, []))
+
+    culled = set(culled)
+    if camera_ids:
+        cameras = ("camera " if len(camera_ids) == 1 else "cameras ") + ", ".join(map(str, camera_ids))
+    else:
+        cameras = "the camera"
+
+    # 3) Build lines for this plan
+    lines = [header]
+    for a_id in sorted(a_ids):
+        a_name = id_to_obj[a_id][1]
+        lines.append(f"  • {a_name} (ID:{a_id}):")
+        for tpl in rels:
+            recs = idx.get((a_id, tpl), [])
+
+            # contains: raw
+            if tpl == "contains":
+                if recs:
+                    for r in recs:
+                        lines.append(f"      – contains: {r['relation_value']}")
+                else:
+                    lines.append(f"      – contains: none")
+                continue
 
-    # Index results by (check_index, a_id, template)
-    idx: Dict[Tuple[int,int,str], List[Dict[str,Any]]] = defaultdict(list)
-    for r in results:
-        idx[(r["check_index"], r["a_id"], r["template"])].append(r)
-
-    summaries: List[str] = []
-
-    for chk, plan in plan_map.items():
-        # 1) Header
-        rels = [t["template"] for t in plan["templates"]]
-        rels_str = ", ".join(rels)
-        rt = plan.get("relation_text", "")
-        against = plan["against"]
-        if against["type"] == "any":
-            against_desc = "any object instances"
-        else:
-            ag = against.get("against_ifc_types", [])
-            against_desc = ", ".join(ag) + " instances"
+            # on_top_of: parse IDs and lookup names
+            if tpl == "on_top_of":
+                if recs:
+                    for r in recs:
+                        rv = r["relation_value"]
+                        ids = re.findall(r"ID[:=] *(\d+)", rv)
+                        if len(ids) >= 2:
+                            x, y = map(int, ids[:2])
+                            xn = id_to_obj[x][1]
+                            yn = id_to_obj[y][1]
+                            lines.append(
+                                f"      – on_top_of: {xn} (ID:{x}) is on top of {yn} (ID:{y})"
+                            )
+                        else:
+                            lines.append(f"      – on_top_of: {rv}")
+                else:
+                    lines.append(f"      – on_top_of: none")
+                continue
 
-        header = f"Plan {chk} (\"{rt}\"): tested [{rels_str}] against {against_desc}"
+            # other templates
+            if a_id in culled and tpl in DIRECTIONAL_TEMPLATES:
+                part = "not visible from " + cameras
+            elif recs:
+                targets = [
+                    f"{r['b_name']} (ID:{r['b_id']})"
+                    + (f" [camera {r['camera_id']}]" if "camera_id" in r else "")
+                    for r in recs
+                ]
+                part = ", ".join(targets)
+            else:
+                part = "No relation with " + against_desc
 
-        # 2) Reference IDs
-        if plan["reference"]["type"] == "any" or udt_to_ids is None:
-            a_ids = {r["a_id"] for r in results if r["check_index"] == chk}
-        else:
-            a_ids = set()
-            for udt in plan["reference"]["reference_ifc_types"]:
-                a_ids.update(udt_to_ids.get(udt, []))
-
-        # 3) Build lines for this plan
-        lines = [header]
-        for a_id in sorted(a_ids):
-            a_name = id_to_obj[a_id][1]
-            lines.append(f"  • {a_name} (ID:{a_id}):")
-            for tpl in rels:
-                recs = idx.get((chk, a_id, tpl), [])
-
-                # contains: raw
-                if tpl == "contains":
-                    if recs:
-                        for r in recs:
-                            lines.append(f"      – contains: {r['relation_value']}")
-                    else:
-                        lines.append(f"      – contains: none")
-                    continue
+            # above and below: add "is" expliciting relation way 
+            if tpl in ["above", "below"]:
+                lines.append(f"      – Is {tpl}: {part}")
+            else:
+                lines.append(f"      – {tpl}: {part}")
 
-                # on_top_of: parse IDs and lookup names
-                if tpl == "on_top_of":
-                    if recs:
-                        for r in recs:
-                            rv = r["relation_value"]
-                            ids = re.findall(r"ID[:=] *(\d+)", rv)
-                            if len(ids) >= 2:
-                                x, y = map(int, ids[:2])
-                                xn = id_to_obj[x][1]
-                                yn = id_to_obj[y][1]
-                                lines.append(
-                                    f"      – on_top_of: {xn} (ID:{x}) is on top of {yn} (ID:{y})"
-                                )
-                            else:
-                                lines.append(f"      – on_top_of: {rv}")
-                    else:
-                        lines.append(f"      – on_top_of: none")
-                    continue
+    return "\n".join(lines)
 
-                # other templates
-                if recs:
-                    targets = [
-                        f"{r['b_name']} (ID:{r['b_id']})"
-                        for r in recs
-                    ]
-                    part = ", ".join(targets)
-                else:
-                    part = "No relation with " + against_desc
 
-                # above and below: add "is" expliciting relation way 
-                if tpl in ["above", "below"]:
-                    lines.append(f"      – Is {tpl}: {part}")
-                else:
-                    lines.append(f"      – {tpl}: {part}")
+def iter_plan_summaries(
+    spatial_plan: Dict[str, Any],
+    results: Iterable[RelationHit],
+    udt_to_ids: Optional[Dict[str, List[int]]],
+    id_to_obj: Dict[int, Tuple[str, str]],
+    sink: Optional[RelationResults] = None,
+    culled: Optional[Dict[int, Set[int]]] = None,
+    camera_ids: Optional[Sequence[int]] = None,
+) -> Iterator[Tuple[int, str]]:
+    """
+    Consume a stream of RelationHit (e.g. iter_spatial_results) and yield
+    (check_index, summary_block) as soon as each plan entry is finished.
+
+    Results must arrive in plan order, which is how iter_spatial_results
+    produces them: the first result of a later check closes every earlier one.
+    Hits are stored in *sink* when one is given (so the caller keeps the
+    full RelationResults); otherwise only the rows of the check still open
+    are kept, so memory does not grow with the full result stream.
+    *culled* is the dict iter_spatial_results(culled=...) fills and
+    *camera_ids* its cameras: the references culled out of a check are
+    reported "not visible from camera N" for its directional templates.
+    """
+    # Build plan map
+    plan_map = {e["check_index"]: e for e in spatial_plan.get("plans", [])}
+    order = list(plan_map)
+    position = {chk: pos for pos, chk in enumerate(order)}
+
+    store = sink if sink is not None else RelationResults(id_to_obj)
+    check_start = len(store)    # first row of the check currently open
+    next_pos = 0
+
+    def _close(chk: int) -> Tuple[int, str]:
+        idx, a_ids = store.group_by_reference(chk, start=check_start)
+        block = _summarize_plan_block(
+            chk, plan_map[chk], idx, a_ids, udt_to_ids, id_to_obj,
+            (culled or {}).get(chk, ()), camera_ids
+        )
+        return chk, block
+
+    for hit in results:
+        chk = hit.check_index
+        pos = position.get(chk)
+        if pos is None:
+            continue
+        if pos < next_pos:
+            raise ValueError(f"result for check_index={chk} arrived after its summary was emitted")
 
-        # 4) append one block
-        summaries.append("\n".join(lines))
+        # every plan entry before this one is complete
+        if next_pos < pos:
+            while next_pos < pos:
+                yield _close(order[next_pos])
+                next_pos += 1
+            if sink is None:
+                store.clear()
+            check_start = len(store)
 
-    return summaries
+        store.append_hit(hit)
 
+    while next_pos < len(order):
+        yield _close(order[next_pos])
+        next_pos += 1
 
 
+def summarize_plan_results_to_list(
+    spatial_plan: Dict[str, Any],
+    results: RelationResults | List[Dict[str, Any]],
+    udt_to_ids: Optional[Dict[str, List[int]]],
+    id_to_obj: Dict[int, Tuple[str, str]],
+    culled: Optional[Dict[int, Set[int]]] = None,
+    camera_ids: Optional[Sequence[int]] = None,
+) -> List[str]:
+    """
+    Produce compact, multi-line summaries grouped by plan and reference object.
+    - One block per plan, with a header.
+    - Under each header, one subsection per reference ID, listing each tested template
+      and its targets (or 'none').
+    - Special cases:
+      • 'contains': raw relation_value(s).
+      • 'on_top_of': parse relation_value to extract X/Y IDs and lookup names.
 
+    *results* is a RelationResults store or the legacy list of result dicts;
+    *culled* and *camera_ids* are as for iter_plan_summaries.
+    """
+    if not isinstance(results, RelationResults):
+        results = RelationResults.from_records(results, id_to_obj)
 
+    plan_map = {e["check_index"]: e for e in spatial_plan.get("plans", [])}
+    position = {chk: pos for pos, chk in enumerate(plan_map)}
+    ordered = sorted(
+        (hit for hit in results.iter_hits() if hit.check_index in position),
+        key=lambda hit: position[hit.check_index]
+    )
+    return [
+        block
+        for _, block in iter_plan_summaries(
+            spatial_plan, ordered, udt_to_ids, id_to_obj, culled=culled, camera_ids=camera_ids
+        )
+    ]
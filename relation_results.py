@@ -0,0 +1,294 @@
+﻿from array import array
+from collections import defaultdict
+from math import isnan, nan
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+
+# ──────────────────────────────────────────────────────────────────────────
+#  Template codes  (stored as one byte per row instead of the name string)
+# ──────────────────────────────────────────────────────────────────────────
+TEMPLATE_CODES: Tuple[str, ...] = (
+    "touches",
+    "front",
+    "behind",
+    "left",
+    "right",
+    "above",
+    "below",
+    "on_top_of",
+    "leans_on",
+    "affixed_to",
+    "near",
+    "far",
+    "contains",
+)
+
+
+# Relation phrases, matching the text the SQL templates used to build.
+# Each entry is (subject, phrase, object) where subject/object say which side
+# of the call ("a" or "b") the template puts in that position.
+RELATION_PHRASES: Dict[str, Tuple[str, str, str]] = {
+    "front":    ("b", "is in front of object", "a"),
+    "behind":   ("b", "is behind object", "a"),
+    "left":     ("b", "is to the left of object", "a"),
+    "right":    ("b", "is to the right of object", "a"),
+    "above":    ("a", "is above object", "b"),
+    "below":    ("b", "is below object", "a"),
+    "touches":  ("a", "touches", "b"),
+    "near":     ("a", "is near", "b"),
+    "far":      ("a", "is far from", "b"),
+    "contains": ("a", "is contained {metric:.3f} in", "b"),
+}
+
+# Directional templates prefix both objects with "Object"
+_OBJECT_PREFIXED = {"front", "behind", "left", "right", "above", "below"}
+
+
+def render_relation_text(
+    template: str,
+    a_id: int,
+    b_id: int,
+    id_to_obj: Dict[int, Tuple[str, str]],
+    metric: Optional[float] = None,
+) -> Optional[str]:
+    """
+    Render the human-readable sentence of a held relation, e.g.
+    "Object Chair (ID:98) is in front of object Door (ID:19)".
+
+    Returns None for templates without a phrase (composed relations carry
+    their own text) and for containment without a ratio.
+    """
+    phrase = RELATION_PHRASES.get(template)
+    if phrase is None:
+        return None
+    subj_side, verb, obj_side = phrase
+    if "{metric" in verb:
+        if metric is None:
+            return None
+        verb = verb.format(metric=metric)
+
+    ids = {"a": a_id, "b": b_id}
+    subj, obj = ids[subj_side], ids[obj_side]
+    subj_name = id_to_obj[subj][1]
+    obj_name = id_to_obj[obj][1]
+    if template in _OBJECT_PREFIXED:
+        return f"Object {subj_name} (ID:{subj}) {verb} {obj_name} (ID:{obj})"
+    return f"{subj_name} (ID:{subj}) {verb} {obj_name} (ID:{obj})"
+
+
+class RelationHit(NamedTuple):
+    """One kept relation as produced by the executor, before it is stored."""
+    check_index: int
+    template: str
+    a_id: int
+    b_id: int
+    metric: Optional[float] = None
+    text: Optional[str] = None
+    held: bool = True
+    camera_id: Optional[int] = None     # set when several cameras are evaluated
+
+
+class RelationResults:
+    """
+    Columnar store for the held relations of a rule evaluation.
+
+    Every row is kept in parallel typed arrays (check_index, template code,
+    a_id, b_id, metric, held, camera) instead of a nine-key dict.  Object names and
+    types are not copied: they are looked up in the catalogue
+    (id → (ifc_type, name)) only when a row is turned back into a record, and
+    the relation sentence of a held pair is rendered at that point too (see
+    render_relation_text).  Relations that carry free text of their own
+    (composed relations, text-mode templates) keep it in a sparse row → text
+    map.
+    """
+
+    def __init__(self, id_to_obj: Dict[int, Tuple[str, str]]):
+        self.id_to_obj = id_to_obj
+        self.check_index = array("i")
+        self.template_code = array("B")
+        self.a_id = array("q")
+        self.b_id = array("q")
+        self.metric = array("d")
+        self.held = array("B")
+        self.camera_id = array("q")     # -1: not tied to a camera
+        self._text: Dict[int, str] = {}
+        self._templates: List[str] = list(TEMPLATE_CODES)
+        self._codes: Dict[str, int] = {name: code for code, name in enumerate(self._templates)}
+
+    # ------------------------------------------------------------------
+    # Building
+    # ------------------------------------------------------------------
+    @classmethod
+    def from_records(
+        cls,
+        records: Iterable[Dict[str, Any]],
+        id_to_obj: Dict[int, Tuple[str, str]]
+    ) -> "RelationResults":
+        """Build a store from the legacy list of result dicts."""
+        results = cls(id_to_obj)
+        for r in records:
+            value = r.get("relation_value")
+            camera_id = r.get("camera_id")
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                results.append(r["check_index"], r["template"], r["a_id"], r["b_id"], metric=value, camera_id=camera_id)
+            else:
+                results.append(r["check_index"], r["template"], r["a_id"], r["b_id"], text=value, camera_id=camera_id)
+        return results
+
+    def _code(self, template: str) -> int:
+        code = self._codes.get(template)
+        if code is None:
+            code = len(self._templates)
+            self._templates.append(template)
+            self._codes[template] = code
+        return code
+
+    def append(
+        self,
+        check_index: int,
+        template: str,
+        a_id: int,
+        b_id: int,
+        metric: Optional[float] = None,
+        text: Optional[str] = None,
+        held: bool = True,
+        camera_id: Optional[int] = None,
+    ) -> int:
+        """Store one kept relation and return its row number."""
+        row = len(self.a_id)
+        self.check_index.append(check_index)
+        self.template_code.append(self._code(template))
+        self.a_id.append(a_id)
+        self.b_id.append(b_id)
+        self.metric.append(nan if metric is None else float(metric))
+        self.held.append(1 if held else 0)
+        self.camera_id.append(-1 if camera_id is None else camera_id)
+        if text is not None:
+            self._text[row] = text
+        return row
+
+    def append_hit(self, hit: RelationHit) -> int:
+        return self.append(*hit)
+
+    def clear(self) -> None:
+        """Drop every row, keeping the catalogue and the template codes."""
+        for column in (self.check_index, self.template_code, self.a_id, self.b_id, self.metric, self.held, self.camera_id):
+            del column[:]
+        self._text.clear()
+
+    # ------------------------------------------------------------------
+    # Row access
+    # ------------------------------------------------------------------
+    def __len__(self) -> int:
+        return len(self.a_id)
+
+    def template(self, row: int) -> str:
+        return self._templates[self.template_code[row]]
+
+    def metric_value(self, row: int) -> Optional[float]:
+        value = self.metric[row]
+        return None if isnan(value) else value
+
+    def camera_value(self, row: int) -> Optional[int]:
+        camera_id = self.camera_id[row]
+        return None if camera_id < 0 else camera_id
+
+    def relation_value(self, row: int) -> Any:
+        """
+        The text of a row: its stored text if any, otherwise the sentence
+        rendered on demand for a held pair, otherwise its metric.
+        """
+        text = self._text.get(row)
+        if text is not None:
+            return text
+        metric = self.metric_value(row)
+        if self.held[row]:
+            text = render_relation_text(
+                self.template(row), self.a_id[row], self.b_id[row], self.id_to_obj, metric
+            )
+            if text is not None:
+                return text
+        return metric
+
+    def hit(self, row: int) -> RelationHit:
+        return RelationHit(
+            self.check_index[row],
+            self.template(row),
+            self.a_id[row],
+            self.b_id[row],
+            self.metric_value(row),
+            self._text.get(row),
+            bool(self.held[row]),
+            self.camera_value(row),
+        )
+
+    def record(self, row: int) -> Dict[str, Any]:
+        """
+        Row as the legacy result dict, names and types resolved from the
+        catalogue.  Rows evaluated per camera also carry a "camera_id" key.
+        """
+        a_id = self.a_id[row]
+        b_id = self.b_id[row]
+        a_type, a_name = self.id_to_obj[a_id]
+        b_type, b_name = self.id_to_obj[b_id]
+        record = {
+            "check_index":    self.check_index[row],
+            "template":       self.template(row),
+            "a_id":           a_id,
+            "a_name":         a_name,
+            "a_type":         a_type,
+            "b_id":           b_id,
+            "b_name":         b_name,
+            "b_type":         b_type,
+            "relation_value": self.relation_value(row)
+        }
+        camera_id = self.camera_value(row)
+        if camera_id is not None:
+            record["camera_id"] = camera_id
+        return record
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for row in range(len(self)):
+            yield self.record(row)
+
+    def iter_hits(self) -> Iterator[RelationHit]:
+        for row in range(len(self)):
+            yield self.hit(row)
+
+    def to_records(self) -> List[Dict[str, Any]]:
+        """Materialise every row as a result dict (e.g. for JSON output)."""
+        return list(self)
+
+    # ------------------------------------------------------------------
+    # Grouping
+    # ------------------------------------------------------------------
+    def check_indices(self) -> List[int]:
+        """Distinct check indices in the order they were first stored."""
+        return list(dict.fromkeys(self.check_index))
+
+    def rows_for_check(self, check_index: int, start: int = 0, stop: Optional[int] = None) -> Iterator[int]:
+        stop = len(self) if stop is None else stop
+        for row in range(start, stop):
+            if self.check_index[row] == check_index:
+                yield row
+
+    def group_by_reference(
+        self,
+        check_index: int,
+        start: int = 0,
+        stop: Optional[int] = None
+    ) -> Tuple[Dict[Tuple[int, str], List[Dict[str, Any]]], Set[int]]:
+        """
+        Group the rows of one check by (a_id, template).
+
+        Returns the grouped result records and the set of a_ids that produced
+        at least one row, which is what the plan summaries are built from.
+        *start*/*stop* restrict the scan to a row range.
+        """
+        idx: Dict[Tuple[int, str], List[Dict[str, Any]]] = defaultdict(list)
+        a_ids: Set[int] = set()
+        for row in self.rows_for_check(check_index, start, stop):
+            a_id = self.a_id[row]
+            idx[(a_id, self.template(row))].append(self.record(row))
+            a_ids.add(a_id)
+        return idx, a_ids
@@ -0,0 +1,279 @@
+﻿"""
+Reuse of rule decompositions and spatial plans across reworded rules.
+
+The response cache (llm_cache.py) only helps when a prompt is rendered
+byte-for-byte again.  A rule submitted again with its words reordered or
+inflected differently ("Are all portable fire extinguishers labelled
+clearly?" / "Are portable fire extinguishers clearly labelled?") asks
+decompose_rule and spatial_planner again for the same answer.
+
+Every validated decomposition is stored with its rule text.  A new rule
+reuses the decomposition of a stored rule when
+  * their lexical similarity (cosine of word stems and character trigrams,
+    stop words removed; no embeddings, no network) reaches
+    RULE_CACHE["threshold"] in config.py, and
+  * compatible_rules() holds: both negated or neither, and the same
+    relation words (near/away, on/in/under, ...).
+Spatial plans are stored under the matched rule and a hash of the enriched
+checks they were planned from, so a plan is only reused for exactly the same
+checks and user defined types.
+
+At the default threshold of 0.7, two of the A-E paraphrase pairs of
+validation/gold_standards.py share an entry ("clearly labelled" / "have
+clear identification labels" at 0.81, "wall mounted or on a supplied
+stand" / "mounted to walls or placed on proper stands" at 0.71), and no
+two different rules of it do.  The match is lossy all the same: the
+similarity alone scores "stored away from" / "stored near" 0.85 and
+"labelled" / "not labelled" 0.91, which only the word checks keep apart,
+and nothing tells "mounted on the wall" from "mounted on a stand" (0.75).
+The cache is therefore off unless SR_RULE_CACHE is set.
+"""
+import hashlib
+import json
+import math
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from config import RULE_CACHE
+
+_STOP_WORDS = frozenset(
+    "a an the is are be been being do does did have has had all any each every there their "
+    "these this that those of to in on at for from by with and or it its as can could should "
+    "would will must may kept keep".split()
+)
+_SUFFIXES = ("ations", "ation", "ings", "ing", "edly", "ed", "es", "s", "ly")
+
+# Words that flip or fix the meaning of a check: two rules are only
+# interchangeable when they use the same ones
+_NEGATIONS = frozenset("not no never without none nor neither cannot".split())
+_RELATION_WORDS = frozenset(
+    "near far away close next adjacent beside on onto upon in inside into within under underneath "
+    "below beneath above over top behind front left right between against along outside around "
+    "across through off".split()
+)
+
+
+def _stem(word: str) -> str:
+    for suffix in _SUFFIXES:
+        if len(word) > len(suffix) + 2 and word.endswith(suffix):
+            return word[:-len(suffix)]
+    return word
+
+
+def rule_features(rule_text: str) -> Counter:
+    """Bag of word stems and (half-weighted) character trigrams of the content words."""
+    words = [_stem(w) for w in _words(rule_text) if w not in _STOP_WORDS]
+    features = Counter(words)
+    for w in words:
+        padded = f" {w} "
+        for k in range(len(padded) - 2):
+            features["#" + padded[k:k + 3]] += 0.5
+    return features
+
+
+def _words(rule_text: str) -> List[str]:
+    text = re.sub(r"n't\b", " not", rule_text.lower())
+    return re.findall(r"[a-z0-9]+", text)
+
+
+def compatible_rules(a_text: str, b_text: str) -> bool:
+    """
+    Whether the decomposition of one rule may stand for the other, as far
+    as the words that flip or fix a check go: both negated or neither, and
+    the same relation words (near/away, on/in/under, ...).  This rejects
+    pairs the similarity alone cannot tell apart, e.g. "stored away from" /
+    "stored near", "labelled" / "not labelled"; the other content words are
+    left to the similarity threshold.
+    """
+    a_words, b_words = _words(a_text), _words(b_text)
+    if bool(_NEGATIONS.intersection(a_words)) != bool(_NEGATIONS.intersection(b_words)):
+        return False
+    return _RELATION_WORDS.intersection(a_words) == _RELATION_WORDS.intersection(b_words)
+
+
+def rule_similarity(a: Counter, b: Counter) -> float:
+    """Cosine similarity of two feature bags, in [0, 1]."""
+    if not a or not b:
+        return 0.0
+    dot = sum(v * b.get(k, 0) for k, v in a.items())
+    norm = math.sqrt(sum(v * v for v in a.values()) * sum(v * v for v in b.values()))
+    return dot / norm
+
+
+def checks_key(enriched_checks: Any) -> str:
+    """Hash of the enriched checks a plan was made from."""
+    payload = json.dumps(enriched_checks, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def valid_decomposition(decomposed: Any) -> bool:
+    """Whether decompose_rule returned the documented {"checks": [...]} shape."""
+    if not isinstance(decomposed, dict) or not isinstance(decomposed.get("checks"), list):
+        return False
+    return bool(decomposed["checks"]) and all(
+        isinstance(c, dict) and {"reference", "relation", "against"} <= c.keys()
+        for c in decomposed["checks"]
+    )
+
+
+def valid_plan(plan: Any, templates: Iterable[str]) -> bool:
+    """Whether every planned template of *plan* is one of *templates*."""
+    if not isinstance(plan, dict) or not isinstance(plan.get("plans"), list):
+        return False
+    known = set(templates)
+    for entry in plan["plans"]:
+        if not isinstance(entry, dict) or not isinstance(entry.get("templates"), list):
+            return False
+        if any(not isinstance(t, dict) or t.get("template") not in known for t in entry["templates"]):
+            return False
+    return True
+
+
+class ParaphraseCache:
+    """SQLite store of validated decompositions and plans, looked up by rule similarity."""
+
+    def __init__(self, path: Path, threshold: float):
+        self.path = Path(path)
+        self.threshold = threshold
+        # lookups of decompositions and of plans are counted apart: a plan
+        # is only looked up after its decomposition was found or made
+        self.counts = Counter()
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+        with self._db:
+            self._db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS rules (
+                    rule_text     TEXT PRIMARY KEY,
+                    decomposition TEXT NOT NULL,
+                    created       REAL NOT NULL
+                )
+                """
+            )
+            self._db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS plans (
+                    rule_text  TEXT NOT NULL,
+                    checks_key TEXT NOT NULL,
+                    plan       TEXT NOT NULL,
+                    PRIMARY KEY (rule_text, checks_key)
+                )
+                """
+            )
+        # features of the stored rules, kept in memory for the similarity scan
+        self._features: Dict[str, Counter] = {
+            text: rule_features(text) for (text,) in self._db.execute("SELECT rule_text FROM rules")
+        }
+
+    def match(self, rule_text: str) -> Optional[Tuple[str, float]]:
+        """Stored rule most similar to *rule_text* and its score, if it reaches the threshold."""
+        features = rule_features(rule_text)
+        with self._lock:
+            if rule_text in self._features:
+                return rule_text, 1.0
+            scored = [(rule_similarity(features, f), text) for text, f in self._features.items()]
+        candidates = [
+            (score, text) for score, text in scored
+            if score >= self.threshold and compatible_rules(rule_text, text)
+        ]
+        if not candidates:
+            return None
+        score, text = max(candidates)
+        return text, score
+
+    def _count(self, kind: str, hit: bool) -> None:
+        with self._lock:
+            self.counts[f"{kind}_{'hits' if hit else 'misses'}"] += 1
+
+    def decomposition(self, rule_text: str) -> Optional[Dict]:
+        """Decomposition of the closest stored paraphrase of *rule_text*, or None."""
+        found = self.match(rule_text)
+        if found is None:
+            self._count("decomposition", False)
+            return None
+        text, score = found
+        with self._lock:
+            row = self._db.execute("SELECT decomposition FROM rules WHERE rule_text = ?", (text,)).fetchone()
+        self._count("decomposition", row is not None)
+        if row is None:
+            return None
+        if text != rule_text:
+            print(f"DEBUG: Reusing the decomposition of '{text}' (similarity {score:.2f})")
+        return json.loads(row[0])
+
+    def store_decomposition(self, rule_text: str, decomposed: Dict) -> None:
+        if not valid_decomposition(decomposed):
+            print(f"DEBUG: Not caching the decomposition of '{rule_text}': unexpected shape")
+            return
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO rules (rule_text, decomposition, created) VALUES (?, ?, ?)",
+                (rule_text, json.dumps(decomposed, ensure_ascii=False), time.time())
+            )
+            self._features[rule_text] = rule_features(rule_text)
+
+    def plan(self, rule_text: str, enriched_checks: Any) -> Optional[Dict]:
+        """Plan stored for the closest paraphrase of *rule_text* and the same enriched checks."""
+        found = self.match(rule_text)
+        if found is None:
+            self._count("plan", False)
+            return None
+        with self._lock:
+            row = self._db.execute(
+                "SELECT plan FROM plans WHERE rule_text = ? AND checks_key = ?",
+                (found[0], checks_key(enriched_checks))
+            ).fetchone()
+        self._count("plan", row is not None)
+        return None if row is None else json.loads(row[0])
+
+    def store_plan(self, rule_text: str, enriched_checks: Any, plan: Dict, templates: Iterable[str]) -> None:
+        """
+        Store *plan* under the rule it was reached from: the stored paraphrase
+        whose decomposition was reused, or *rule_text* itself.
+        """
+        if not valid_plan(plan, templates):
+            print(f"DEBUG: Not caching the spatial plan of '{rule_text}': unknown template or shape")
+            return
+        found = self.match(rule_text)
+        if found is None:
+            return
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO plans (rule_text, checks_key, plan) VALUES (?, ?, ?)",
+                (found[0], checks_key(enriched_checks), json.dumps(plan, ensure_ascii=False))
+            )
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            rules = self._db.execute("SELECT COUNT(*) FROM rules").fetchone()[0]
+            plans = self._db.execute("SELECT COUNT(*) FROM plans").fetchone()[0]
+            counts = {
+                f"{kind}_{outcome}": self.counts[f"{kind}_{outcome}"]
+                for kind in ("decomposition", "plan")
+                for outcome in ("hits", "misses")
+            }
+            return {**counts, "rules": rules, "plans": plans}
+
+
+_default_cache: Optional[ParaphraseCache] = None
+_default_lock = threading.Lock()
+
+
+def default_rule_cache() -> Optional[ParaphraseCache]:
+    """The process-wide cache configured by RULE_CACHE, or None when it is disabled."""
+    global _default_cache
+    if not RULE_CACHE.get("enabled", True):
+        return None
+    with _default_lock:
+        if _default_cache is None:
+            path = Path(RULE_CACHE["path"])
+            if not path.is_absolute():
+                path = Path(__file__).resolve().parent / path
+            _default_cache = ParaphraseCache(path, RULE_CACHE["threshold"])
+    return _default_cache
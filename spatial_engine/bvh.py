@@ -0,0 +1,175 @@
+﻿"""
+Bounding-volume hierarchy (AABB tree) over box arrays.
+
+The tree is the broadphase of the in-process engine: a reference only visits
+the subtrees whose bounds can reach its query volume, so the candidates of a
+directional prism, a touch tolerance or a near radius are found in
+O(log n + k) instead of scanning every object.  Queries return candidate
+rows (positions in the array the tree was built from); the exact predicate
+is evaluated on those rows only.
+
+Boxes use the layout of spatial_engine.geometry; boxes with non-finite
+bounds (e.g. the prism of an object under the camera) are left out of the
+tree and never returned.
+"""
+import heapq
+from typing import List, Tuple
+
+import numpy as np
+
+from spatial_engine.geometry import as_boxes
+
+LEAF_SIZE = 8
+
+_LO = slice(0, 3)
+_HI = slice(3, 6)
+
+
+def _gap_distance(boxes: np.ndarray, box: np.ndarray) -> np.ndarray:
+    """Euclidean gap between *box* and each of *boxes* (0 where they overlap)."""
+    gap = np.maximum(np.maximum(boxes[:, _LO] - box[_HI], box[_LO] - boxes[:, _HI]), 0)
+    return np.sqrt((gap ** 2).sum(axis=1))
+
+
+class BoxTree:
+    """
+    Flat AABB tree: node k has bounds node_boxes[k]; an inner node has
+    children left[k] and right[k], a leaf (left[k] == -1) holds the rows
+    order[start[k]:start[k] + count[k]].
+    """
+
+    def __init__(self, boxes, leaf_size: int = LEAF_SIZE):
+        self.boxes = as_boxes(boxes)
+        self.leaf_size = leaf_size
+        valid = np.nonzero(np.isfinite(self.boxes).all(axis=1))[0]
+        centres = (self.boxes[:, _LO] + self.boxes[:, _HI]) / 2
+
+        node_boxes: List[np.ndarray] = []
+        left: List[int] = []
+        right: List[int] = []
+        start: List[int] = []
+        count: List[int] = []
+        order: List[np.ndarray] = []
+        n_ordered = 0
+
+        # iterative build: (rows, parent node, is right child)
+        stack: List[Tuple[np.ndarray, int, bool]] = [(valid, -1, False)]
+        while stack:
+            rows, parent, is_right = stack.pop()
+            node = len(node_boxes)
+            if parent >= 0:
+                (right if is_right else left)[parent] = node
+
+            b = self.boxes[rows]
+            bounds = np.concatenate([b[:, _LO].min(axis=0), b[:, _HI].max(axis=0)]) if len(rows) else np.full(6, np.nan)
+            node_boxes.append(bounds)
+            left.append(-1)
+            right.append(-1)
+
+            if len(rows) <= leaf_size:
+                start.append(n_ordered)
+                count.append(len(rows))
+                order.append(rows)
+                n_ordered += len(rows)
+                continue
+
+            # split at the median centre of the longest axis
+            c = centres[rows]
+            axis = int(np.argmax(c.max(axis=0) - c.min(axis=0)))
+            split = np.argsort(c[:, axis], kind="stable")
+            half = len(rows) // 2
+            start.append(-1)
+            count.append(0)
+            stack.append((rows[split[half:]], node, True))
+            stack.append((rows[split[:half]], node, False))
+
+        self.node_boxes = np.array(node_boxes).reshape(-1, 6)
+        self.left = np.array(left, dtype=np.int64)
+        self.right = np.array(right, dtype=np.int64)
+        self.start = np.array(start, dtype=np.int64)
+        self.count = np.array(count, dtype=np.int64)
+        self.order = np.concatenate(order).astype(np.int64) if order else np.zeros(0, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def _leaf_rows(self, node: int) -> np.ndarray:
+        return self.order[self.start[node]:self.start[node] + self.count[node]]
+
+    def query_box(self, lo, hi) -> np.ndarray:
+        """Rows whose boxes intersect [lo, hi] (3-vectors, bounds inclusive)."""
+        lo = np.asarray(lo, dtype=np.float64)
+        hi = np.asarray(hi, dtype=np.float64)
+        found: List[np.ndarray] = []
+        if not len(self.order):
+            return np.zeros(0, dtype=np.int64)
+        stack = [0]
+        while stack:
+            node = stack.pop()
+            nb = self.node_boxes[node]
+            if (nb[_LO] > hi).any() or (nb[_HI] < lo).any():
+                continue
+            if self.left[node] < 0:
+                rows = self._leaf_rows(node)
+                b = self.boxes[rows]
+                hit = (b[:, _LO] <= hi).all(axis=1) & (b[:, _HI] >= lo).all(axis=1)
+                found.append(rows[hit])
+            else:
+                stack.append(self.right[node])
+                stack.append(self.left[node])
+        return np.concatenate(found) if found else np.zeros(0, dtype=np.int64)
+
+    def query_radius(self, box, radius: float) -> np.ndarray:
+        """Rows whose boxes are within *radius* of *box* (gap distance, 0 when overlapping)."""
+        box = np.asarray(box, dtype=np.float64).reshape(6)
+        found: List[np.ndarray] = []
+        if not len(self.order):
+            return np.zeros(0, dtype=np.int64)
+        stack = [0]
+        while stack:
+            node = stack.pop()
+            if _gap_distance(self.node_boxes[node:node + 1], box)[0] > radius:
+                continue
+            if self.left[node] < 0:
+                rows = self._leaf_rows(node)
+                found.append(rows[_gap_distance(self.boxes[rows], box) <= radius])
+            else:
+                stack.append(self.right[node])
+                stack.append(self.left[node])
+        return np.concatenate(found) if found else np.zeros(0, dtype=np.int64)
+
+    def nearest(self, box, k: int = 1, exclude: int = -1) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        The *k* rows nearest to *box* by gap distance, nearest first, and
+        their distances; row *exclude* (e.g. the query object itself) is
+        skipped.  Best-first search: subtrees farther than the current k-th
+        distance are never opened.
+        """
+        box = np.asarray(box, dtype=np.float64).reshape(6)
+        best: List[Tuple[float, int]] = []      # max-heap of (-distance, row)
+        if not len(self.order) or k < 1:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+
+        queue = [(float(_gap_distance(self.node_boxes[:1], box)[0]), 0)]
+        while queue:
+            dist, node = heapq.heappop(queue)
+            if len(best) == k and dist > -best[0][0]:
+                break
+            if self.left[node] < 0:
+                rows = self._leaf_rows(node)
+                for row, d in zip(rows, _gap_distance(self.boxes[rows], box)):
+                    if row == exclude:
+                        continue
+                    if len(best) < k:
+                        heapq.heappush(best, (-d, int(row)))
+                    elif d < -best[0][0]:
+                        heapq.heapreplace(best, (-d, int(row)))
+            else:
+                for child in (self.left[node], self.right[node]):
+                    heapq.heappush(queue, (float(_gap_distance(self.node_boxes[child:child + 1], box)[0]), int(child)))
+
+        best.sort(key=lambda item: -item[0])
+        return (
+            np.array([row for _, row in best], dtype=np.int64),
+            np.array([-d for d, _ in best], dtype=np.float64),
+        )
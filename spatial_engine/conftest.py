@@ -0,0 +1,22 @@
+﻿import numpy as np
+import pytest
+
+
+def make_boxes(rng, n, low=0.0, high=8.0, size=(0.1, 3.0), step=None):
+    """*n* random boxes [xmin, ymin, zmin, xmax, ymax, zmax] with their low corner in [low, high).
+
+    With *step* the corners and sizes are snapped to that grid, so touching,
+    crossing and nested pairs all occur.
+    """
+    if step:
+        lo = rng.integers(round(low / step), round(high / step), (n, 3)) * step
+        extent = rng.integers(round(size[0] / step), round(size[1] / step), (n, 3)) * step
+    else:
+        lo = rng.uniform(low, high, (n, 3))
+        extent = rng.uniform(size[0], size[1], (n, 3))
+    return np.hstack([lo, lo + extent])
+
+
+@pytest.fixture(scope="session")
+def random_boxes():
+    return make_boxes
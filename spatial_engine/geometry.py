@@ -0,0 +1,132 @@
+﻿"""
+Closed-form camera-space geometry for axis-aligned boxes.
+
+Python counterpart of sql/functions/camera_space.sql.  Every object in
+room_objects is an ST_3DMakeBox, i.e. an axis-aligned box, so the camera-space
+envelope the directional templates need follows from the 4 footprint corners,
+the Z-range and the azimuth alone.
+
+Boxes are float arrays of shape (n, 6) laid out like ST_3DMakeBox:
+(minx, miny, minz, maxx, maxy, maxz).  A single box of shape (6,) works too.
+Angles follow PostGIS: the azimuth is measured clockwise from +Y (north) in
+[0, 2π), and a point offset (dx, dy) from the camera is rotated like
+ST_Rotate does:  x' = dx·cos θ − dy·sin θ,  y' = dx·sin θ + dy·cos θ.
+"""
+from typing import Sequence, Tuple
+
+import numpy as np
+
+MINX, MINY, MINZ, MAXX, MAXY, MAXZ = range(6)
+
+
+def as_boxes(boxes) -> np.ndarray:
+    """Return *boxes* as a float64 array of shape (n, 6)."""
+    arr = np.asarray(boxes, dtype=np.float64)
+    return arr.reshape(-1, 6)
+
+
+def footprint_centres(boxes) -> Tuple[np.ndarray, np.ndarray]:
+    """Centre of each box footprint (what ST_Centroid returns for a box)."""
+    b = as_boxes(boxes)
+    return (b[:, MINX] + b[:, MAXX]) / 2, (b[:, MINY] + b[:, MAXY]) / 2
+
+
+def box_azimuth(boxes, cam_xy: Sequence[float]) -> np.ndarray:
+    """
+    Azimuth from the camera to each footprint centre, as
+    ST_Azimuth(cam, ST_Centroid(bbox)).  NaN where both coincide.
+    """
+    cx, cy = footprint_centres(boxes)
+    dx = cx - cam_xy[0]
+    dy = cy - cam_xy[1]
+    theta = np.arctan2(dx, dy)
+    theta = np.where(theta < 0, theta + 2 * np.pi, theta)
+    return np.where((dx == 0) & (dy == 0), np.nan, theta)
+
+
+def box_cam_envelope(
+    boxes,
+    cam_xy: Sequence[float],
+    theta
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Camera-space 2D envelope (minx, maxx, miny, maxy) of each box rotated by
+    *theta* (scalar or one angle per box); see sr_box_cam_envelope.
+    """
+    b = as_boxes(boxes)
+    cx, cy = footprint_centres(b)
+    dx = cx - cam_xy[0]
+    dy = cy - cam_xy[1]
+    hx = (b[:, MAXX] - b[:, MINX]) / 2
+    hy = (b[:, MAXY] - b[:, MINY]) / 2
+    cos_t = np.cos(theta)
+    sin_t = np.sin(theta)
+
+    rx = dx * cos_t - dy * sin_t
+    ry = dx * sin_t + dy * cos_t
+    ex = np.abs(cos_t) * hx + np.abs(sin_t) * hy
+    ey = np.abs(sin_t) * hx + np.abs(cos_t) * hy
+    return rx - ex, rx + ex, ry - ey, ry + ey
+
+
+def box_cam_corners(boxes, cam_xy: Sequence[float], theta) -> np.ndarray:
+    """
+    The 8 corners of each box in camera space, shape (n, 8, 3): the 4 rotated
+    footprint corners at Z-min, then the same 4 at Z-max (see
+    sr_box_cam_corners).  *theta* is a scalar or one angle per box.
+    """
+    b = as_boxes(boxes)
+    n = len(b)
+    fx = b[:, [MINX, MAXX, MAXX, MINX]] - cam_xy[0]
+    fy = b[:, [MINY, MINY, MAXY, MAXY]] - cam_xy[1]
+    theta = np.broadcast_to(np.asarray(theta, dtype=np.float64), (n,))[:, None]
+    cos_t = np.cos(theta)
+    sin_t = np.sin(theta)
+
+    corners = np.empty((n, 8, 3))
+    for k, z_col in enumerate((MINZ, MAXZ)):
+        corners[:, 4 * k:4 * k + 4, 0] = fx * cos_t - fy * sin_t
+        corners[:, 4 * k:4 * k + 4, 1] = fx * sin_t + fy * cos_t
+        corners[:, 4 * k:4 * k + 4, 2] = b[:, z_col][:, None]
+    return corners
+
+
+def box_in_view(boxes, cam_xy: Sequence[float], view_azimuth: float, fov: float) -> np.ndarray:
+    """
+    Boolean mask of the boxes lying (at least partly) in the horizontal view
+    cone of a camera looking along *view_azimuth* (radians, PostGIS azimuth)
+    with a field of view of *fov* degrees; see sr_box_in_view.  The test is
+    conservative, and every box is kept when the direction or fov is None or
+    fov >= 360.
+    """
+    b = as_boxes(boxes)
+    if view_azimuth is None or fov is None or fov >= 360:
+        return np.ones(len(b), dtype=bool)
+
+    theta = box_azimuth(b, cam_xy)
+    corners = box_cam_corners(b, cam_xy, np.nan_to_num(theta))
+    spread = np.abs(np.arctan2(corners[:, :4, 0], corners[:, :4, 1])).max(axis=1)
+    offset = np.abs(np.arctan2(np.sin(theta - view_azimuth), np.cos(theta - view_azimuth)))
+    return np.isnan(theta) | (offset <= np.radians(fov) / 2 + spread)
+
+
+def cam_box_world_bounds(cam_boxes, cam_xy: Sequence[float], theta) -> np.ndarray:
+    """
+    World-space bounding box of each camera-space box (same (n, 6) layout,
+    in the frame rotated by *theta*), see sr_cam_box_world_bbox: the index
+    box of a directional prism.  Rows with a NaN angle come out NaN.
+    """
+    b = as_boxes(cam_boxes)
+    mx = (b[:, MINX] + b[:, MAXX]) / 2
+    my = (b[:, MINY] + b[:, MAXY]) / 2
+    hx = (b[:, MAXX] - b[:, MINX]) / 2
+    hy = (b[:, MAXY] - b[:, MINY]) / 2
+    cos_t = np.cos(theta)
+    sin_t = np.sin(theta)
+
+    # inverse of the camera rotation: x = x'·cos θ + y'·sin θ, y = −x'·sin θ + y'·cos θ
+    cx = cam_xy[0] + mx * cos_t + my * sin_t
+    cy = cam_xy[1] - mx * sin_t + my * cos_t
+    ex = np.abs(cos_t) * hx + np.abs(sin_t) * hy
+    ey = np.abs(sin_t) * hx + np.abs(cos_t) * hy
+    return np.stack([cx - ex, cy - ey, b[:, MINZ], cx + ex, cy + ey, b[:, MAXZ]], axis=1)
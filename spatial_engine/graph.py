@@ -0,0 +1,117 @@
+﻿"""
+Sparse touch / near adjacency graph of a ModelSnapshot, in CSR form.
+
+Row i of the graph lists the objects within the near/far threshold or the
+touch tolerance of object i (snapshot row order): indices[indptr[i]:indptr[i+1]]
+are their rows, and every edge carries its kinds (TOUCH, NEAR bits), its
+distance and the Z ordering of the neighbour relative to object i:
+  BELOW  the neighbour's top is under object i's bottom  (ZMax(j) < ZMin(i))
+  ABOVE  the neighbour's bottom is over object i's top   (ZMin(j) > ZMax(i))
+  LEVEL  the Z-ranges overlap
+
+The existential clauses of the composed relations (sql/composed_queries.py)
+then cost O(degree): leans_on needs a touching object BELOW, affixed_to no
+touching IfcSlab.  The graph is built once per snapshot and shared by the
+per-camera profilers; it can serve any other multi-hop relation too.
+"""
+from typing import Optional, Tuple
+
+import numpy as np
+
+from spatial_engine.geometry import MAXZ, MINZ
+from spatial_engine.kernels import within_distance
+from spatial_engine.sweep import pairs_within
+
+# ST_3DDWithin tolerance of touches.sql
+TOUCH_TOLERANCE = 0.1
+
+# Edge kinds (bit flags)
+TOUCH = 1
+NEAR = 2
+
+# Z ordering of the neighbour relative to the row object
+BELOW, LEVEL, ABOVE = -1, 0, 1
+
+
+class AdjacencyGraph:
+    """CSR adjacency of the touch and near edges of a snapshot."""
+
+    def __init__(
+        self,
+        indptr: np.ndarray,
+        indices: np.ndarray,
+        kinds: np.ndarray,
+        z_order: np.ndarray,
+        distance: np.ndarray,
+    ):
+        self.indptr = indptr
+        self.indices = indices
+        self.kinds = kinds
+        self.z_order = z_order
+        self.distance = distance
+
+    @classmethod
+    def build(
+        cls,
+        snapshot,
+        near_far_threshold: float,
+        touch_tolerance: float = TOUCH_TOLERANCE,
+    ) -> "AdjacencyGraph":
+        """
+        Edges of every object from one sweep-and-prune pass over the boxes
+        (spatial_engine/sweep.py), so the build is near-linear in the number
+        of objects.
+        """
+        boxes = snapshot.boxes
+        n = len(boxes)
+        i, j, d = pairs_within(boxes, max(near_far_threshold, touch_tolerance))
+        touches, near, _ = within_distance(d, near_far_threshold, touch_tolerance)
+        kind = np.where(touches, TOUCH, 0) | np.where(near, NEAR, 0)
+        keep = kind != 0
+        i, j, d, kind = i[keep], j[keep], d[keep], kind[keep]
+
+        # both directions of every edge, grouped by row
+        src = np.concatenate([i, j])
+        dst = np.concatenate([j, i])
+        order = np.lexsort((dst, src))
+        src, dst = src[order], dst[order]
+
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=n), out=indptr[1:])
+        z_order = np.select(
+            [boxes[dst, MAXZ] < boxes[src, MINZ], boxes[dst, MINZ] > boxes[src, MAXZ]],
+            [BELOW, ABOVE],
+            LEVEL
+        )
+        return cls(
+            indptr,
+            dst.astype(np.int64),
+            np.concatenate([kind, kind])[order].astype(np.uint8),
+            z_order.astype(np.int8),
+            np.concatenate([d, d])[order],
+        )
+
+    def __len__(self) -> int:
+        return len(self.indptr) - 1
+
+    @property
+    def n_edges(self) -> int:
+        return len(self.indices)
+
+    def degree(self, row: int) -> int:
+        return int(self.indptr[row + 1] - self.indptr[row])
+
+    def edges(self, row: int, kind: int = TOUCH, z_order: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (neighbour rows, distances) of the *kind* edges of *row*, optionally
+        only those with that Z ordering.
+        """
+        lo, hi = self.indptr[row], self.indptr[row + 1]
+        keep = (self.kinds[lo:hi] & kind) != 0
+        if z_order is not None:
+            keep &= self.z_order[lo:hi] == z_order
+        return self.indices[lo:hi][keep], self.distance[lo:hi][keep]
+
+    def neighbours(self, row: int, kind: int = TOUCH, z_order: Optional[int] = None) -> np.ndarray:
+        """Rows of the neighbours of *row* joined by a *kind* edge, optionally with that Z ordering."""
+        return self.edges(row, kind, z_order)[0]
@@ -0,0 +1,137 @@
+﻿"""
+Optional compiled kernels (Numba) for the hot predicates of the in-process
+engine: corner-in-prism, containment ratio and box distance.
+
+The NumPy kernels evaluate a predicate as a chain of whole-array operations,
+each materialising an (m, n, ...) temporary; the compiled versions walk the
+pairs once, keep every intermediate in registers, stop at the first corner
+inside a prism or the first axis without overlap, and spread the pairs over
+all cores (numba.prange).
+
+Numba is optional: without it (or with SR_DISABLE_JIT set in the
+environment) every function here falls back to the NumPy kernels, which give
+the same results.  JIT_ENABLED can also be switched at runtime, e.g. by the
+benchmark.
+"""
+import math
+import os
+from typing import Sequence
+
+import numpy as np
+
+from spatial_engine.geometry import MAXX, MAXY, MAXZ, MINX, MINY, MINZ, as_boxes, box_cam_corners
+from spatial_engine.kernels import CHUNK_ROWS, box_distances, box_volumes, overlap_volumes
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+HAVE_NUMBA = numba is not None
+JIT_ENABLED = HAVE_NUMBA and not os.getenv("SR_DISABLE_JIT")
+
+
+if HAVE_NUMBA:
+    _jit = numba.njit(parallel=True, cache=True, error_model="numpy")
+
+    @_jit
+    def _corner_hits_jit(prisms, thetas, boxes, cam_x, cam_y):
+        m, n = prisms.shape[0], boxes.shape[0]
+        out = np.zeros((m, n), dtype=np.bool_)
+        for k in numba.prange(m * n):
+            i, j = k // n, k % n
+            p = prisms[i]
+            b = boxes[j]
+            # every corner lies at ZMin or ZMax of the box
+            if not (p[MINZ] <= b[MINZ] <= p[MAXZ] or p[MINZ] <= b[MAXZ] <= p[MAXZ]):
+                continue
+            cos_t = math.cos(thetas[i])
+            sin_t = math.sin(thetas[i])
+            for c in range(4):
+                fx = (b[MINX] if c == 0 or c == 3 else b[MAXX]) - cam_x
+                fy = (b[MINY] if c < 2 else b[MAXY]) - cam_y
+                x = fx * cos_t - fy * sin_t
+                y = fx * sin_t + fy * cos_t
+                if p[MINX] <= x <= p[MAXX] and p[MINY] <= y <= p[MAXY]:
+                    out[i, j] = True
+                    break
+        return out
+
+    @_jit
+    def _containment_jit(a, b, vol_a):
+        m, n = a.shape[0], b.shape[0]
+        out = np.zeros((m, n))
+        for k in numba.prange(m * n):
+            i, j = k // n, k % n
+            vol = 1.0
+            for lo in range(3):
+                side = min(a[i, lo + 3], b[j, lo + 3]) - max(a[i, lo], b[j, lo])
+                if side <= 0.0:
+                    vol = 0.0
+                    break
+                vol *= side
+            out[i, j] = vol / vol_a[i]
+        return out
+
+    @_jit
+    def _distance_jit(a, b):
+        m, n = a.shape[0], b.shape[0]
+        out = np.empty((m, n))
+        for k in numba.prange(m * n):
+            i, j = k // n, k % n
+            sq = 0.0
+            inner = np.inf
+            outer = np.inf
+            for lo in range(3):
+                a_lo, a_hi, b_lo, b_hi = a[i, lo], a[i, lo + 3], b[j, lo], b[j, lo + 3]
+                gap = max(b_lo - a_hi, a_lo - b_hi, 0.0)
+                sq += gap * gap
+                inner = min(inner, a_lo - b_lo, b_hi - a_hi)
+                outer = min(outer, b_lo - a_lo, a_hi - b_hi)
+            nested = max(inner, outer)
+            out[i, j] = nested if nested > 0 else math.sqrt(sq)
+        return out
+
+
+def prism_corner_hits(prisms, thetas, boxes, cam_xy: Sequence[float]) -> np.ndarray:
+    """
+    (m, n) matrix: whether a corner of box j, in the camera space of prism i
+    (rotation by thetas[i]), lies in camera-space prism i.  Prisms use the
+    box layout (x_lo, y_lo, z_lo, x_hi, y_hi, z_hi), bounds inclusive.
+    """
+    prisms = as_boxes(prisms)
+    thetas = np.ascontiguousarray(thetas, dtype=np.float64).reshape(-1)
+    boxes = as_boxes(boxes)
+    if JIT_ENABLED:
+        return _corner_hits_jit(prisms, thetas, boxes, float(cam_xy[0]), float(cam_xy[1]))
+
+    m, n = len(prisms), len(boxes)
+    out = np.zeros((m, n), dtype=bool)
+    step = max(1, CHUNK_ROWS // max(n, 1))
+    for start in range(0, m, step):
+        p = prisms[start:start + step]
+        corners = box_cam_corners(np.tile(boxes, (len(p), 1)), cam_xy, np.repeat(thetas[start:start + step], n))
+        corners = corners.reshape(len(p), n, 8, 3)
+        lo = p[:, None, None, [MINX, MINY, MINZ]]
+        hi = p[:, None, None, [MAXX, MAXY, MAXZ]]
+        out[start:start + len(p)] = ((corners >= lo) & (corners <= hi)).all(axis=-1).any(axis=-1)
+    return out
+
+
+def containment_matrix(a_boxes, b_boxes) -> np.ndarray:
+    """(m, n) share of each A box inside each B box (overlap volume / volume of A)."""
+    a = as_boxes(a_boxes)
+    b = as_boxes(b_boxes)
+    if JIT_ENABLED:
+        return _containment_jit(a, b, box_volumes(a))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return overlap_volumes(a, b) / box_volumes(a)[:, None]
+
+
+def distance_matrix(a_boxes, b_boxes) -> np.ndarray:
+    """(m, n) ST_3DDistance of each A box to each B box (see kernels.box_distances)."""
+    a = as_boxes(a_boxes)
+    b = as_boxes(b_boxes)
+    if JIT_ENABLED:
+        return _distance_jit(a, b)
+    return box_distances(a, b)
@@ -0,0 +1,135 @@
+﻿"""
+Vectorised NumPy kernels over box arrays (layout of spatial_engine.geometry).
+
+The kernels work on blocks of at most *chunk_rows* rows of the A side at a
+time, so an all-pairs evaluation never holds more than chunk_rows × len(B)
+intermediate values.
+"""
+from typing import Iterator, List, Sequence, Tuple
+
+import numpy as np
+
+from spatial_engine.geometry import MAXX, MAXY, MAXZ, MINX, MINY, MINZ, as_boxes
+
+CHUNK_ROWS = 1024
+
+
+def overlap_volumes(a_boxes, b_boxes) -> np.ndarray:
+    """Volume of the intersection of every A box with every B box, shape (len(A), len(B))."""
+    a = as_boxes(a_boxes)[:, None, :]
+    b = as_boxes(b_boxes)[None, :, :]
+    vol = np.ones((a.shape[0], b.shape[1]))
+    for lo, hi in ((MINX, MAXX), (MINY, MAXY), (MINZ, MAXZ)):
+        vol *= np.clip(np.minimum(a[..., hi], b[..., hi]) - np.maximum(a[..., lo], b[..., lo]), 0, None)
+    return vol
+
+
+def _surface_distance(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """
+    Distance between box surfaces, for box arrays broadcasting against each
+    other (last axis = the 6 bounds): the per-axis gap clamped at zero, then
+    the Euclidean norm.
+
+    The stored boxes are surfaces, not solids (ST_3DDistance of two
+    MULTIPOLYGONZ): a box strictly inside another is as far from it as the
+    nearest pair of faces, boxes whose faces cross are at distance 0, and
+    separate boxes are as far as their gap.
+    """
+    sq = 0.0
+    inner = outer = np.inf
+    for lo, hi in ((MINX, MAXX), (MINY, MAXY), (MINZ, MAXZ)):
+        a_lo, a_hi, b_lo, b_hi = a[..., lo], a[..., hi], b[..., lo], b[..., hi]
+        gap = np.maximum(np.maximum(b_lo - a_hi, a_lo - b_hi), 0)
+        sq = sq + gap * gap
+        # nested boxes: the smallest face-to-face gap, positive only when strict
+        inner = np.minimum(inner, np.minimum(a_lo - b_lo, b_hi - a_hi))
+        outer = np.minimum(outer, np.minimum(b_lo - a_lo, a_hi - b_hi))
+    nested = np.maximum(inner, outer)
+    return np.where(nested > 0, nested, np.sqrt(sq))
+
+
+def box_distances(a_boxes, b_boxes) -> np.ndarray:
+    """ST_3DDistance of every A box to every B box, shape (len(A), len(B))."""
+    return _surface_distance(as_boxes(a_boxes)[:, None, :], as_boxes(b_boxes)[None, :, :])
+
+
+def paired_box_distances(a_boxes, b_boxes) -> np.ndarray:
+    """ST_3DDistance of A box k to B box k, for two arrays of the same length."""
+    return _surface_distance(as_boxes(a_boxes), as_boxes(b_boxes))
+
+
+def distance_blocks(
+    a_boxes,
+    b_boxes,
+    chunk_rows: int = CHUNK_ROWS,
+    chunk_cols: int = None
+) -> Iterator[Tuple[int, int, np.ndarray]]:
+    """
+    The len(A) × len(B) distance matrix of box_distances, tile by tile:
+    yields (row_start, col_start, block) with blocks of at most
+    chunk_rows × chunk_cols distances (all of B per tile by default).  A
+    single reference box against all boxes is one row tile.
+    """
+    a = as_boxes(a_boxes)
+    b = as_boxes(b_boxes)
+    chunk_cols = chunk_cols or max(len(b), 1)
+    for r0 in range(0, len(a), chunk_rows):
+        for c0 in range(0, len(b), chunk_cols):
+            yield r0, c0, box_distances(a[r0:r0 + chunk_rows], b[c0:c0 + chunk_cols])
+
+
+def within_distance(distances: np.ndarray, near_far_threshold: float, touch_tolerance: float):
+    """
+    (touches, near, far) flags of distances, with the comparisons of
+    touches.sql (ST_3DDWithin: <= tolerance) and near_far.sql (near: <
+    threshold, far: >= threshold).
+    """
+    return distances <= touch_tolerance, distances < near_far_threshold, distances >= near_far_threshold
+
+
+def box_volumes(boxes) -> np.ndarray:
+    b = as_boxes(boxes)
+    return (b[:, MAXX] - b[:, MINX]) * (b[:, MAXY] - b[:, MINY]) * (b[:, MAXZ] - b[:, MINZ])
+
+
+def containment_ratios(
+    a_boxes,
+    b_boxes,
+    chunk_rows: int = CHUNK_ROWS
+) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """
+    In-process equivalent of sql/many/contains.sql on box arrays.
+
+    Yields, chunk by chunk of A, the (a_rows, b_rows, pct_contained) of every
+    pair with a positive overlap volume; pct_contained is the share of the
+    A box inside the B box (vol_i / vol_A), as contains.sql computes it.
+    """
+    a_all = as_boxes(a_boxes)
+    b_all = as_boxes(b_boxes)
+    vol_a = box_volumes(a_all)
+    for start in range(0, len(a_all), chunk_rows):
+        vol_i = overlap_volumes(a_all[start:start + chunk_rows], b_all)
+        ia, ib = np.nonzero(vol_i > 0)
+        yield ia + start, ib, vol_i[ia, ib] / vol_a[start + ia]
+
+
+def contained_pairs(
+    a_ids: Sequence[int],
+    a_boxes,
+    b_ids: Sequence[int],
+    b_boxes,
+    chunk_rows: int = CHUNK_ROWS
+) -> List[Tuple[int, int, float]]:
+    """
+    (a_id, b_id, pct_contained) of every overlapping pair, self pairs
+    excluded, ordered by a_id then b_id like sql/many/contains.sql.
+    """
+    a_ids = np.asarray(a_ids, dtype=np.int64)
+    b_ids = np.asarray(b_ids, dtype=np.int64)
+    out: List[Tuple[int, int, float]] = []
+    for ia, ib, pct in containment_ratios(a_boxes, b_boxes, chunk_rows):
+        for a_id, b_id, ratio in zip(a_ids[ia], b_ids[ib], pct):
+            if a_id != b_id:
+                out.append((int(a_id), int(b_id), float(ratio)))
+    out.sort(key=lambda r: (r[0], r[1]))
+    return out
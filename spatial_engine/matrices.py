@@ -0,0 +1,151 @@
+﻿"""
+Packed bit matrices of every relation between every ordered pair of objects.
+
+For small and medium rooms it is cheaper to evaluate all relations once than
+to query pair by pair.  Each relation is an n × n bit matrix packed 8 pairs
+per byte (numpy.packbits, row = a, column = b, in snapshot row order), so a
+whole room costs n² / 8 bytes per relation instead of n² Python objects:
+holds() is an O(1) bit test, related() a scan of one packed row.
+
+The matrices are built from the relation profiles of spatial_engine/
+relations.py, for one camera and one set of parameters, and persisted next to
+the model snapshot (see matrices_path) with the snapshot fingerprint, so a
+changed model or parameter set is never answered from stale bits.
+"""
+from pathlib import Path
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+from spatial_engine.bvh import BoxTree
+from spatial_engine.graph import AdjacencyGraph
+from spatial_engine.jit import containment_matrix, distance_matrix
+from spatial_engine.relations import RELATION_BITS, RelationProfiler
+from spatial_engine.snapshot import ModelSnapshot, save_npz
+
+
+def matrices_path(snapshot_file: Path, camera_id: int) -> Path:
+    """File holding the matrices of *camera_id*, next to *snapshot_file*."""
+    snapshot_file = Path(snapshot_file)
+    return snapshot_file.with_name(f"{snapshot_file.stem}.relations.cam{camera_id}.npz")
+
+
+class RelationMatrices:
+    """One packed bit matrix per relation, for one camera."""
+
+    def __init__(
+        self,
+        snapshot: ModelSnapshot,
+        camera_id: int,
+        params: Tuple[float, float, float],
+        bits: Dict[str, np.ndarray],
+    ):
+        self.snapshot = snapshot
+        self.camera_id = camera_id
+        self.params = tuple(float(p) for p in params)
+        self.bits = bits
+
+    @classmethod
+    def build(
+        cls,
+        snapshot: ModelSnapshot,
+        camera_id: int,
+        extrusion_factor_s: float,
+        tolerance_metre: float,
+        near_far_threshold: float,
+        graph: Optional[AdjacencyGraph] = None,
+        tree: Optional[BoxTree] = None,
+    ) -> "RelationMatrices":
+        """Evaluate the profile of every object and pack it row by row."""
+        n = len(snapshot)
+        profiler = RelationProfiler(
+            snapshot, camera_id, extrusion_factor_s, tolerance_metre, near_far_threshold, graph=graph, tree=tree
+        )
+        bits = {tpl: np.zeros((n, (n + 7) // 8), dtype=np.uint8) for tpl in RELATION_BITS}
+        for row, ref_id in enumerate(snapshot.ids):
+            mask = profiler.compute(int(ref_id)).mask
+            for tpl, bit in RELATION_BITS.items():
+                bits[tpl][row] = np.packbits((mask & bit) != 0)
+        return cls(snapshot, camera_id, (extrusion_factor_s, tolerance_metre, near_far_threshold), bits)
+
+    @classmethod
+    def load_or_build(
+        cls,
+        snapshot: ModelSnapshot,
+        camera_id: int,
+        extrusion_factor_s: float,
+        tolerance_metre: float,
+        near_far_threshold: float,
+        path: Optional[Path] = None,
+        graph: Optional[AdjacencyGraph] = None,
+        tree: Optional[BoxTree] = None,
+    ) -> "RelationMatrices":
+        """
+        The matrices stored at *path* when they were built from this snapshot
+        with these parameters; otherwise build them (and save them to *path*).
+        """
+        params = (float(extrusion_factor_s), float(tolerance_metre), float(near_far_threshold))
+        if path is not None and Path(path).exists():
+            with np.load(Path(path), allow_pickle=False) as data:
+                if (
+                    str(data["fingerprint"]) == snapshot.fingerprint()
+                    and int(data["camera_id"]) == camera_id
+                    and tuple(data["params"].tolist()) == params
+                ):
+                    print(f"DEBUG: Loaded relation matrices from {path}")
+                    return cls(snapshot, camera_id, params, {tpl: data[tpl] for tpl in RELATION_BITS})
+
+        matrices = cls.build(snapshot, camera_id, *params, graph=graph, tree=tree)
+        if path is not None:
+            matrices.save(path)
+            print(f"DEBUG: Saved relation matrices to {path}")
+        return matrices
+
+    def save(self, path: Path) -> None:
+        save_npz(
+            path,
+            fingerprint=np.array(self.snapshot.fingerprint()),
+            camera_id=np.array(self.camera_id),
+            params=np.array(self.params),
+            **self.bits,
+        )
+
+    @property
+    def nbytes(self) -> int:
+        return sum(m.nbytes for m in self.bits.values())
+
+    def holds(self, tpl: str, a_id: int, b_id: int) -> bool:
+        """Bit test of *tpl* for the pair (a_id, b_id)."""
+        col = self.snapshot.row(b_id)
+        return bool(self.bits[tpl][self.snapshot.row(a_id), col >> 3] & (0x80 >> (col & 7)))
+
+    def row(self, tpl: str, a_id: int) -> np.ndarray:
+        """Boolean row of *tpl* for reference *a_id*, in snapshot row order."""
+        return np.unpackbits(self.bits[tpl][self.snapshot.row(a_id)], count=len(self.snapshot)).astype(bool)
+
+    def related(self, tpl: str, a_id: int) -> np.ndarray:
+        """Ids of every b with *tpl*(a_id, b), from one row scan."""
+        return self.snapshot.ids[self.row(tpl, a_id)]
+
+    def evaluate(
+        self,
+        tpl: str,
+        a_id: int,
+        b_ids: Sequence[int]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Same as RelationProfiler.evaluate, from the bits: (held, metric) of
+        *tpl* for (a_id, b) of every b in *b_ids*.  The distance and ratio
+        of near/far/contains are only computed for the held pairs.
+        """
+        rows = self.snapshot.rows(b_ids)
+        held = self.row(tpl, a_id)[rows]
+        metric = np.full(len(rows), np.nan)
+        if tpl in {"near", "far", "contains"} and held.any():
+            a_box = self.snapshot.boxes[self.snapshot.row(a_id)]
+            b_boxes = self.snapshot.boxes[rows[held]]
+            if tpl == "contains":
+                metric[held] = containment_matrix(a_box, b_boxes)[0]
+            else:
+                metric[held] = distance_matrix(a_box, b_boxes)[0]
+        return held, metric
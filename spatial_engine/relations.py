@@ -0,0 +1,275 @@
+﻿"""
+Relation profiles: every catalogue relation between one reference object and
+all other objects of a ModelSnapshot, evaluated in-process with NumPy.
+
+A profile holds, per neighbour, a bitmask of the relations that hold (one bit
+per relation_results.TEMPLATE_CODES entry, see RELATION_BITS), the 3D
+distance and the containment ratio.  A plan entry that checks touches, front,
+behind, ... for the same pairs then costs one profile per reference object
+instead of one template query per pair and relation.
+
+Each relation follows its SQL template and the argument roles of
+db_utils.run_spatial_call, for a pair (a, b):
+  front/behind/left/right  a corner of b lies in the prism of a
+  above/below              a corner of a lies in the prism of b
+  touches                  ST_3DDWithin(a, b, 0.1)
+  near/far                 distance < / >= near_far_threshold
+  contains                 the boxes overlap; ratio = overlap volume / volume of a
+  on_top_of, leans_on, affixed_to as in sql/composed_queries.py
+Prisms are built in the camera space of their own object (rotation by the
+azimuth of that object), bounds are inclusive like the BETWEEN tests.
+"""
+from typing import Dict, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from relation_results import TEMPLATE_CODES
+from spatial_engine.bvh import BoxTree
+from spatial_engine.geometry import (
+    MAXX, MAXY, MAXZ, MINX, MINY, MINZ,
+    box_azimuth, box_cam_corners, box_cam_envelope, cam_box_world_bounds,
+)
+from spatial_engine.graph import BELOW, TOUCH, TOUCH_TOLERANCE, AdjacencyGraph
+from spatial_engine.jit import containment_matrix, distance_matrix, prism_corner_hits
+from spatial_engine.kernels import within_distance
+from spatial_engine.snapshot import ModelSnapshot
+
+# One bit per relation, in TEMPLATE_CODES order
+RELATION_BITS: Dict[str, int] = {name: 1 << code for code, name in enumerate(TEMPLATE_CODES)}
+
+# Cap on the extrusion of the horizontal prisms (LEAST(s × size, 5.0))
+MAX_EXTRUSION = 5.0
+
+# Padding of the broadphase query boxes, so that rounding in the rotation to
+# and from camera space never drops a candidate on a prism boundary
+BROADPHASE_EPS = 1e-9
+
+
+class RelationProfile(NamedTuple):
+    """Relations of *ref_id* with every snapshot object, in snapshot row order."""
+    ref_id: int
+    ids: np.ndarray         # neighbour ids (the snapshot ids)
+    mask: np.ndarray        # uint16 bitmask of the relations (a=ref_id, b=neighbour)
+    distance: np.ndarray    # 3D distance between the two boxes; NaN beyond the near/touch radius
+    contained: np.ndarray   # share of the reference box inside the neighbour box
+
+
+def on_top_text(a_id: int, b_id: int, a_above_b: bool) -> str:
+    """Explanation on_top_relation returns for a held on_top_of(a, b)."""
+    if a_above_b:
+        return f"Object X (ID:{a_id}) is on top of Object Y (ID:{b_id})."
+    return f"Object Y (ID:{b_id}) is on top of Object X (ID:{a_id})."
+
+
+class RelationProfiler:
+    """
+    Relation profiles from one camera.  The camera-space geometry of every
+    object (azimuth, envelope, directional prisms) is computed once, the
+    profile of a reference object on first use.  The existential clauses of
+    leans_on / affixed_to are read from the touch edges of *graph*, and the
+    candidates of every other predicate come from the BVH *tree* over the
+    object boxes (both built from the snapshot when not given; share them
+    between cameras).
+    """
+
+    def __init__(
+        self,
+        snapshot: ModelSnapshot,
+        camera_id: int,
+        extrusion_factor_s: float,
+        tolerance_metre: float,
+        near_far_threshold: float,
+        touch_tolerance: float = TOUCH_TOLERANCE,
+        graph: Optional[AdjacencyGraph] = None,
+        tree: Optional[BoxTree] = None,
+    ):
+        self.snapshot = snapshot
+        self.camera_id = camera_id
+        self.cam_xy = snapshot.camera_xy(camera_id)
+        self.near_far_threshold = near_far_threshold
+        self.touch_tolerance = touch_tolerance
+
+        boxes = snapshot.boxes
+        self.theta = box_azimuth(boxes, self.cam_xy)
+        self.prisms = self._prisms(boxes, extrusion_factor_s, tolerance_metre)
+        self.is_slab = snapshot.ifc_types == "IfcSlab"
+        self.prism_bounds = {
+            tpl: cam_box_world_bounds(prism, self.cam_xy, self.theta) for tpl, prism in self.prisms.items()
+        }
+        self.tree = tree or BoxTree(boxes)
+        self.graph = graph or AdjacencyGraph.build(snapshot, near_far_threshold, touch_tolerance)
+        self._prism_trees: Dict[str, BoxTree] = {}
+        self._profiles: Dict[int, RelationProfile] = {}
+
+    def _prisms(self, boxes: np.ndarray, s: float, tol: float) -> Dict[str, np.ndarray]:
+        """
+        Camera-space prism of every object for each directional template,
+        laid out like a box: (x_lo, y_lo, z_lo, x_hi, y_hi, z_hi).
+        """
+        minx, maxx, miny, maxy = box_cam_envelope(boxes, self.cam_xy, self.theta)
+        minz, maxz = boxes[:, MINZ], boxes[:, MAXZ]
+        depth = np.minimum(s * (maxy - miny), MAX_EXTRUSION)
+        width = np.minimum(s * (maxx - minx), MAX_EXTRUSION)
+        height = s * np.maximum(maxz - minz, tol)
+
+        x_ext = (minx - tol, maxx + tol)
+        y_ext = (miny - tol, maxy + tol)
+        z_ext = (minz - tol, maxz + tol)
+        bounds = {
+            "front":  (x_ext, (miny - depth, miny), z_ext),
+            "behind": (x_ext, (maxy, maxy + depth), z_ext),
+            "left":   ((minx - width, minx), y_ext, z_ext),
+            "right":  ((maxx, maxx + width), y_ext, z_ext),
+            "above":  (x_ext, y_ext, (maxz, maxz + height)),
+            "below":  (x_ext, y_ext, (minz - height, minz)),
+        }
+        return {
+            tpl: np.stack([bx[0], by[0], bz[0], bx[1], by[1], bz[1]], axis=1)
+            for tpl, (bx, by, bz) in bounds.items()
+        }
+
+    def in_prism(self, tpl: str, x_rows, y_rows) -> np.ndarray:
+        """
+        Whether a corner of object y_rows[k] lies in the *tpl* prism of object
+        x_rows[k] (rows broadcast against each other).
+        """
+        x_rows, y_rows = np.asarray(x_rows), np.asarray(y_rows)
+        boxes = self.snapshot.boxes
+        # one reference against many rows: the (compiled) matrix kernel
+        if x_rows.ndim == 0:
+            x = x_rows.reshape(1)
+            return prism_corner_hits(self.prisms[tpl][x], self.theta[x], boxes[y_rows], self.cam_xy)[0]
+        if y_rows.ndim == 0:
+            y = y_rows.reshape(1)
+            return prism_corner_hits(self.prisms[tpl][x_rows], self.theta[x_rows], boxes[y], self.cam_xy)[:, 0]
+
+        x_rows, y_rows = np.broadcast_arrays(x_rows, y_rows)
+        prism = self.prisms[tpl][x_rows][:, None, :]
+        corners = box_cam_corners(boxes[y_rows], self.cam_xy, self.theta[x_rows])
+        inside = (corners >= prism[..., [MINX, MINY, MINZ]]) & (corners <= prism[..., [MAXX, MAXY, MAXZ]])
+        return inside.all(axis=-1).any(axis=-1)
+
+    def profile(self, ref_id: int) -> RelationProfile:
+        """Profile of *ref_id*, computed on first use and kept."""
+        cached = self._profiles.get(ref_id)
+        if cached is None:
+            cached = self._profiles[ref_id] = self.compute(ref_id)
+        return cached
+
+    def _prism_tree(self, tpl: str) -> BoxTree:
+        """Tree over the world bounds of every object's *tpl* prism, built on first use."""
+        tree = self._prism_trees.get(tpl)
+        if tree is None:
+            tree = self._prism_trees[tpl] = BoxTree(self.prism_bounds[tpl])
+        return tree
+
+    def _candidates(self, lo, hi) -> np.ndarray:
+        return self.tree.query_box(np.asarray(lo) - BROADPHASE_EPS, np.asarray(hi) + BROADPHASE_EPS)
+
+    def compute(self, ref_id: int) -> RelationProfile:
+        """
+        Profile of *ref_id*, computed afresh and not kept.  Every predicate
+        is only evaluated on the candidates the BVH broadphase returns.
+        """
+        snap = self.snapshot
+        n = len(snap)
+        r = snap.row(ref_id)
+        boxes = snap.boxes
+        box = boxes[r]
+
+        def flags(rows: np.ndarray, values) -> np.ndarray:
+            out = np.zeros(n, dtype=bool)
+            out[rows] = values
+            return out
+
+        # touches / near: candidates within the larger radius
+        radius = max(self.near_far_threshold, self.touch_tolerance)
+        close = self.tree.query_radius(box, radius)
+        close = close[close != r]
+        distance = np.full(n, np.nan)
+        distance[close] = distance_matrix(box, boxes[close])[0]
+        touches, near, _ = within_distance(distance, self.near_far_threshold, self.touch_tolerance)
+        # far also holds beyond the radius, where the distance is not computed
+        far = ~near
+        far[r] = False
+
+        # contains: candidates overlapping the reference box
+        overlapping = self._candidates(box[:3], box[3:])
+        contained = np.zeros(n)
+        contained[overlapping] = containment_matrix(box, boxes[overlapping])[0]
+
+        held = {
+            "touches":  touches,
+            "near":     near,
+            "far":      far,
+            "contains": contained > 0,
+        }
+
+        # b in a prism of the reference: objects meeting the prism bounds
+        def in_ref_prism(tpl: str) -> np.ndarray:
+            bounds = self.prism_bounds[tpl][r]
+            if not np.isfinite(bounds).all():
+                return np.zeros(n, dtype=bool)
+            rows = self._candidates(bounds[:3], bounds[3:])
+            return flags(rows, self.in_prism(tpl, r, rows))
+
+        for tpl in ("front", "behind", "left", "right"):
+            held[tpl] = in_ref_prism(tpl)
+        # the reference in the prism of b: prisms whose bounds meet the reference box
+        for tpl in ("above", "below"):
+            rows = self._prism_tree(tpl).query_box(box[:3] - BROADPHASE_EPS, box[3:] + BROADPHASE_EPS)
+            held[tpl] = flags(rows, self.in_prism(tpl, rows, r))
+
+        # the neighbour above / below the reference, for the composed relations
+        b_above_a = in_ref_prism("above")
+        b_below_a = in_ref_prism("below")
+
+        # third objects touching the reference (O(degree) on the graph):
+        # supports under it, slabs; b itself does not count
+        supports = self.graph.neighbours(r, TOUCH, BELOW)
+        slabs = self.graph.neighbours(r, TOUCH)
+        slabs = slabs[self.is_slab[slabs]]
+        other_support = np.full(n, len(supports) > 0)
+        other_support[supports] = len(supports) > 1
+        other_slab = np.full(n, len(slabs) > 0)
+        other_slab[slabs] = len(slabs) > 1
+
+        held["on_top_of"] = touches & (held["above"] | b_above_a)
+        held["leans_on"] = touches & ~b_above_a & ~b_below_a & other_support
+        held["affixed_to"] = touches & ~held["above"] & ~other_slab
+
+        mask = np.zeros(n, dtype=np.uint16)
+        for tpl, flags in held.items():
+            mask[flags] |= RELATION_BITS[tpl]
+        mask[r] = 0
+
+        return RelationProfile(ref_id, snap.ids, mask, distance, contained)
+
+    def evaluate(
+        self,
+        tpl: str,
+        a_id: int,
+        b_ids: Sequence[int]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (held, metric) of *tpl* for the pairs (a_id, b) of every b in *b_ids*.
+        The metric is the distance for near/far and the ratio for contains
+        where the relation holds, NaN otherwise.
+        """
+        profile = self.profile(a_id)
+        rows = self.snapshot.rows(b_ids)
+        held = (profile.mask[rows] & RELATION_BITS[tpl]) != 0
+
+        metric: Optional[np.ndarray] = None
+        if tpl in {"near", "far"}:
+            metric = profile.distance[rows]
+            # far pairs lie beyond the broadphase radius: measure the held ones now
+            missing = held & np.isnan(metric)
+            if missing.any():
+                boxes = self.snapshot.boxes
+                metric[missing] = distance_matrix(boxes[self.snapshot.row(a_id)], boxes[rows[missing]])[0]
+        elif tpl == "contains":
+            metric = profile.contained[rows]
+        if metric is None:
+            metric = np.full(len(rows), np.nan)
+        return held, np.where(held, metric, np.nan)
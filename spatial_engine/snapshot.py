@@ -0,0 +1,168 @@
+﻿"""
+In-memory snapshot of the model: the box extents and IFC types of every room
+object and the cameras, loaded once so relations can be evaluated in-process.
+
+Boxes use the (n, 6) layout of spatial_engine.geometry:
+(minx, miny, minz, maxx, maxy, maxz), one row per object, rows ordered by id.
+
+A snapshot can be saved to an .npz file under SNAPSHOT_DIR, one per database;
+precomputed data derived from it (spatial_engine/matrices.py) is stored next
+to it and tagged with its fingerprint.
+"""
+import csv
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+
+from spatial_engine.geometry import as_boxes
+from spatial_engine.wkb import read_box
+
+SNAPSHOT_DIR = Path(__file__).resolve().parent.parent / "snapshots"
+
+
+def snapshot_path(dbname: str) -> Path:
+    """Default location of the snapshot of database *dbname*."""
+    return SNAPSHOT_DIR / f"{dbname}.npz"
+
+
+def save_npz(path: Path, **arrays) -> None:
+    """
+    Write *arrays* to the .npz file *path* atomically: rules evaluated
+    concurrently may save and load the same snapshot, and must never read a
+    half-written file.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=path.name, suffix=".tmp", dir=path.parent)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.savez_compressed(f, **arrays)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+class ModelSnapshot:
+    """
+    Object ids with their boxes and IFC types, and the cameras as
+    {camera_id: (x, y, fov, view_azimuth)}.
+    """
+
+    def __init__(
+        self,
+        ids: Iterable[int],
+        boxes,
+        cameras: Optional[Dict[int, Tuple[float, float, Optional[float], Optional[float]]]] = None,
+        ifc_types: Optional[Sequence[str]] = None
+    ):
+        ids = np.asarray(list(ids), dtype=np.int64)
+        boxes = as_boxes(boxes)
+        if len(ids) != len(boxes):
+            raise ValueError(f"{len(ids)} ids for {len(boxes)} boxes")
+
+        order = np.argsort(ids, kind="stable")
+        self.ids = ids[order]
+        self.boxes = boxes[order]
+        types = np.asarray(list(ifc_types) if ifc_types is not None else [""] * len(ids), dtype=object)
+        self.ifc_types = types[order]
+        self.cameras = dict(cameras or {})
+        self._row = {int(oid): row for row, oid in enumerate(self.ids)}
+
+    @classmethod
+    def from_db(cls, conn) -> "ModelSnapshot":
+        """Load every object box and camera from the database."""
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT id, ifc_type,
+                       ST_XMin(bbox), ST_YMin(bbox), ST_ZMin(bbox),
+                       ST_XMax(bbox), ST_YMax(bbox), ST_ZMax(bbox)
+                FROM room_objects
+                ORDER BY id
+                """
+            )
+            rows = cur.fetchall()
+            cur.execute(
+                """
+                SELECT id, ST_X(position), ST_Y(position), fov::double precision, view_azimuth
+                FROM camera
+                """
+            )
+            cameras = {r[0]: tuple(r[1:]) for r in cur.fetchall()}
+
+        ids = [r[0] for r in rows]
+        boxes = np.array([r[2:] for r in rows], dtype=np.float64).reshape(-1, 6)
+        return cls(ids, boxes, cameras, [r[1] for r in rows])
+
+    @classmethod
+    def from_csv(cls, path: Path) -> "ModelSnapshot":
+        """
+        Load a room_objects export (columns id, ifc_type, ..., bbox as hex
+        EWKB), e.g. the validation CSVs; the snapshot has no cameras.
+        """
+        with open(path, newline="", encoding="utf-8") as f:
+            rows = list(csv.DictReader(f))
+        boxes = np.array([read_box(r["bbox"]) for r in rows], dtype=np.float64).reshape(-1, 6)
+        return cls([int(r["id"]) for r in rows], boxes, None, [r["ifc_type"] for r in rows])
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, object_id: int) -> bool:
+        return object_id in self._row
+
+    def row(self, object_id: int) -> int:
+        return self._row[object_id]
+
+    def rows(self, object_ids: Iterable[int]) -> np.ndarray:
+        """Row numbers of *object_ids*, in the given order."""
+        return np.fromiter((self._row[oid] for oid in object_ids), dtype=np.int64)
+
+    def boxes_of(self, object_ids: Iterable[int]) -> np.ndarray:
+        return self.boxes[self.rows(object_ids)]
+
+    def camera_xy(self, camera_id: int) -> Tuple[float, float]:
+        x, y, _, _ = self.cameras[camera_id]
+        return x, y
+
+    def fingerprint(self) -> str:
+        """Hash of the ids, boxes, types and cameras; changes whenever the model does."""
+        h = hashlib.sha1()
+        h.update(self.ids.tobytes())
+        h.update(np.ascontiguousarray(self.boxes).tobytes())
+        h.update("\0".join(map(str, self.ifc_types)).encode("utf-8"))
+        # as floats, so a snapshot hashes the same after a save / load round trip
+        cameras = sorted(
+            (int(c), tuple(None if v is None else float(v) for v in cam)) for c, cam in self.cameras.items()
+        )
+        h.update(repr(cameras).encode("utf-8"))
+        return h.hexdigest()
+
+    def save(self, path: Path) -> None:
+        cam_ids = sorted(self.cameras)
+        cameras = np.array(
+            [[np.nan if v is None else v for v in self.cameras[c]] for c in cam_ids],
+            dtype=np.float64
+        ).reshape(-1, 4)
+        save_npz(
+            path,
+            ids=self.ids,
+            boxes=self.boxes,
+            ifc_types=self.ifc_types.astype(str),
+            camera_ids=np.asarray(cam_ids, dtype=np.int64),
+            cameras=cameras,
+        )
+
+    @classmethod
+    def load(cls, path: Path) -> "ModelSnapshot":
+        with np.load(Path(path), allow_pickle=False) as data:
+            cameras = {
+                int(c): tuple(None if np.isnan(v) else float(v) for v in row)
+                for c, row in zip(data["camera_ids"], data["cameras"])
+            }
+            return cls(data["ids"], data["boxes"], cameras, data["ifc_types"].tolist())
@@ -0,0 +1,58 @@
+﻿import numpy as np
+import pytest
+
+from spatial_engine.bvh import BoxTree
+
+
+def gap(boxes, box):
+    g = np.maximum(np.maximum(boxes[:, :3] - box[3:], box[:3] - boxes[:, 3:]), 0)
+    return np.sqrt((g ** 2).sum(axis=1))
+
+
+@pytest.fixture
+def boxes(random_boxes):
+    b = random_boxes(np.random.default_rng(0), 300, high=30)
+    b[5] = [np.nan, 0, 0, 1, 1, 1]          # non-finite boxes stay out of the tree
+    b[9, 3] = np.inf
+    return b
+
+
+def test_query_box_matches_a_scan(boxes):
+    tree = BoxTree(boxes, leaf_size=4)
+    assert len(tree) == 298
+    rng = np.random.default_rng(1)
+    for _ in range(20):
+        lo = rng.uniform(0, 30, 3)
+        hi = lo + rng.uniform(0, 8, 3)
+        expected = np.nonzero((boxes[:, :3] <= hi).all(axis=1) & (boxes[:, 3:] >= lo).all(axis=1))[0]
+        expected = expected[np.isfinite(boxes[expected]).all(axis=1)]
+        assert sorted(tree.query_box(lo, hi)) == sorted(expected)
+
+
+def test_query_radius_matches_a_scan(boxes):
+    tree = BoxTree(boxes, leaf_size=4)
+    finite = np.isfinite(boxes).all(axis=1)
+    for row in (0, 17, 123):
+        for radius in (0.0, 1.5, 6.0):
+            expected = np.nonzero(finite & (gap(boxes, boxes[row]) <= radius))[0]
+            assert sorted(tree.query_radius(boxes[row], radius)) == sorted(expected)
+
+
+def test_nearest_matches_a_scan(boxes):
+    tree = BoxTree(boxes, leaf_size=4)
+    finite = np.nonzero(np.isfinite(boxes).all(axis=1))[0]
+    for row in (0, 42, 250):
+        d = gap(boxes[finite], boxes[row])
+        d[finite == row] = np.inf
+        rows, dist = tree.nearest(boxes[row], k=5, exclude=row)
+        assert row not in rows
+        np.testing.assert_allclose(dist, np.sort(d)[:5])
+        np.testing.assert_allclose(gap(boxes[rows], boxes[row]), dist)
+
+
+def test_empty_tree():
+    tree = BoxTree(np.zeros((0, 6)))
+    assert len(tree) == 0
+    assert len(tree.query_box([0, 0, 0], [1, 1, 1])) == 0
+    assert len(tree.query_radius([0, 0, 0, 1, 1, 1], 1.0)) == 0
+    assert len(tree.nearest([0, 0, 0, 1, 1, 1])[0]) == 0
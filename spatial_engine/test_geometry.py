@@ -0,0 +1,70 @@
+﻿import numpy as np
+import pytest
+
+from spatial_engine.geometry import (
+    box_azimuth,
+    box_cam_corners,
+    box_cam_envelope,
+    box_in_view,
+    cam_box_world_bounds,
+)
+
+CAM = (3.0, -4.0)
+AROUND_CAM = dict(low=-10, high=10, size=(0.1, 4))
+
+
+def test_box_azimuth_follows_st_azimuth():
+    # clockwise from north: north, east, south, west of the camera
+    boxes = [[2.5, 0, 0, 3.5, 1, 1], [9, -4.5, 0, 10, -3.5, 1], [2.5, -9, 0, 3.5, -8, 1], [-5, -4.5, 0, -4, -3.5, 1]]
+    np.testing.assert_allclose(box_azimuth(boxes, CAM), [0, np.pi / 2, np.pi, 3 * np.pi / 2])
+    assert np.isnan(box_azimuth([2, -5, 0, 4, -3, 1], CAM)[0])
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_envelope_is_the_extent_of_the_rotated_corners(random_boxes, seed):
+    rng = np.random.default_rng(seed)
+    boxes = random_boxes(rng, 50, **AROUND_CAM)
+    theta = rng.uniform(0, 2 * np.pi, 50)
+    corners = box_cam_corners(boxes, CAM, theta)
+    minx, maxx, miny, maxy = box_cam_envelope(boxes, CAM, theta)
+    np.testing.assert_allclose(minx, corners[:, :, 0].min(axis=1))
+    np.testing.assert_allclose(maxx, corners[:, :, 0].max(axis=1))
+    np.testing.assert_allclose(miny, corners[:, :, 1].min(axis=1))
+    np.testing.assert_allclose(maxy, corners[:, :, 1].max(axis=1))
+    np.testing.assert_array_equal(corners[:, :4, 2], np.repeat(boxes[:, [2]], 4, axis=1))
+    np.testing.assert_array_equal(corners[:, 4:, 2], np.repeat(boxes[:, [5]], 4, axis=1))
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_world_bounds_cover_the_camera_space_box(random_boxes, seed):
+    rng = np.random.default_rng(seed)
+    cam_boxes = random_boxes(rng, 40, **AROUND_CAM)
+    theta = rng.uniform(0, 2 * np.pi, 40)
+    world = cam_box_world_bounds(cam_boxes, CAM, theta)
+    # the world box, rotated back into camera space, must contain the camera-space box
+    minx, maxx, miny, maxy = box_cam_envelope(world, CAM, theta)
+    eps = 1e-9
+    assert (minx <= cam_boxes[:, 0] + eps).all() and (maxx >= cam_boxes[:, 3] - eps).all()
+    assert (miny <= cam_boxes[:, 1] + eps).all() and (maxy >= cam_boxes[:, 4] - eps).all()
+    np.testing.assert_array_equal(world[:, [2, 5]], cam_boxes[:, [2, 5]])
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_box_in_view_keeps_every_box_with_a_corner_in_the_cone(random_boxes, seed):
+    rng = np.random.default_rng(seed)
+    boxes = random_boxes(rng, 200, **AROUND_CAM)
+    view, fov = rng.uniform(0, 2 * np.pi), 60.0
+    corners = box_cam_corners(boxes, CAM, 0.0)[:, :4]
+    corner_az = np.arctan2(corners[..., 0], corners[..., 1])
+    offset = np.abs(np.arctan2(np.sin(corner_az - view), np.cos(corner_az - view)))
+    seen = (offset <= np.radians(fov) / 2).any(axis=1)
+    mask = box_in_view(boxes, CAM, view, fov)
+    assert seen.any() and not mask.all()
+    assert not (seen & ~mask).any()
+
+
+def test_box_in_view_without_a_cone_keeps_everything(random_boxes):
+    boxes = random_boxes(np.random.default_rng(0), 10, **AROUND_CAM)
+    assert box_in_view(boxes, CAM, None, 60).all()
+    assert box_in_view(boxes, CAM, 0.0, None).all()
+    assert box_in_view(boxes, CAM, 0.0, 360).all()
@@ -0,0 +1,44 @@
+﻿import numpy as np
+
+from spatial_engine.graph import ABOVE, BELOW, LEVEL, NEAR, TOUCH, AdjacencyGraph
+from spatial_engine.kernels import box_distances
+from spatial_engine.snapshot import ModelSnapshot
+
+
+def grid_snapshot(n=90, seed=0):
+    rng = np.random.default_rng(seed)
+    lo = rng.integers(0, 16, (n, 3)) * 0.5
+    boxes = np.hstack([lo, lo + rng.integers(1, 4, (n, 3)) * 0.5])
+    return ModelSnapshot(range(10, 10 + n), boxes)
+
+
+def test_edges_match_brute_force():
+    snapshot = grid_snapshot()
+    threshold, tolerance = 1.0, 0.1
+    graph = AdjacencyGraph.build(snapshot, threshold, tolerance)
+    boxes = snapshot.boxes
+    full = box_distances(boxes, boxes)
+    np.fill_diagonal(full, np.inf)
+    assert len(graph) == len(snapshot)
+
+    for row in range(len(snapshot)):
+        touch_rows, touch_dist = graph.edges(row, TOUCH)
+        near_rows = graph.neighbours(row, NEAR)
+        assert list(touch_rows) == list(np.nonzero(full[row] <= tolerance)[0])
+        assert list(near_rows) == list(np.nonzero(full[row] < threshold)[0])
+        np.testing.assert_allclose(touch_dist, full[row, touch_rows])
+        assert graph.degree(row) == len(np.nonzero(full[row] < threshold)[0])
+
+        below = graph.neighbours(row, TOUCH | NEAR, BELOW)
+        above = graph.neighbours(row, TOUCH | NEAR, ABOVE)
+        level = graph.neighbours(row, TOUCH | NEAR, LEVEL)
+        assert (boxes[below, 5] < boxes[row, 2]).all()
+        assert (boxes[above, 2] > boxes[row, 5]).all()
+        assert sorted([*below, *above, *level]) == list(near_rows)
+
+
+def test_edges_are_symmetric():
+    graph = AdjacencyGraph.build(grid_snapshot(seed=1), 1.0)
+    pairs = {(row, int(col)) for row in range(len(graph)) for col in graph.neighbours(row, TOUCH | NEAR)}
+    assert pairs and pairs == {(b, a) for a, b in pairs}
+    assert graph.n_edges == len(pairs)
@@ -0,0 +1,66 @@
+﻿import math
+
+import numpy as np
+import pytest
+
+from spatial_engine import jit
+from spatial_engine.kernels import box_distances
+
+
+@pytest.fixture(params=[False, True], ids=["numpy", "numba"])
+def jit_enabled(request, monkeypatch):
+    if request.param and not jit.HAVE_NUMBA:
+        pytest.skip("numba is not installed")
+    monkeypatch.setattr(jit, "JIT_ENABLED", request.param)
+    return request.param
+
+
+def brute_corner_hit(prism, theta, box, cam_xy):
+    """Whether one of the 8 corners of *box*, rotated into camera space, lies in *prism*."""
+    for x in (box[0], box[3]):
+        for y in (box[1], box[4]):
+            for z in (box[2], box[5]):
+                fx, fy = x - cam_xy[0], y - cam_xy[1]
+                cx = fx * math.cos(theta) - fy * math.sin(theta)
+                cy = fx * math.sin(theta) + fy * math.cos(theta)
+                if prism[0] <= cx <= prism[3] and prism[1] <= cy <= prism[4] and prism[2] <= z <= prism[5]:
+                    return True
+    return False
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_prism_corner_hits_match_brute_force(jit_enabled, random_boxes, seed):
+    rng = np.random.default_rng(seed)
+    cam_xy = (4.0, -2.0)
+    prisms = np.hstack([rng.uniform(-6, 6, (15, 3)), rng.uniform(-6, 6, (15, 3))])
+    prisms = np.hstack([np.minimum(prisms[:, :3], prisms[:, 3:]), np.maximum(prisms[:, :3], prisms[:, 3:])])
+    thetas = rng.uniform(0, 2 * np.pi, 15)
+    boxes = random_boxes(rng, 40)
+    expected = np.array([
+        [brute_corner_hit(prisms[i], thetas[i], boxes[j], cam_xy) for j in range(len(boxes))]
+        for i in range(len(prisms))
+    ])
+    hits = jit.prism_corner_hits(prisms, thetas, boxes, cam_xy)
+    assert hits.any()
+    np.testing.assert_array_equal(hits, expected)
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_containment_matrix_matches_brute_force(jit_enabled, random_boxes, seed):
+    rng = np.random.default_rng(seed)
+    a, b = random_boxes(rng, 20), random_boxes(rng, 25)
+    expected = np.zeros((len(a), len(b)))
+    for i in range(len(a)):
+        vol_a = np.prod(a[i, 3:] - a[i, :3])
+        for j in range(len(b)):
+            sides = np.minimum(a[i, 3:], b[j, 3:]) - np.maximum(a[i, :3], b[j, :3])
+            expected[i, j] = np.prod(np.clip(sides, 0, None)) / vol_a
+    np.testing.assert_allclose(jit.containment_matrix(a, b), expected, atol=1e-12)
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_distance_matrix_matches_the_numpy_kernel(jit_enabled, seed):
+    rng = np.random.default_rng(seed)
+    lo = rng.integers(0, 10, (30, 3)) * 0.5
+    boxes = np.hstack([lo, lo + rng.integers(1, 6, (30, 3)) * 0.5])
+    np.testing.assert_allclose(jit.distance_matrix(boxes[:12], boxes), box_distances(boxes[:12], boxes))
@@ -0,0 +1,98 @@
+﻿import itertools
+
+import numpy as np
+import pytest
+
+from spatial_engine.kernels import (
+    box_distances,
+    contained_pairs,
+    containment_ratios,
+    distance_blocks,
+    paired_box_distances,
+    within_distance,
+)
+
+# boxes on a half-metre grid, so touching, crossing and nested pairs all occur
+GRID = dict(high=6, size=(0.5, 3), step=0.5)
+
+
+def brute_distance(a, b):
+    """ST_3DDistance of two box surfaces, one pair at a time."""
+    a_lo, a_hi, b_lo, b_hi = a[:3], a[3:], b[:3], b[3:]
+    if all(b_lo < a_lo) and all(a_hi < b_hi):
+        return min(min(a_lo - b_lo), min(b_hi - a_hi))
+    if all(a_lo < b_lo) and all(b_hi < a_hi):
+        return min(min(b_lo - a_lo), min(a_hi - b_hi))
+    gaps = [max(b_lo[k] - a_hi[k], a_lo[k] - b_hi[k], 0.0) for k in range(3)]
+    return float(np.sqrt(sum(g * g for g in gaps)))
+
+
+def brute_overlap(a, b):
+    vol = 1.0
+    for k in range(3):
+        vol *= max(min(a[k + 3], b[k + 3]) - max(a[k], b[k]), 0.0)
+    return vol
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_box_distances_match_brute_force(random_boxes, seed):
+    rng = np.random.default_rng(seed)
+    a, b = random_boxes(rng, 40, **GRID), random_boxes(rng, 30, **GRID)
+    expected = np.array([[brute_distance(x, y) for y in b] for x in a])
+    np.testing.assert_allclose(box_distances(a, b), expected)
+    np.testing.assert_allclose(paired_box_distances(a[:30], b), np.diag(expected[:30]))
+
+
+def test_distance_cases():
+    unit = [0, 0, 0, 1, 1, 1]
+    assert box_distances(unit, [2, 0, 0, 3, 1, 1])[0, 0] == 1.0          # gap along x
+    assert box_distances(unit, [1, 0, 0, 2, 1, 1])[0, 0] == 0.0          # shared face
+    assert box_distances(unit, [0.5, 0.5, 0.5, 2, 2, 2])[0, 0] == 0.0    # crossing faces
+    assert box_distances([0.25, 0.25, 0.4, 0.75, 0.75, 0.5], unit)[0, 0] == pytest.approx(0.25)  # nested
+    assert box_distances(unit, [2, 2, 0, 3, 3, 1])[0, 0] == pytest.approx(np.sqrt(2))
+
+
+def test_distance_blocks_tile_the_full_matrix(random_boxes):
+    rng = np.random.default_rng(7)
+    a, b = random_boxes(rng, 23, **GRID), random_boxes(rng, 17, **GRID)
+    full = np.full((23, 17), np.nan)
+    for r0, c0, block in distance_blocks(a, b, chunk_rows=5, chunk_cols=4):
+        assert block.shape[0] <= 5 and block.shape[1] <= 4
+        assert np.isnan(full[r0:r0 + block.shape[0], c0:c0 + block.shape[1]]).all()
+        full[r0:r0 + block.shape[0], c0:c0 + block.shape[1]] = block
+    np.testing.assert_array_equal(full, box_distances(a, b))
+
+
+def test_within_distance_uses_the_sql_comparisons():
+    touches, near, far = within_distance(np.array([0.0, 0.01, 1.0, 2.0]), 1.0, 0.01)
+    assert touches.tolist() == [True, True, False, False]
+    assert near.tolist() == [True, True, False, False]
+    assert far.tolist() == [False, False, True, True]
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_containment_ratios_match_brute_force(random_boxes, seed):
+    rng = np.random.default_rng(seed)
+    a = random_boxes(rng, 25, **dict(GRID, step=0.5 if seed % 2 == 0 else None))
+    b = random_boxes(rng, 20, **GRID)
+    found = {}
+    for ia, ib, pct in containment_ratios(a, b, chunk_rows=4):
+        for i, j, p in zip(ia, ib, pct):
+            found[(int(i), int(j))] = p
+    expected = {}
+    for i, j in itertools.product(range(len(a)), range(len(b))):
+        vol = brute_overlap(a[i], b[j])
+        if vol > 0:
+            expected[(i, j)] = vol / brute_overlap(a[i], a[i])
+    assert found.keys() == expected.keys()
+    for key, value in expected.items():
+        assert found[key] == pytest.approx(value)
+
+
+def test_contained_pairs_skip_self_pairs_and_sort_by_id():
+    boxes = np.array([[0, 0, 0, 2, 2, 2], [0.5, 0.5, 0.5, 1, 1, 1], [5, 5, 5, 6, 6, 6]], dtype=float)
+    ids = [30, 10, 20]
+    pairs = contained_pairs(ids, boxes, ids, boxes, chunk_rows=1)
+    assert [(a, b) for a, b, _ in pairs] == [(10, 30), (30, 10)]
+    assert pairs[0][2] == pytest.approx(1.0)
+    assert pairs[1][2] == pytest.approx(0.125 / 8)
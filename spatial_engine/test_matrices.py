@@ -0,0 +1,62 @@
+﻿import numpy as np
+import pytest
+
+from spatial_engine.matrices import RelationMatrices, matrices_path
+from spatial_engine.relations import RELATION_BITS, RelationProfiler
+from spatial_engine.snapshot import ModelSnapshot
+
+PARAMS = (2, 0.2, 1.0)
+
+
+def small_snapshot(n=60, seed=0):
+    rng = np.random.default_rng(seed)
+    lo = rng.uniform(0, 8, (n, 3))
+    lo[:, 2] = rng.choice([0.0, 1.0], n)
+    types = np.where(rng.random(n) < 0.1, "IfcSlab", "IfcWall")
+    return ModelSnapshot(range(100, 100 + n), np.hstack([lo, lo + rng.uniform(0.2, 1.5, (n, 3))]),
+                         {1: (4.0, -2.0, 60.0, 0.0)}, types)
+
+
+def test_matrices_answer_like_the_profiler():
+    snapshot = small_snapshot()
+    profiler = RelationProfiler(snapshot, 1, *PARAMS)
+    matrices = RelationMatrices.build(snapshot, 1, *PARAMS)
+    ids = [int(i) for i in snapshot.ids]
+    for a_id in ids[::5]:
+        b_ids = [b for b in ids if b != a_id]
+        for tpl in RELATION_BITS:
+            held, metric = matrices.evaluate(tpl, a_id, b_ids)
+            p_held, p_metric = profiler.evaluate(tpl, a_id, b_ids)
+            np.testing.assert_array_equal(held, p_held, err_msg=tpl)
+            np.testing.assert_allclose(metric, p_metric, err_msg=tpl)
+            assert [b for b, h in zip(b_ids, held) if h] == [b for b in matrices.related(tpl, a_id) if b != a_id]
+            if b_ids:
+                assert matrices.holds(tpl, a_id, b_ids[0]) == bool(held[0])
+
+
+def test_load_or_build_reuses_matching_matrices_only(tmp_path, capsys):
+    snapshot = small_snapshot()
+    path = matrices_path(tmp_path / "room.npz", 1)
+    assert path.name == "room.relations.cam1.npz"
+    built = RelationMatrices.load_or_build(snapshot, 1, *PARAMS, path=path)
+    assert path.exists()
+    loaded = RelationMatrices.load_or_build(snapshot, 1, *PARAMS, path=path)
+    assert "Loaded relation matrices" in capsys.readouterr().out
+    for tpl in RELATION_BITS:
+        np.testing.assert_array_equal(loaded.bits[tpl], built.bits[tpl])
+
+    # other parameters or another model: rebuilt, not loaded
+    RelationMatrices.load_or_build(snapshot, 1, 3, 0.2, 1.0, path=path)
+    assert "Loaded" not in capsys.readouterr().out
+    moved = small_snapshot(seed=1)
+    RelationMatrices.load_or_build(moved, 1, *PARAMS, path=path)
+    assert "Loaded" not in capsys.readouterr().out
+
+
+def test_bits_are_packed_rows():
+    snapshot = small_snapshot(n=13)
+    matrices = RelationMatrices.build(snapshot, 1, *PARAMS)
+    assert all(m.shape == (13, 2) for m in matrices.bits.values())
+    assert matrices.nbytes == 26 * len(RELATION_BITS)
+    with pytest.raises(KeyError):
+        matrices.row("near", 1)
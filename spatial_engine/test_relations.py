@@ -0,0 +1,96 @@
+﻿import numpy as np
+import pytest
+
+from spatial_engine.jit import containment_matrix, prism_corner_hits
+from spatial_engine.kernels import box_distances
+from spatial_engine.relations import RELATION_BITS, RelationProfiler, on_top_text
+from spatial_engine.snapshot import ModelSnapshot
+
+NEAR_FAR, TOUCH_TOL = 1.0, 0.1
+
+
+def stacked_snapshot(n=150, seed=0):
+    """Boxes on three levels 5 cm apart, so supports (touching, strictly below), slabs and stacks occur."""
+    rng = np.random.default_rng(seed)
+    lo = np.column_stack([
+        rng.integers(0, 24, n) * 0.5,
+        rng.integers(0, 24, n) * 0.5,
+        rng.integers(0, 3, n) * 1.0,
+    ])
+    boxes = np.hstack([lo, lo + np.column_stack([rng.integers(1, 5, (n, 2)) * 0.5, np.full(n, 0.95)])])
+    types = np.where(rng.random(n) < 0.1, "IfcSlab", "IfcFurnishingElement")
+    return ModelSnapshot(range(1, n + 1), boxes, {7: (6.0, -3.0, None, None)}, types)
+
+
+def brute_profile(profiler, r):
+    """Relations of row r with every row, without the broadphase."""
+    snap = profiler.snapshot
+    boxes, cam = snap.boxes, profiler.cam_xy
+    n = len(snap)
+    dist = box_distances(boxes[r], boxes)[0]
+    touches = dist <= TOUCH_TOL
+    held = {
+        "touches": touches,
+        "near": dist < NEAR_FAR,
+        "far": dist >= NEAR_FAR,
+        "contains": containment_matrix(boxes[r], boxes)[0] > 0,
+    }
+
+    def ref_prism(tpl):
+        return prism_corner_hits(profiler.prisms[tpl][[r]], profiler.theta[[r]], boxes, cam)[0]
+
+    for tpl in ("front", "behind", "left", "right"):
+        held[tpl] = ref_prism(tpl)
+    for tpl in ("above", "below"):
+        held[tpl] = prism_corner_hits(profiler.prisms[tpl], profiler.theta, boxes[[r]], cam)[:, 0]
+
+    touching = np.nonzero(touches)[0]
+    touching = touching[touching != r]
+    supports = touching[boxes[touching, 5] < boxes[r, 2]]
+    slabs = touching[profiler.is_slab[touching]]
+    other_support = np.array([len(set(supports) - {b}) > 0 for b in range(n)])
+    other_slab = np.array([len(set(slabs) - {b}) > 0 for b in range(n)])
+    b_above_a, b_below_a = ref_prism("above"), ref_prism("below")
+    held["on_top_of"] = touches & (held["above"] | b_above_a)
+    held["leans_on"] = touches & ~b_above_a & ~b_below_a & other_support
+    held["affixed_to"] = touches & ~held["above"] & ~other_slab
+    for flags in held.values():
+        flags[r] = False
+    return held
+
+
+@pytest.fixture(scope="module")
+def profiler():
+    return RelationProfiler(stacked_snapshot(), 7, 2, 0.2, NEAR_FAR, TOUCH_TOL)
+
+
+def test_profiles_match_an_exhaustive_evaluation(profiler):
+    ids = profiler.snapshot.ids
+    for r in range(0, len(ids), 7):
+        profile = profiler.compute(int(ids[r]))
+        for tpl, expected in brute_profile(profiler, r).items():
+            got = (profile.mask & RELATION_BITS[tpl]) != 0
+            assert list(np.nonzero(got)[0]) == list(np.nonzero(expected)[0]), tpl
+    assert profiler.profile(int(ids[0])) is profiler.profile(int(ids[0]))
+
+
+def test_evaluate_reports_metrics_for_held_pairs_only(profiler):
+    snap = profiler.snapshot
+    a_id = int(snap.ids[3])
+    b_ids = [int(i) for i in snap.ids if i != a_id]
+    boxes = snap.boxes
+    dist = box_distances(boxes[snap.row(a_id)], snap.boxes_of(b_ids))[0]
+    for tpl in ("near", "far"):
+        held, metric = profiler.evaluate(tpl, a_id, b_ids)
+        np.testing.assert_allclose(metric[held], dist[held])
+        assert np.isnan(metric[~held]).all()
+    held, metric = profiler.evaluate("contains", a_id, b_ids)
+    ratios = containment_matrix(boxes[snap.row(a_id)], snap.boxes_of(b_ids))[0]
+    np.testing.assert_allclose(metric[held], ratios[held])
+    held, metric = profiler.evaluate("front", a_id, b_ids)
+    assert np.isnan(metric).all()
+
+
+def test_on_top_text_names_the_upper_object():
+    assert on_top_text(1, 2, True) == "Object X (ID:1) is on top of Object Y (ID:2)."
+    assert on_top_text(1, 2, False) == "Object Y (ID:2) is on top of Object X (ID:1)."
@@ -0,0 +1,61 @@
+﻿import numpy as np
+import pytest
+
+from spatial_engine import snapshot as snapshot_module
+from spatial_engine.snapshot import ModelSnapshot, save_npz
+
+
+def snapshot(cameras=None):
+    boxes = [[2, 0, 0, 3, 1, 1], [0, 0, 0, 1, 1, 1], [5, 5, 0, 6, 6, 2]]
+    return ModelSnapshot([30, 10, 20], boxes, cameras, ["IfcDoor", "IfcWall", "IfcSlab"])
+
+
+def test_rows_follow_sorted_ids():
+    snap = snapshot()
+    assert snap.ids.tolist() == [10, 20, 30]
+    assert snap.ifc_types.tolist() == ["IfcWall", "IfcSlab", "IfcDoor"]
+    assert snap.row(30) == 2 and 20 in snap and 40 not in snap
+    np.testing.assert_array_equal(snap.boxes_of([30, 10]), [[2, 0, 0, 3, 1, 1], [0, 0, 0, 1, 1, 1]])
+    with pytest.raises(ValueError):
+        ModelSnapshot([1, 2], [[0, 0, 0, 1, 1, 1]])
+
+
+def test_save_load_round_trip_keeps_the_fingerprint(tmp_path):
+    snap = snapshot({1: (4.0, -2.0, 60.0, None), 2: (0.0, 0.0, None, 1.5)})
+    path = tmp_path / "room.npz"
+    snap.save(path)
+    loaded = ModelSnapshot.load(path)
+    np.testing.assert_array_equal(loaded.ids, snap.ids)
+    np.testing.assert_array_equal(loaded.boxes, snap.boxes)
+    assert loaded.cameras == snap.cameras
+    assert loaded.camera_xy(1) == (4.0, -2.0)
+    assert loaded.fingerprint() == snap.fingerprint()
+
+
+def test_fingerprint_changes_with_the_model():
+    base = snapshot({1: (4.0, -2.0, 60.0, None)}).fingerprint()
+    moved = snapshot({1: (4.0, -2.0, 60.0, None)})
+    moved.boxes[0, 0] += 0.01
+    assert moved.fingerprint() != base
+    assert snapshot({1: (4.0, -2.0, 90.0, None)}).fingerprint() != base
+    assert snapshot().fingerprint() != base
+
+
+def test_save_npz_replaces_the_file_atomically(tmp_path, monkeypatch):
+    path = tmp_path / "nested" / "room.npz"
+    save_npz(path, values=np.arange(3))
+    save_npz(path, values=np.arange(5))
+    with np.load(path) as data:
+        assert data["values"].tolist() == [0, 1, 2, 3, 4]
+
+    def fail(f, **arrays):
+        f.write(b"partial")
+        raise OSError("disk full")
+
+    monkeypatch.setattr(snapshot_module.np, "savez_compressed", fail)
+    with pytest.raises(OSError):
+        save_npz(path, values=np.arange(7))
+    # the previous file is intact and no temporary file is left behind
+    with np.load(path) as data:
+        assert data["values"].tolist() == [0, 1, 2, 3, 4]
+    assert [p.name for p in path.parent.iterdir()] == ["room.npz"]
@@ -0,0 +1,40 @@
+﻿import numpy as np
+import pytest
+
+from spatial_engine.kernels import box_distances
+from spatial_engine.sweep import pairs_within, sweep_pairs
+
+GRID = dict(high=10, size=(0.5, 2), step=0.5)
+
+
+def sweep_pairs_single(boxes, margin):
+    (i, j), = list(sweep_pairs(boxes, margin, chunk_pairs=1 << 30))
+    return i, j
+
+
+@pytest.mark.parametrize("seed, distance", [(0, 0.0), (1, 0.01), (2, 1.0), (3, 2.5)])
+def test_pairs_within_match_brute_force(random_boxes, seed, distance):
+    rng = np.random.default_rng(seed)
+    boxes = random_boxes(rng, 80, **GRID)
+    full = box_distances(boxes, boxes)
+    ei, ej = np.nonzero(np.triu(full <= distance, k=1))
+    i, j, d = pairs_within(boxes, distance)
+    assert list(zip(i, j)) == list(zip(ei, ej))
+    np.testing.assert_allclose(d, full[ei, ej])
+
+
+def test_sweep_pairs_are_unique_across_chunks(random_boxes):
+    rng = np.random.default_rng(4)
+    boxes = random_boxes(rng, 60, **GRID)
+    chunks = list(sweep_pairs(boxes, margin=1.0, chunk_pairs=7))
+    assert len(chunks) > 1
+    pairs = [(int(a), int(b)) for i, j in chunks for a, b in zip(i, j)]
+    assert all(a < b for a, b in pairs)
+    assert len(pairs) == len(set(pairs))
+    assert set(pairs) == {(int(a), int(b)) for a, b in zip(*sweep_pairs_single(boxes, 1.0))}
+
+
+def test_fewer_than_two_boxes_give_no_pairs():
+    assert list(sweep_pairs(np.zeros((1, 6)))) == []
+    i, j, d = pairs_within(np.zeros((0, 6)), 1.0)
+    assert len(i) == len(j) == len(d) == 0
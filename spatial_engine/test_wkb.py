@@ -0,0 +1,68 @@
+﻿import struct
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from spatial_engine.snapshot import ModelSnapshot
+from spatial_engine.wkb import read_box, read_polygons
+
+ROOM1_CSV = Path(__file__).resolve().parent.parent / "validation" / "room1-r2m_db_full_data.csv"
+
+
+def box_faces(lo, hi):
+    """The 6 closed faces of a box, like ST_3DMakeBox."""
+    (x0, y0, z0), (x1, y1, z1) = lo, hi
+    faces = [
+        [(x0, y0, z0), (x0, y1, z0), (x1, y1, z0), (x1, y0, z0)],
+        [(x0, y0, z1), (x1, y0, z1), (x1, y1, z1), (x0, y1, z1)],
+        [(x0, y0, z0), (x0, y0, z1), (x0, y1, z1), (x0, y1, z0)],
+        [(x1, y0, z0), (x1, y1, z0), (x1, y1, z1), (x1, y0, z1)],
+        [(x0, y0, z0), (x1, y0, z0), (x1, y0, z1), (x0, y0, z1)],
+        [(x0, y1, z0), (x0, y1, z1), (x1, y1, z1), (x1, y1, z0)],
+    ]
+    return [f + [f[0]] for f in faces]
+
+
+def polygon_body(order, ring, dims):
+    body = struct.pack(order + "II", 1, len(ring))
+    return body + b"".join(struct.pack(order + "d" * dims, *p[:dims]) for p in ring)
+
+
+def ewkb_multipolygon_z(faces, srid=4326, order="<"):
+    flag = b"\x01" if order == "<" else b"\x00"
+    out = flag + struct.pack(order + "II", 6 | 0x80000000 | 0x20000000, srid) + struct.pack(order + "I", len(faces))
+    for ring in faces:
+        out += flag + struct.pack(order + "I", 3 | 0x80000000) + polygon_body(order, ring, 3)
+    return out
+
+
+def test_read_box_of_an_ewkb_box():
+    faces = box_faces((1.0, -2.0, 0.5), (3.0, 4.0, 2.5))
+    for order in ("<", ">"):
+        data = ewkb_multipolygon_z(faces, order=order)
+        assert len(read_polygons(data)) == 6
+        np.testing.assert_array_equal(read_box(data.hex()), [1.0, -2.0, 0.5, 3.0, 4.0, 2.5])
+
+
+def test_iso_and_2d_polygons():
+    ring = [(0, 0, 1), (2, 0, 1), (2, 3, 1), (0, 0, 1)]
+    iso_z = b"\x01" + struct.pack("<I", 1003) + polygon_body("<", ring, 3)
+    np.testing.assert_array_equal(read_box(iso_z), [0, 0, 1, 2, 3, 1])
+    flat = b"\x01" + struct.pack("<I", 3) + polygon_body("<", ring, 2)
+    np.testing.assert_array_equal(read_box(flat), [0, 0, 0, 2, 3, 0])
+
+
+def test_unsupported_geometries_are_rejected():
+    point = b"\x01" + struct.pack("<Idd", 1, 0.0, 0.0)
+    with pytest.raises(ValueError):
+        read_polygons(point)
+
+
+@pytest.mark.skipif(not ROOM1_CSV.exists(), reason="validation export not available")
+def test_snapshot_from_the_validation_export():
+    snapshot = ModelSnapshot.from_csv(ROOM1_CSV)
+    assert len(snapshot) > 0 and not snapshot.cameras
+    assert (snapshot.boxes[:, :3] <= snapshot.boxes[:, 3:]).all()
+    assert np.isfinite(snapshot.boxes).all()
+    assert "IfcBuildingElementProxy" in set(snapshot.ifc_types)
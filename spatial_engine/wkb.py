@@ -0,0 +1,88 @@
+﻿"""
+Minimal (E)WKB reader for the room_objects.bbox geometries.
+
+The bbox column is a MULTIPOLYGONZ of the six faces of a box (exported as
+hex EWKB, e.g. in the validation CSVs).  read_polygons returns the faces as
+point arrays and read_box the (6,) extent in the layout of
+spatial_engine.geometry, so exported models can be loaded without a
+database.  Only the geometry types of that column are supported: Polygon,
+MultiPolygon, PolyhedralSurface and TIN, with or without Z/M and SRID.
+"""
+import struct
+from typing import List, Tuple
+
+import numpy as np
+
+_POLYGON = 3
+_MULTIPOLYGON = 6
+_POLYHEDRALSURFACE = 15
+_TIN = 16
+_TRIANGLE = 17
+
+# EWKB flags and ISO WKB type offsets
+_EWKB_Z = 0x80000000
+_EWKB_M = 0x40000000
+_EWKB_SRID = 0x20000000
+
+
+class _Reader:
+    def __init__(self, data: bytes):
+        self.data = data
+        self.pos = 0
+
+    def unpack(self, fmt: str):
+        values = struct.unpack_from(fmt, self.data, self.pos)
+        self.pos += struct.calcsize(fmt)
+        return values
+
+    def header(self) -> Tuple[str, int, int, bool]:
+        """(byte order, base type, coordinates per point, has Z) of the next geometry."""
+        order = "<" if self.unpack("B")[0] == 1 else ">"
+        code = self.unpack(order + "I")[0]
+        has_z, has_m = bool(code & _EWKB_Z), bool(code & _EWKB_M)
+        if code & _EWKB_SRID:
+            self.unpack(order + "I")
+        code &= 0x0FFFFFFF
+        if code >= 1000:
+            # ISO WKB: 1000 Z, 2000 M, 3000 ZM
+            has_z, has_m = code // 1000 in (1, 3), code // 1000 in (2, 3)
+            code %= 1000
+        return order, code, 2 + has_z + has_m, has_z
+
+    def polygon(self, order: str, dims: int) -> np.ndarray:
+        """Exterior ring of a polygon body as an (n, dims) array; holes are skipped."""
+        rings = []
+        for _ in range(self.unpack(order + "I")[0]):
+            n = self.unpack(order + "I")[0]
+            rings.append(np.array(self.unpack(order + "d" * (n * dims)), dtype=np.float64).reshape(n, dims))
+        return rings[0] if rings else np.zeros((0, dims))
+
+
+def read_polygons(wkb) -> List[np.ndarray]:
+    """Polygons of a (hex) (E)WKB geometry, each as an (n, 3) point array."""
+    data = bytes.fromhex(wkb) if isinstance(wkb, str) else bytes(wkb)
+    reader = _Reader(data)
+    order, code, dims, has_z = reader.header()
+    if code in (_POLYGON, _TRIANGLE):
+        parts = [(reader.polygon(order, dims), has_z)]
+    elif code in (_MULTIPOLYGON, _POLYHEDRALSURFACE, _TIN):
+        parts = []
+        for _ in range(reader.unpack(order + "I")[0]):
+            part_order, part_code, part_dims, part_z = reader.header()
+            if part_code not in (_POLYGON, _TRIANGLE):
+                raise ValueError(f"Unsupported WKB part type {part_code}")
+            parts.append((reader.polygon(part_order, part_dims), part_z))
+    else:
+        raise ValueError(f"Unsupported WKB geometry type {code}")
+
+    # drop M, 2D points get z = 0
+    return [
+        p[:, :3] if z else np.column_stack([p[:, :2], np.zeros(len(p))])
+        for p, z in parts
+    ]
+
+
+def read_box(wkb) -> np.ndarray:
+    """(minx, miny, minz, maxx, maxy, maxz) of a (hex) (E)WKB geometry."""
+    points = np.concatenate(read_polygons(wkb))
+    return np.concatenate([points.min(axis=0), points.max(axis=0)])
@@ -8,56 +8,39 @@
 ),
 -- 1. Camera
 cam AS (
-  SELECT position, fov
+  SELECT position
   FROM camera
   WHERE id = (SELECT camera_id FROM params)
 ),
--- 2. Object X + centroid
+-- 2. Object X in camera space, precomputed per camera
+--    (sr_camera_geometry, see functions/camera_object_geometry.sql)
 obj_x_info AS (
-  SELECT id, name, bbox, ST_Centroid(bbox) AS centroid
-  FROM room_objects
-  WHERE id = (SELECT object_x_id FROM params)
+  SELECT g.azimuth, g.cam_minx, g.cam_maxx, g.cam_miny, g.cam_maxy, g.w_minz, g.w_maxz
+  FROM params
+  CROSS JOIN LATERAL sr_camera_geometry(params.camera_id, params.object_x_id) AS g
 ),
 -- 3. Compute rotation so ray→centroid → +Y
 rot AS (
-  SELECT ST_Azimuth(cam.position, obj_x_info.centroid) AS rot_angle
-  FROM cam, obj_x_info
-),
--- 4. Transform X into camera space (XY only; Z preserved)
-obj_x_trans AS (
-  SELECT
-    o.id, o.name,
-    ST_Rotate(
-      ST_Translate(o.bbox, -ST_X(cam.position), -ST_Y(cam.position)),
-      rot.rot_angle
-    ) AS transformed_geom
-  FROM room_objects o
-  JOIN params ON o.id = params.object_x_id
-  CROSS JOIN cam
-  CROSS JOIN rot
+  SELECT azimuth AS rot_angle
+  FROM obj_x_info
 ),
--- 5. Camera‐space 2D envelope for X & Y limits
+-- 4. Camera-space 2D envelope for X & Y limits
 obj_x_bbox AS (
   SELECT
-    env2d,
-    ST_XMin(env2d) AS minx,
-    ST_XMax(env2d) AS maxx,
-    ST_YMin(env2d) AS miny,
-    ST_YMax(env2d) AS maxy
-  FROM (
-    SELECT transformed_geom,
-           ST_Envelope(transformed_geom) AS env2d
-    FROM obj_x_trans
-  ) sub
+    cam_minx AS minx,
+    cam_maxx AS maxx,
+    cam_miny AS miny,
+    cam_maxy AS maxy
+  FROM obj_x_info
 ),
--- 6. True Z‐range of X in world‐space
+-- 5. True Z‐range of X in world‐space
 obj_x_world_z AS (
   SELECT
-    ST_ZMin(bbox) AS w_minz,
-    ST_ZMax(bbox) AS w_maxz
+    w_minz        AS w_minz,
+    w_maxz        AS w_maxz
   FROM obj_x_info
 ),
--- 7. Compute “above” half‐space parameters,
+-- 6. Compute “above” half‐space parameters,
 --    clamping zero‐thickness to at least tol to handle flat objects,
 --    and extending X/Y by tol
 obj_x_metrics AS (
@@ -79,23 +62,16 @@ obj_x_metrics AS (
   CROSS JOIN obj_x_world_z wz
   CROSS JOIN params
 ),
--- 8. Transform Y into camera‐space & dump its 3D points
+-- 7. Corners of Y in camera space (4 footprint corners × world Z-range)
 obj_y_points AS (
-  SELECT dp.geom AS pt
-  FROM (
-    SELECT
-      ST_Rotate(
-        ST_Translate(o.bbox, -ST_X(cam.position), -ST_Y(cam.position)),
-        rot.rot_angle
-      ) AS transformed_geom
-    FROM room_objects o
-    JOIN params ON o.id = params.object_y_id
-    CROSS JOIN cam
-    CROSS JOIN rot
-  ) sub
-  CROSS JOIN LATERAL ST_DumpPoints(sub.transformed_geom) AS dp
+  SELECT c.x AS pt_x, c.y AS pt_y, c.z AS pt_z
+  FROM room_objects o
+  JOIN params ON o.id = params.object_y_id
+  CROSS JOIN cam
+  CROSS JOIN rot
+  CROSS JOIN LATERAL sr_box_cam_corners(o.bbox, cam.position, rot.rot_angle) AS c
 ),
--- 9. Flag “above” if ANY point lies in the padded prism:
+-- 8. Flag “above” if ANY point lies in the padded prism:
 --      Z ∈ [top_z, above_threshold]
 --  AND X ∈ [minx_ext, maxx_ext]
 --  AND Y ∈ [miny_ext, maxy_ext]
@@ -103,18 +79,18 @@ flag AS (
   SELECT
     MAX(
       CASE
-        WHEN ST_Z(pt) BETWEEN (SELECT top_z           FROM obj_x_metrics)
+        WHEN pt_z     BETWEEN (SELECT top_z           FROM obj_x_metrics)
                          AND (SELECT above_threshold FROM obj_x_metrics)
-         AND ST_X(pt) BETWEEN (SELECT minx_ext        FROM obj_x_metrics)
+         AND pt_x     BETWEEN (SELECT minx_ext        FROM obj_x_metrics)
                          AND (SELECT maxx_ext        FROM obj_x_metrics)
-         AND ST_Y(pt) BETWEEN (SELECT miny_ext        FROM obj_x_metrics)
+         AND pt_y     BETWEEN (SELECT miny_ext        FROM obj_x_metrics)
                          AND (SELECT maxy_ext        FROM obj_x_metrics)
         THEN 1 ELSE 0
       END
     ) AS above_flag
   FROM obj_y_points
 )
--- 10. Final output with IDs and human‐readable relation
+-- 9. Final output with IDs and human‐readable relation
 SELECT
   (SELECT top_z           FROM obj_x_metrics) AS obj_x_top_z_camera,
   (SELECT height          FROM obj_x_metrics) AS obj_x_height,
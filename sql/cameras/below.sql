@@ -0,0 +1,75 @@
+﻿-- File: cameras/below.sql
+-- Multi-camera form of exists/below.sql: evaluates "below" for one pair from
+-- every camera in a list in a single query and returns one
+-- (camera_id, below_flag) row per camera found.
+-- Parameters (as below.sql, with a camera id array in third place):
+--   1. object_x_id: The reference object ID.
+--   2. object_y_id: The target object ID.
+--   3. camera_ids: Array of camera IDs.
+--   4. s: The half-space scale factor.
+--   5. tol: The XY/Z padding tolerance.
+
+WITH params AS (
+  SELECT
+    CAST(%s AS INTEGER)          AS object_x_id,
+    CAST(%s AS INTEGER)          AS object_y_id,
+    CAST(%s AS INTEGER[])        AS camera_ids,
+    CAST(%s AS DOUBLE PRECISION) AS s,
+    CAST(%s AS DOUBLE PRECISION) AS tol
+),
+-- 1. Cameras
+cam AS (
+  SELECT camera.id AS camera_id, camera.position
+  FROM camera
+  JOIN params ON camera.id = ANY (params.camera_ids)
+),
+-- 2. Object Y (its corners are rotated per camera below)
+obj_y AS (
+  SELECT o.bbox
+  FROM room_objects o
+  JOIN params ON o.id = params.object_y_id
+),
+-- 3. Object X in camera space for every camera (sr_camera_geometry)
+env AS (
+  SELECT
+    cam.camera_id,
+    g.azimuth  AS rot_angle,
+    g.cam_minx AS minx,
+    g.cam_maxx AS maxx,
+    g.cam_miny AS miny,
+    g.cam_maxy AS maxy,
+    g.w_minz,
+    g.w_maxz
+  FROM cam
+  CROSS JOIN params
+  CROSS JOIN LATERAL sr_camera_geometry(cam.camera_id, params.object_x_id) AS g
+),
+-- 4. below-halfspace: extruded downwards by s × height (height clamped to ≥ tol),
+--    padded by tol on the two other axes
+prism AS (
+  SELECT
+    env.camera_id,
+    env.rot_angle,
+    env.w_minz - params.s * GREATEST(env.w_maxz - env.w_minz, params.tol)    AS z_lo,
+    env.w_minz                                                               AS z_hi,
+    env.minx - params.tol                                                    AS x_lo,
+    env.maxx + params.tol                                                    AS x_hi,
+    env.miny - params.tol                                                    AS y_lo,
+    env.maxy + params.tol                                                    AS y_hi
+  FROM env
+  CROSS JOIN params
+)
+-- 5. One flag per camera: does ANY corner of Y lie in that camera's prism?
+SELECT
+  cam.camera_id,
+  EXISTS (
+    SELECT 1
+    FROM obj_y
+    CROSS JOIN LATERAL sr_box_cam_corners(obj_y.bbox, cam.position, prism.rot_angle) AS c
+    WHERE c.z BETWEEN prism.z_lo AND prism.z_hi
+      AND c.x BETWEEN prism.x_lo AND prism.x_hi
+      AND c.y BETWEEN prism.y_lo AND prism.y_hi
+  )::int AS below_flag
+FROM cam
+JOIN prism ON prism.camera_id = cam.camera_id
+ORDER BY cam.camera_id;
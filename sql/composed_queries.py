@@ -1,5 +1,7 @@
 ﻿import os
-from db_utils import get_connection, run_query, load_query
+from contextlib import contextmanager
+
+from db_utils import borrow_connection, get_connection, run_query, load_query
 
 
 #OLD VERSIONS NOT OPTIMIZED
@@ -263,7 +265,21 @@ def affixed_to_relation(object2_id, object1_id, scale_factor):
 
 '''
 
-def on_top_relation(object_x_id, object_y_id, camera_id, scale_factor = 2, tolerance_metre=0.3, near_far_threshold=1):
+@contextmanager
+def _connection(conn=None):
+    """
+    *conn* when the caller passes one (the room being evaluated), else a
+    connection borrowed from the shared pool, if one is open (see
+    db_utils.borrow_connection).
+    """
+    if conn is not None:
+        yield conn
+        return
+    with borrow_connection() as conn:
+        yield conn
+
+
+def on_top_relation(object_x_id, object_y_id, camera_id, scale_factor = 2, tolerance_metre=0.3, near_far_threshold=1, conn=None):
     """
     Determines whether one object is on top of another by:
       1) checking 3D touches via touches.sql, and
@@ -273,51 +289,47 @@ def on_top_relation(object_x_id, object_y_id, camera_id, scale_factor = 2, toler
       - or "No object is on top of the other."
     """
     relation_flag = 0
-    conn = get_connection()
+    with _connection(conn) as conn:
+        # Load our SQL snippets
+        touches_sql = load_query('touches.sql')
+        above_sql   = load_query('above.sql')
 
-    # Load our SQL snippets
-    touches_sql = load_query('touches.sql')
-    above_sql   = load_query('above.sql')
+        # Step 1: does X touch Y?
+        flag_xy = run_query(conn, touches_sql, (object_x_id, object_y_id))[0][0]
+        if flag_xy:
+            # Step 2: if they touch, is X above Y?
+            above_row = run_query(
+                conn,
+                above_sql,
+                (object_x_id, object_y_id, camera_id, scale_factor, tolerance_metre)
+            )[0]
+            above_flag = above_row[3]
 
-    # Step 1: does X touch Y?
-    flag_xy = run_query(conn, touches_sql, (object_x_id, object_y_id))[0][0]
-    if flag_xy:
-        # Step 2: if they touch, is X above Y?
-        above_row = run_query(
-            conn,
-            above_sql,
-            (object_x_id, object_y_id, camera_id, scale_factor, tolerance_metre)
-        )[0]
-        above_flag = above_row[3]
+            if above_flag:
+                return 1, f"Object X (ID:{object_y_id}) is on top of Object Y (ID:{object_x_id})."
 
-        if above_flag:
-            conn.close()
-            return 1, f"Object X (ID:{object_y_id}) is on top of Object Y (ID:{object_x_id})."
-
-    # Step 3: does Y touch X?
-    flag_yx = run_query(conn, touches_sql, (object_y_id, object_x_id))[0][0]
-    if flag_yx:
-        # Step 4: if they touch, is Y above X?
-        above_row_rev = run_query(
-            conn,
-            above_sql,
-            (object_y_id, object_x_id, camera_id, scale_factor, tolerance_metre)
-        )[0]
-        above_flag_rev = above_row_rev[3]
+        # Step 3: does Y touch X?
+        flag_yx = run_query(conn, touches_sql, (object_y_id, object_x_id))[0][0]
+        if flag_yx:
+            # Step 4: if they touch, is Y above X?
+            above_row_rev = run_query(
+                conn,
+                above_sql,
+                (object_y_id, object_x_id, camera_id, scale_factor, tolerance_metre)
+            )[0]
+            above_flag_rev = above_row_rev[3]
 
-        if above_flag_rev:
-            conn.close()
-            return 1, f"Object Y (ID:{object_x_id}) is on top of Object X (ID:{object_y_id})."
+            if above_flag_rev:
+                return 1, f"Object Y (ID:{object_x_id}) is on top of Object X (ID:{object_y_id})."
 
-    # Neither orientation works
-    conn.close()
-    return 0, "No object is on top of the other."
+        # Neither orientation works
+        return 0, "No object is on top of the other."
 
 
 
 
 #OPTIMIZED VERSION
-def leans_on_relation(object1_id, object2_id, camera_id, scale_factor, tolerance_metre=0.3, near_far_threshold = 1):
+def leans_on_relation(object1_id, object2_id, camera_id, scale_factor, tolerance_metre=0.3, near_far_threshold = 1, conn=None):
     """
     Check if o2 leans on o1
     LeansOn(o₂, o₁, Fc) ⇔ 
@@ -327,105 +339,101 @@ def leans_on_relation(object1_id, object2_id, camera_id, scale_factor, tolerance
     Uses touches.sql, above.sql, below.sql, and a single EXISTS for the support‐from‐below check.
     """
     relation_flag = 0
-    conn = get_connection()
-    explanation = []
-
-    # Load SQL snippets
-    touches_sql = load_query('touches.sql')
-    above_sql   = load_query('above.sql')
-    below_sql   = load_query('below.sql')
-
-    # Step 1: does o₂ touch o₁?
-    touches_flag = run_query(conn, touches_sql, (object2_id, object1_id))[0][0]
-    explanation.append(
-        f"Step 1: Touches(o₂={object2_id}, o₁={object1_id}) => flag={touches_flag}"
-    )
-    if not touches_flag:
-        explanation.append("→ No 3D‐touch; aborting LeansOn.")
-        conn.close()
-        return relation_flag, "\n".join(explanation)
+    with _connection(conn) as conn:
+        explanation = []
 
-    # Step 2: ensure o₂ is neither above nor below o₁
-    above_row = run_query(
-        conn, above_sql, (object2_id, object1_id, camera_id, scale_factor, tolerance_metre)
-    )[0]
-    above_flag = above_row[3]
-    rel_above  = above_row[4]
-    explanation.append(
-        f"Step 2a: Above(o₂→o₁) => {rel_above} (above_flag={above_flag})"
-    )
-    if above_flag:
-        explanation.append("→ It is above; cannot lean on.")
-        conn.close()
-        return relation_flag, "\n".join(explanation)
+        # Load SQL snippets
+        touches_sql = load_query('touches.sql')
+        above_sql   = load_query('above.sql')
+        below_sql   = load_query('below.sql')
 
-    below_row = run_query(
-        conn, below_sql, (object2_id, object1_id, camera_id, scale_factor, tolerance_metre)
-    )[0]
-    below_flag = below_row[3]
-    rel_below  = below_row[4]
-    explanation.append(
-        f"Step 2b: Below(o₂→o₁) => {rel_below} (below_flag={below_flag})"
-    )
-    if below_flag:
-        explanation.append("→ It is below; cannot lean on.")
-        conn.close()
-        return relation_flag, "\n".join(explanation)
-
-    # Step 3: ∃ o₃ supporting below o₂?
-    exists_sql = """
-    WITH x AS (
-      SELECT bbox
-      FROM room_objects
-      WHERE id = %s
-    ), y AS (
-      SELECT bbox
-      FROM room_objects
-      WHERE id = %s
-    )
-    SELECT EXISTS(
-      SELECT 1
-      FROM room_objects AS o3, x, y
-      WHERE o3.id NOT IN (%s, %s)
-        -- new 3D‐touch test with a 0.1m tolerance
-        AND ST_3DDWithin(x.bbox, o3.bbox, 0.1)
-        -- require o₃’s top face below o₂’s bottom face
-        AND ST_ZMax(o3.bbox) < ST_ZMin(y.bbox)
-    )::int
-    """
-    support_exists = run_query(
-        conn,
-        exists_sql,
-        (
-            object2_id,     # x.id
-            object2_id,     # y.id for ST_ZMin(y.bbox)
-            object2_id,     # o3.id NOT IN (o₂, o₁)
-            object1_id
+        # Step 1: does o₂ touch o₁?
+        touches_flag = run_query(conn, touches_sql, (object2_id, object1_id))[0][0]
+        explanation.append(
+            f"Step 1: Touches(o₂={object2_id}, o₁={object1_id}) => flag={touches_flag}"
         )
-    )[0][0]
-    explanation.append(f"Step 3: ∃ o₃ supporting below o₂? => {support_exists}")
+        if not touches_flag:
+            explanation.append("→ No 3D‐touch; aborting LeansOn.")
+            return relation_flag, "\n".join(explanation)
 
-    # … Conclusion …
-    if support_exists:
+        # Step 2: ensure o₂ is neither above nor below o₁
+        above_row = run_query(
+            conn, above_sql, (object2_id, object1_id, camera_id, scale_factor, tolerance_metre)
+        )[0]
+        above_flag = above_row[3]
+        rel_above  = above_row[4]
         explanation.append(
-            f"Conclusion: Object2 (ID={object2_id}) LEANS ON Object1 (ID={object1_id})."
+            f"Step 2a: Above(o₂→o₁) => {rel_above} (above_flag={above_flag})"
         )
-        relation_flag = 1
-    else:
+        if above_flag:
+            explanation.append("→ It is above; cannot lean on.")
+            return relation_flag, "\n".join(explanation)
+
+        below_row = run_query(
+            conn, below_sql, (object2_id, object1_id, camera_id, scale_factor, tolerance_metre)
+        )[0]
+        below_flag = below_row[3]
+        rel_below  = below_row[4]
         explanation.append(
-            f"Conclusion: No supporting object below o₂ → "
-            f"Object2 (ID={object2_id}) does NOT lean on Object1 (ID={object1_id})."
+            f"Step 2b: Below(o₂→o₁) => {rel_below} (below_flag={below_flag})"
         )
-        relation_flag = 0
+        if below_flag:
+            explanation.append("→ It is below; cannot lean on.")
+            return relation_flag, "\n".join(explanation)
+
+        # Step 3: ∃ o₃ supporting below o₂?
+        exists_sql = """
+        WITH x AS (
+          SELECT bbox
+          FROM room_objects
+          WHERE id = %s
+        ), y AS (
+          SELECT bbox
+          FROM room_objects
+          WHERE id = %s
+        )
+        SELECT EXISTS(
+          SELECT 1
+          FROM room_objects AS o3, x, y
+          WHERE o3.id NOT IN (%s, %s)
+            -- new 3D‐touch test with a 0.1m tolerance
+            AND ST_3DDWithin(x.bbox, o3.bbox, 0.1)
+            -- require o₃’s top face below o₂’s bottom face
+            AND ST_ZMax(o3.bbox) < ST_ZMin(y.bbox)
+        )::int
+        """
+        support_exists = run_query(
+            conn,
+            exists_sql,
+            (
+                object2_id,     # x.id
+                object2_id,     # y.id for ST_ZMin(y.bbox)
+                object2_id,     # o3.id NOT IN (o₂, o₁)
+                object1_id
+            )
+        )[0][0]
+        explanation.append(f"Step 3: ∃ o₃ supporting below o₂? => {support_exists}")
+
+        # … Conclusion …
+        if support_exists:
+            explanation.append(
+                f"Conclusion: Object2 (ID={object2_id}) LEANS ON Object1 (ID={object1_id})."
+            )
+            relation_flag = 1
+        else:
+            explanation.append(
+                f"Conclusion: No supporting object below o₂ → "
+                f"Object2 (ID={object2_id}) does NOT lean on Object1 (ID={object1_id})."
+            )
+            relation_flag = 0
 
-    conn.close()
-    return relation_flag, "\n".join(explanation)
+        return relation_flag, "\n".join(explanation)
 
 
 
 
 #OPTIMIED VERSION 
-def affixed_to_relation(object1_id, object2_id, camera_id, scale_factor, tolerance_metre= 0.3, near_far_threshold = 1):
+def affixed_to_relation(object1_id, object2_id, camera_id, scale_factor, tolerance_metre= 0.3, near_far_threshold = 1, conn=None):
     """
     Check if o2 affixed to o1
     AffixedTo(o₂,o₁,Fc) ⇔
@@ -433,80 +441,77 @@ def affixed_to_relation(object1_id, object2_id, camera_id, scale_factor, toleran
     Uses touches.sql, above.sql, and one EXISTS for the final check.
     """
     relation_flag = 0
-    conn = get_connection()
-    explanation = []
+    with _connection(conn) as conn:
+        explanation = []
 
-    # Load reusable SQL
-    touches_sql = load_query('touches.sql')  # returns 1/0
-    above_sql   = load_query('above.sql')    # returns [top_z, height, above_threshold, above_flag, relation]
-
-    # Step 1: Touch test
-    flag_touch = run_query(conn, touches_sql, (object2_id, object1_id))[0][0]
-    explanation.append(
-        f"Step 1: Touches(o₂={object2_id}, o₁={object1_id}) => flag={flag_touch}"
-    )
-    if not flag_touch:
-        explanation.append("→ Does not touch; cannot be affixed.")
-        conn.close()
-        return relation_flag, "\n".join(explanation)
+        # Load reusable SQL
+        touches_sql = load_query('touches.sql')  # returns 1/0
+        above_sql   = load_query('above.sql')    # returns [top_z, height, above_threshold, above_flag, relation]
 
-    # Step 2: Ensure o₂ is not above o₁
-    above_row = run_query(
-        conn,
-        above_sql,
-        (object1_id, object2_id, camera_id, scale_factor, tolerance_metre)
-    )[0]
-    above_flag = above_row[3]
-    rel_above  = above_row[4]
-    explanation.append(
-        f"Step 2: Above(o₂→o₁) => {rel_above} (above_flag={above_flag})"
-    )
-    if above_flag:
-        explanation.append("→ It is above; cannot be affixed.")
-        conn.close()
-        return relation_flag, "\n".join(explanation)
+        # Step 1: Touch test
+        flag_touch = run_query(conn, touches_sql, (object2_id, object1_id))[0][0]
+        explanation.append(
+            f"Step 1: Touches(o₂={object2_id}, o₁={object1_id}) => flag={flag_touch}"
+        )
+        if not flag_touch:
+            explanation.append("→ Does not touch; cannot be affixed.")
+            return relation_flag, "\n".join(explanation)
 
-    #Step 3: Verify NO other o₃ touches o₂ within 0.1 m, and only consider IfcSlab because 
-    #IfcSlab: classe per elementi orizzontali piani con PredefinedType (FLOOR, ROOF, LANDING, BASESLAB, PAVING, ecc.)
-    no_other_sql = """
-    WITH x AS (
-      SELECT bbox
-      FROM room_objects
-      WHERE id = %s
-    )
-    SELECT (
-      NOT EXISTS (
-        SELECT 1
-        FROM room_objects AS o3, x
-        WHERE o3.id NOT IN (%s, %s)
-          AND ST_3DDWithin(x.bbox, o3.bbox, 0.1)
-          AND o3.ifc_type = 'IfcSlab'
-      )
-    )::int
-    """
-    no_other_flag = run_query(
-        conn,
-        no_other_sql,
-        (object2_id, object2_id, object1_id)
-    )[0][0]
-    explanation.append(
-        f"Step 3: no other o₃ touches o₂? => {no_other_flag}"
-    )
-
-    # Conclusion
-    if no_other_flag:
+        # Step 2: Ensure o₂ is not above o₁
+        above_row = run_query(
+            conn,
+            above_sql,
+            (object1_id, object2_id, camera_id, scale_factor, tolerance_metre)
+        )[0]
+        above_flag = above_row[3]
+        rel_above  = above_row[4]
         explanation.append(
-            f"Conclusion: Object2 (ID={object2_id}) is AFFIXED TO Object1 (ID={object1_id})."
+            f"Step 2: Above(o₂→o₁) => {rel_above} (above_flag={above_flag})"
         )
-        relation_flag = 1
-    else:
+        if above_flag:
+            explanation.append("→ It is above; cannot be affixed.")
+            return relation_flag, "\n".join(explanation)
+
+        #Step 3: Verify NO other o₃ touches o₂ within 0.1 m, and only consider IfcSlab because 
+        #IfcSlab: classe per elementi orizzontali piani con PredefinedType (FLOOR, ROOF, LANDING, BASESLAB, PAVING, ecc.)
+        no_other_sql = """
+        WITH x AS (
+          SELECT bbox
+          FROM room_objects
+          WHERE id = %s
+        )
+        SELECT (
+          NOT EXISTS (
+            SELECT 1
+            FROM room_objects AS o3, x
+            WHERE o3.id NOT IN (%s, %s)
+              AND ST_3DDWithin(x.bbox, o3.bbox, 0.1)
+              AND o3.ifc_type = 'IfcSlab'
+          )
+        )::int
+        """
+        no_other_flag = run_query(
+            conn,
+            no_other_sql,
+            (object2_id, object2_id, object1_id)
+        )[0][0]
         explanation.append(
-            f"Conclusion: Object2 (ID={object2_id}) is NOT affixed to Object1 (ID={object1_id}); another object touches it."
+            f"Step 3: no other o₃ touches o₂? => {no_other_flag}"
         )
-        relation_flag = 0
 
-    conn.close()
-    return relation_flag, explanation
+        # Conclusion
+        if no_other_flag:
+            explanation.append(
+                f"Conclusion: Object2 (ID={object2_id}) is AFFIXED TO Object1 (ID={object1_id})."
+            )
+            relation_flag = 1
+        else:
+            explanation.append(
+                f"Conclusion: Object2 (ID={object2_id}) is NOT affixed to Object1 (ID={object1_id}); another object touches it."
+            )
+            relation_flag = 0
+
+        return relation_flag, explanation
 
 
 
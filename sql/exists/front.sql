@@ -0,0 +1,79 @@
+﻿-- File: exists/front.sql
+-- Boolean fast path of front.sql: returns only front_flag and stops at the
+-- first corner of object Y found inside the front prism of object X.  No
+-- metrics are computed and all arithmetic is in double precision.
+-- Parameters (same order as front.sql):
+--   1. object_x_id: The reference object ID.
+--   2. object_y_id: The target object ID.
+--   3. camera_id: The camera ID.
+--   4. s: The half-space scale factor.
+--   5. tol: The XY/Z padding tolerance.
+
+WITH params AS (
+  SELECT
+    CAST(%s AS INTEGER)          AS object_x_id,
+    CAST(%s AS INTEGER)          AS object_y_id,
+    CAST(%s AS INTEGER)          AS camera_id,
+    CAST(%s AS DOUBLE PRECISION) AS s,
+    CAST(%s AS DOUBLE PRECISION) AS tol
+),
+-- 1. Camera
+cam AS (
+  SELECT position
+  FROM camera
+  WHERE id = (SELECT camera_id FROM params)
+),
+-- 2. Object X in camera space, precomputed per camera
+--    (sr_camera_geometry, see functions/camera_object_geometry.sql)
+obj_x_info AS (
+  SELECT g.azimuth, g.cam_minx, g.cam_maxx, g.cam_miny, g.cam_maxy, g.w_minz, g.w_maxz
+  FROM params
+  CROSS JOIN LATERAL sr_camera_geometry(params.camera_id, params.object_x_id) AS g
+),
+-- 3. Rotation so ray→centroid aligns with +Y
+rot AS (
+  SELECT azimuth AS rot_angle
+  FROM obj_x_info
+),
+-- 4. Camera-space envelope of X and its world Z-range
+env AS (
+  SELECT
+    cam_minx AS minx,
+    cam_maxx AS maxx,
+    cam_miny AS miny,
+    cam_maxy AS maxy,
+    w_minz,
+    w_maxz
+  FROM obj_x_info
+),
+-- 5. front-halfspace: extruded towards the camera by s × depth (≤ 5.0),
+--    padded by tol on the two other axes
+prism AS (
+  SELECT
+    env.miny - LEAST(params.s * (env.maxy - env.miny), 5.0)                  AS y_lo,
+    env.miny                                                                 AS y_hi,
+    env.minx - params.tol                                                    AS x_lo,
+    env.maxx + params.tol                                                    AS x_hi,
+    env.w_minz - params.tol                                                  AS z_lo,
+    env.w_maxz + params.tol                                                  AS z_hi
+  FROM env
+  CROSS JOIN params
+),
+-- 6. Corners of Y in camera space (4 footprint corners × world Z-range)
+obj_y_points AS (
+  SELECT c.x AS pt_x, c.y AS pt_y, c.z AS pt_z
+  FROM room_objects o
+  JOIN params ON o.id = params.object_y_id
+  CROSS JOIN cam
+  CROSS JOIN rot
+  CROSS JOIN LATERAL sr_box_cam_corners(o.bbox, cam.position, rot.rot_angle) AS c
+)
+-- 7. Flag: does ANY point of Y lie in the prism?
+SELECT EXISTS (
+  SELECT 1
+  FROM obj_y_points
+  CROSS JOIN prism
+  WHERE pt_y BETWEEN prism.y_lo AND prism.y_hi
+    AND pt_x BETWEEN prism.x_lo AND prism.x_hi
+    AND pt_z BETWEEN prism.z_lo AND prism.z_hi
+)::int AS front_flag;
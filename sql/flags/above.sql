@@ -0,0 +1,103 @@
+﻿-- File: flags/above.sql
+-- Flag-and-metrics mode of above.sql: same parameters and columns, without the
+-- trailing human-readable relation column.
+
+WITH params AS (
+  SELECT
+    CAST(%s AS INTEGER) AS object_x_id,
+    CAST(%s AS INTEGER) AS object_y_id,
+    CAST(%s AS INTEGER) AS camera_id,
+    CAST(%s AS NUMERIC) AS s,     -- half‐space scale factor
+    CAST(%s AS NUMERIC) AS tol    -- XY/Z padding tolerance
+),
+-- 1. Camera
+cam AS (
+  SELECT position
+  FROM camera
+  WHERE id = (SELECT camera_id FROM params)
+),
+-- 2. Object X in camera space, precomputed per camera
+--    (sr_camera_geometry, see functions/camera_object_geometry.sql)
+obj_x_info AS (
+  SELECT g.azimuth, g.cam_minx, g.cam_maxx, g.cam_miny, g.cam_maxy, g.w_minz, g.w_maxz
+  FROM params
+  CROSS JOIN LATERAL sr_camera_geometry(params.camera_id, params.object_x_id) AS g
+),
+-- 3. Compute rotation so ray→centroid → +Y
+rot AS (
+  SELECT azimuth AS rot_angle
+  FROM obj_x_info
+),
+-- 4. Camera-space 2D envelope for X & Y limits
+obj_x_bbox AS (
+  SELECT
+    cam_minx AS minx,
+    cam_maxx AS maxx,
+    cam_miny AS miny,
+    cam_maxy AS maxy
+  FROM obj_x_info
+),
+-- 5. True Z‐range of X in world‐space
+obj_x_world_z AS (
+  SELECT
+    w_minz        AS w_minz,
+    w_maxz        AS w_maxz
+  FROM obj_x_info
+),
+-- 6. Compute “above” half‐space parameters,
+--    clamping zero‐thickness to at least tol to handle flat objects,
+--    and extending X/Y by tol
+obj_x_metrics AS (
+  SELECT
+    wz.w_maxz                                                                 AS top_z,
+    -- clamp object thickness to at least tol
+    GREATEST(wz.w_maxz - wz.w_minz, params.tol)                                 AS height,
+    -- use clamped height in threshold computation
+    wz.w_maxz + params.s * GREATEST(wz.w_maxz - wz.w_minz, params.tol)          AS above_threshold,
+    fx.minx                                                                   AS minx,
+    fx.maxx                                                                   AS maxx,
+    fx.miny                                                                   AS miny,
+    fx.maxy                                                                   AS maxy,
+    (fx.minx - params.tol)                                                     AS minx_ext,
+    (fx.maxx + params.tol)                                                     AS maxx_ext,
+    (fx.miny - params.tol)                                                     AS miny_ext,
+    (fx.maxy + params.tol)                                                     AS maxy_ext
+  FROM obj_x_bbox fx
+  CROSS JOIN obj_x_world_z wz
+  CROSS JOIN params
+),
+-- 7. Corners of Y in camera space (4 footprint corners × world Z-range)
+obj_y_points AS (
+  SELECT c.x AS pt_x, c.y AS pt_y, c.z AS pt_z
+  FROM room_objects o
+  JOIN params ON o.id = params.object_y_id
+  CROSS JOIN cam
+  CROSS JOIN rot
+  CROSS JOIN LATERAL sr_box_cam_corners(o.bbox, cam.position, rot.rot_angle) AS c
+),
+-- 8. Flag “above” if ANY point lies in the padded prism:
+--      Z ∈ [top_z, above_threshold]
+--  AND X ∈ [minx_ext, maxx_ext]
+--  AND Y ∈ [miny_ext, maxy_ext]
+flag AS (
+  SELECT
+    MAX(
+      CASE
+        WHEN pt_z     BETWEEN (SELECT top_z           FROM obj_x_metrics)
+                         AND (SELECT above_threshold FROM obj_x_metrics)
+         AND pt_x     BETWEEN (SELECT minx_ext        FROM obj_x_metrics)
+                         AND (SELECT maxx_ext        FROM obj_x_metrics)
+         AND pt_y     BETWEEN (SELECT miny_ext        FROM obj_x_metrics)
+                         AND (SELECT maxy_ext        FROM obj_x_metrics)
+        THEN 1 ELSE 0
+      END
+    ) AS above_flag
+  FROM obj_y_points
+)
+-- 9. Final output: metrics and flag only (relation text is rendered in Python)
+SELECT
+  (SELECT top_z           FROM obj_x_metrics) AS obj_x_top_z_camera,
+  (SELECT height          FROM obj_x_metrics) AS obj_x_height,
+  (SELECT above_threshold FROM obj_x_metrics) AS halfspace_threshold_above_camera,
+  flag.above_flag
+FROM flag;
\ No newline at end of file
@@ -0,0 +1,110 @@
+﻿-- File: flags/behind.sql
+-- Flag-and-metrics mode of behind.sql: same parameters and columns, without the
+-- trailing human-readable relation column.
+-- Parameters:
+--   1. object_x_id: The reference object ID (e.g., Main Bed).
+--   2. object_y_id: The target object ID (e.g., Main Door).
+--   3. camera_id: The camera ID.
+--   4. s: The scale factor (e.g., 5 means the halfspace extends 5× the object depth).
+--   5. tol: The XY/Z padding tolerance.
+
+WITH params AS (
+  SELECT
+    CAST(%s AS INTEGER) AS object_x_id,
+    CAST(%s AS INTEGER) AS object_y_id,
+    CAST(%s AS INTEGER) AS camera_id,
+    CAST(%s AS NUMERIC) AS s,
+    CAST(%s AS NUMERIC) AS tol
+),
+-- 1. Camera
+cam AS (
+  SELECT position
+  FROM camera
+  WHERE id = (SELECT camera_id FROM params)
+),
+-- 2. Object X in camera space, precomputed per camera
+--    (sr_camera_geometry, see functions/camera_object_geometry.sql)
+obj_x_info AS (
+  SELECT g.azimuth, g.cam_minx, g.cam_maxx, g.cam_miny, g.cam_maxy, g.w_minz, g.w_maxz
+  FROM params
+  CROSS JOIN LATERAL sr_camera_geometry(params.camera_id, params.object_x_id) AS g
+),
+-- 3. Rotation so the ray→centroid aligns with +Y
+rot AS (
+  SELECT azimuth AS rot_angle
+  FROM obj_x_info
+),
+-- 4. Camera-space 2D envelope for X & Y limits
+obj_x_bbox AS (
+  SELECT
+    cam_minx AS minx,
+    cam_maxx AS maxx,
+    cam_miny AS miny,
+    cam_maxy AS maxy
+  FROM obj_x_info
+),
+-- 5. True Z-range of X in world-space, extended by tolerance
+obj_x_world_z AS (
+  SELECT
+    w_minz               AS w_minz,
+    w_maxz               AS w_maxz,
+    w_minz - tol         AS w_minz_ext,
+    w_maxz + tol         AS w_maxz_ext
+  FROM obj_x_info
+  CROSS JOIN params
+),
+-- 6. Compute behind-halfspace parameters,
+--    clamp the extrusion (s × depth) to at most 5.0 units,
+--    extend X-range by tol
+obj_x_metrics AS (
+  SELECT
+    (fx.maxy - fx.miny)                                           AS depth,
+    fx.maxy                                                       AS back_y,
+    -- limit s*depth to <= 5.0 before adding to back_y
+    fx.maxy
+      + LEAST(params.s * (fx.maxy - fx.miny), 5.0)                AS behind_threshold,
+    fx.minx                                                       AS minx,
+    fx.maxx                                                       AS maxx,
+    (fx.minx - params.tol)                                        AS minx_ext,
+    (fx.maxx + params.tol)                                        AS maxx_ext,
+    wz.w_minz_ext                                                 AS w_minz_ext,
+    wz.w_maxz_ext                                                 AS w_maxz_ext
+  FROM obj_x_bbox fx
+  CROSS JOIN obj_x_world_z wz
+  CROSS JOIN params
+),
+-- 7. Corners of Y in camera space (4 footprint corners × world Z-range)
+obj_y_points AS (
+  SELECT c.x AS pt_x, c.y AS pt_y, c.z AS pt_z
+  FROM room_objects o
+  JOIN params ON o.id = params.object_y_id
+  CROSS JOIN cam
+  CROSS JOIN rot
+  CROSS JOIN LATERAL sr_box_cam_corners(o.bbox, cam.position, rot.rot_angle) AS c
+),
+-- 8. Flag “behind” if ANY point lies in the tolerance-padded, size-clamped prism:
+--      Y ∈ [back_y, behind_threshold]
+--  AND X ∈ [minx_ext, maxx_ext]
+--  AND Z ∈ [w_minz_ext, w_maxz_ext]
+flag AS (
+  SELECT
+    MAX(
+      CASE
+        WHEN pt_y     BETWEEN (SELECT back_y             FROM obj_x_metrics)
+                         AND (SELECT behind_threshold   FROM obj_x_metrics)
+         AND pt_x     BETWEEN (SELECT minx_ext         FROM obj_x_metrics)
+                         AND (SELECT maxx_ext         FROM obj_x_metrics)
+         AND pt_z     BETWEEN (SELECT w_minz_ext        FROM obj_x_metrics)
+                         AND (SELECT w_maxz_ext        FROM obj_x_metrics)
+        THEN 1 ELSE 0
+      END
+    ) AS behind_flag
+  FROM obj_y_points
+)
+-- 9. Final output: metrics and flag only (relation text is rendered in Python)
+SELECT
+  (SELECT back_y             FROM obj_x_metrics) AS obj_x_back_y_camera,
+  (SELECT depth              FROM obj_x_metrics) AS obj_x_depth,
+  (SELECT behind_threshold   FROM obj_x_metrics) AS halfspace_threshold_behind_camera,
+  flag.behind_flag
+FROM flag;
\ No newline at end of file
@@ -0,0 +1,116 @@
+﻿-- File: flags/below.sql
+-- Flag-and-metrics mode of below.sql: same parameters and columns, without the
+-- trailing human-readable relation column.
+-- Parameters:
+--   1. object_x_id: The reference object ID, this is the object that we are extruding towards below
+--   2. object_y_id: The target object ID , therefore we are checking if y is below object x
+--   3. camera_id: The camera ID.
+--   4. s: The half-space scale factor.
+--   5. tol: The padding tolerance.
+
+WITH params AS (
+  SELECT
+    CAST(%s AS INTEGER) AS object_x_id,
+    CAST(%s AS INTEGER) AS object_y_id,
+    CAST(%s AS INTEGER) AS camera_id,
+    CAST(%s AS NUMERIC) AS s,     -- half-space scale factor
+    CAST(%s AS NUMERIC) AS tol    -- padding tolerance
+),
+-- 1. Camera
+cam AS (
+  SELECT position
+  FROM camera
+  WHERE id = (SELECT camera_id FROM params)
+),
+-- 2. Object X in camera space, precomputed per camera
+--    (sr_camera_geometry, see functions/camera_object_geometry.sql)
+obj_x_info AS (
+  SELECT g.azimuth, g.cam_minx, g.cam_maxx, g.cam_miny, g.cam_maxy, g.w_minz, g.w_maxz
+  FROM params
+  CROSS JOIN LATERAL sr_camera_geometry(params.camera_id, params.object_x_id) AS g
+),
+-- 3. Compute rotation so ray→centroid → +Y
+rot AS (
+  SELECT azimuth AS rot_angle
+  FROM obj_x_info
+),
+-- 4. Camera-space 2D envelope for X & Y limits
+obj_x_bbox AS (
+  SELECT
+    cam_minx AS minx,
+    cam_maxx AS maxx,
+    cam_miny AS miny,
+    cam_maxy AS maxy
+  FROM obj_x_info
+),
+-- 5. True Z‐range of X in world‐space, extended by tol
+obj_x_world_z AS (
+  SELECT
+    w_minz               AS bottom_z,
+    w_maxz               AS top_z,
+    w_minz - tol         AS bottom_z_ext,
+    w_maxz + tol         AS top_z_ext
+  FROM obj_x_info
+  CROSS JOIN params
+),
+-- 6. Compute “below” half‐space parameters:
+--    • clamp thickness to at least tol,
+--    • bottom_z = w_minz,
+--    • below_threshold = bottom_z - s·height,
+--    • extend X/Y by tol
+obj_x_metrics AS (
+  SELECT
+    wz.bottom_z                                                               AS bottom_z,
+    -- clamp object thickness to at least tol
+    GREATEST(wz.top_z - wz.bottom_z, params.tol)                               AS height,
+    -- threshold downward extrude
+    wz.bottom_z - params.s * GREATEST(wz.top_z - wz.bottom_z, params.tol)      AS below_threshold,
+    fx.minx                                                                   AS minx,
+    fx.maxx                                                                   AS maxx,
+    fx.miny                                                                   AS miny,
+    fx.maxy                                                                   AS maxy,
+    (fx.minx - params.tol)                                                     AS minx_ext,
+    (fx.maxx + params.tol)                                                     AS maxx_ext,
+    (fx.miny - params.tol)                                                     AS miny_ext,
+    (fx.maxy + params.tol)                                                     AS maxy_ext,
+    wz.bottom_z_ext                                                            AS w_minz_ext,
+    wz.top_z_ext                                                               AS w_maxz_ext
+  FROM obj_x_bbox fx
+  CROSS JOIN obj_x_world_z wz
+  CROSS JOIN params
+),
+-- 7. Corners of Y in camera space (4 footprint corners × world Z-range)
+obj_y_points AS (
+  SELECT c.x AS pt_x, c.y AS pt_y, c.z AS pt_z
+  FROM room_objects o
+  JOIN params ON o.id = params.object_y_id
+  CROSS JOIN cam
+  CROSS JOIN rot
+  CROSS JOIN LATERAL sr_box_cam_corners(o.bbox, cam.position, rot.rot_angle) AS c
+),
+-- 8. Flag “below” if ANY point lies in the padded, clamped prism:
+--      Z ∈ [below_threshold, bottom_z]
+--  AND X ∈ [minx_ext, maxx_ext]
+--  AND Y ∈ [miny_ext, maxy_ext]
+flag AS (
+  SELECT
+    MAX(
+      CASE
+        WHEN pt_z     BETWEEN (SELECT below_threshold FROM obj_x_metrics)
+                         AND (SELECT bottom_z       FROM obj_x_metrics)
+         AND pt_x     BETWEEN (SELECT minx_ext       FROM obj_x_metrics)
+                         AND (SELECT maxx_ext       FROM obj_x_metrics)
+         AND pt_y     BETWEEN (SELECT miny_ext       FROM obj_x_metrics)
+                         AND (SELECT maxy_ext       FROM obj_x_metrics)
+        THEN 1 ELSE 0
+      END
+    ) AS below_flag
+  FROM obj_y_points
+)
+-- 9. Final output: metrics and flag only (relation text is rendered in Python)
+SELECT
+  (SELECT bottom_z         FROM obj_x_metrics) AS obj_x_bottom_z_camera,
+  (SELECT height           FROM obj_x_metrics) AS obj_x_height,
+  (SELECT below_threshold  FROM obj_x_metrics) AS halfspace_threshold_below_camera,
+  flag.below_flag
+FROM flag;
\ No newline at end of file
@@ -0,0 +1,17 @@
+﻿-- File: flags/touches.sql
+-- Flag-only mode of touches.sql (no relation text).
+-- Params: 1) object1_id,  2) object2_id
+
+WITH x AS (
+  SELECT bbox
+  FROM room_objects
+  WHERE id = %s
+),
+y AS (
+  SELECT bbox
+  FROM room_objects
+  WHERE id = %s
+)
+SELECT
+  (ST_3DDWithin(x.bbox, y.bbox, 0.1))::int AS touches_flag
+FROM x, y;
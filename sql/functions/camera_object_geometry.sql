@@ -0,0 +1,176 @@
+﻿-- File: functions/camera_object_geometry.sql
+-- Per-camera camera-space geometry of every object, so the directional
+-- templates read the azimuth, camera-space envelope and world Z-range of
+-- object X instead of recomputing them for every pair.
+--
+-- One row per (camera_id, object_id); the envelope is the box rotated by its
+-- own azimuth, exactly what sr_box_cam_envelope returns.  Rows are rebuilt
+-- automatically when a camera is added or moved and when an object of
+-- room_objects is added, moved or deleted (triggers below), and explicitly
+-- by sr_refresh_camera_geometry() after the model is re-ingested
+-- (BIMtoPostGre/main.py, db_utils.ensure_camera_geometry()).  The templates
+-- read the rows through sr_camera_geometry(), which computes a missing row
+-- on the fly rather than dropping the pair.
+--
+-- This file alters camera and creates triggers on camera and room_objects,
+-- so it is a migration: it runs from "python db_utils.py" (see
+-- db_utils.install_sql_functions()), never on connect.
+--
+-- in_view tells whether the object falls in the camera's horizontal view
+-- cone (camera.view_azimuth, camera.fov in degrees, see sr_box_in_view); it
+-- is the prefilter of the opt-in FOV culling of directional candidates.  A
+-- camera stored without a view_azimuth, with a NULL fov, or with a fov of
+-- 360 or more sees every object.
+
+ALTER TABLE camera ADD COLUMN IF NOT EXISTS view_azimuth DOUBLE PRECISION;
+
+CREATE TABLE IF NOT EXISTS camera_object_geometry (
+  camera_id INTEGER          NOT NULL,
+  object_id INTEGER          NOT NULL,
+  azimuth   DOUBLE PRECISION,
+  cam_minx  DOUBLE PRECISION,
+  cam_maxx  DOUBLE PRECISION,
+  cam_miny  DOUBLE PRECISION,
+  cam_maxy  DOUBLE PRECISION,
+  w_minz    DOUBLE PRECISION,
+  w_maxz    DOUBLE PRECISION,
+  in_view   BOOLEAN,
+  PRIMARY KEY (camera_id, object_id)
+);
+ALTER TABLE camera_object_geometry ADD COLUMN IF NOT EXISTS in_view BOOLEAN;
+
+CREATE INDEX IF NOT EXISTS camera_object_geometry_in_view
+  ON camera_object_geometry (camera_id, object_id)
+  WHERE in_view;
+
+-- Rebuild the rows of one camera and/or one object; a NULL id stands for
+-- every camera / every object.  Returns the number of rows written.
+CREATE OR REPLACE FUNCTION sr_write_camera_geometry(p_camera_id INTEGER, p_object_id INTEGER)
+RETURNS INTEGER
+LANGUAGE plpgsql AS $$
+DECLARE
+  n INTEGER;
+BEGIN
+  DELETE FROM camera_object_geometry
+  WHERE (p_camera_id IS NULL OR camera_id = p_camera_id)
+    AND (p_object_id IS NULL OR object_id = p_object_id);
+
+  INSERT INTO camera_object_geometry
+    (camera_id, object_id, azimuth, cam_minx, cam_maxx, cam_miny, cam_maxy, w_minz, w_maxz, in_view)
+  SELECT
+    c.id,
+    o.id,
+    a.azimuth,
+    e.minx,
+    e.maxx,
+    e.miny,
+    e.maxy,
+    ST_ZMin(o.bbox),
+    ST_ZMax(o.bbox),
+    sr_box_in_view(o.bbox, c.position, c.view_azimuth, c.fov::double precision)
+  FROM camera c
+  CROSS JOIN room_objects o
+  CROSS JOIN LATERAL (SELECT sr_box_azimuth(o.bbox, c.position) AS azimuth) a
+  CROSS JOIN LATERAL sr_box_cam_envelope(o.bbox, c.position, a.azimuth) AS e
+  WHERE (p_camera_id IS NULL OR c.id = p_camera_id)
+    AND (p_object_id IS NULL OR o.id = p_object_id);
+
+  GET DIAGNOSTICS n = ROW_COUNT;
+  RETURN n;
+END;
+$$;
+
+-- Rebuild the rows of one camera, or of every camera when p_camera_id is
+-- NULL.  Returns the number of rows written.
+CREATE OR REPLACE FUNCTION sr_refresh_camera_geometry(p_camera_id INTEGER DEFAULT NULL)
+RETURNS INTEGER
+LANGUAGE sql AS $$
+  SELECT sr_write_camera_geometry(p_camera_id, NULL);
+$$;
+
+-- Geometry of object p_object_id seen from camera p_camera_id, as the
+-- directional templates read it: the stored row, or the same values computed
+-- from room_objects when the row is missing (e.g. a camera added with the
+-- triggers disabled), so a missing row never reads as "no relation".  No row
+-- when the camera or the object does not exist.
+CREATE OR REPLACE FUNCTION sr_camera_geometry(p_camera_id INTEGER, p_object_id INTEGER)
+RETURNS TABLE (
+  azimuth  DOUBLE PRECISION,
+  cam_minx DOUBLE PRECISION,
+  cam_maxx DOUBLE PRECISION,
+  cam_miny DOUBLE PRECISION,
+  cam_maxy DOUBLE PRECISION,
+  w_minz   DOUBLE PRECISION,
+  w_maxz   DOUBLE PRECISION
+)
+LANGUAGE sql STABLE PARALLEL SAFE AS $$
+  SELECT g.azimuth, g.cam_minx, g.cam_maxx, g.cam_miny, g.cam_maxy, g.w_minz, g.w_maxz
+  FROM camera_object_geometry g
+  WHERE g.camera_id = p_camera_id AND g.object_id = p_object_id
+  UNION ALL
+  SELECT a.azimuth, e.minx, e.maxx, e.miny, e.maxy, ST_ZMin(o.bbox), ST_ZMax(o.bbox)
+  FROM camera c
+  JOIN room_objects o ON o.id = p_object_id
+  CROSS JOIN LATERAL (SELECT sr_box_azimuth(o.bbox, c.position) AS azimuth) a
+  CROSS JOIN LATERAL sr_box_cam_envelope(o.bbox, c.position, a.azimuth) AS e
+  WHERE c.id = p_camera_id
+    AND NOT EXISTS (
+      SELECT 1
+      FROM camera_object_geometry g
+      WHERE g.camera_id = p_camera_id AND g.object_id = p_object_id
+    )
+$$;
+
+-- Earlier versions gave the cameras without a view direction one pointing at
+-- the centre of the model
+DROP FUNCTION IF EXISTS sr_derive_view_azimuth(integer);
+
+-- Keep the rows of a camera in step with its position and view cone
+CREATE OR REPLACE FUNCTION sr_camera_geometry_trigger()
+RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+  IF TG_OP = 'DELETE' THEN
+    DELETE FROM camera_object_geometry WHERE camera_id = OLD.id;
+  ELSE
+    PERFORM sr_refresh_camera_geometry(NEW.id);
+  END IF;
+  RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS camera_geometry_refresh ON camera;
+CREATE TRIGGER camera_geometry_refresh
+AFTER INSERT OR DELETE OR UPDATE OF position, fov, view_azimuth ON camera
+FOR EACH ROW EXECUTE FUNCTION sr_camera_geometry_trigger();
+
+-- Keep the rows of an object in step with its box: an edit of room_objects
+-- made after the ingest (or a partial re-ingest) would otherwise leave the
+-- directional templates reading the old geometry
+CREATE OR REPLACE FUNCTION sr_object_geometry_trigger()
+RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+  IF TG_OP = 'TRUNCATE' THEN
+    DELETE FROM camera_object_geometry;
+    RETURN NULL;
+  END IF;
+  IF TG_OP IN ('DELETE', 'UPDATE') THEN
+    DELETE FROM camera_object_geometry WHERE object_id = OLD.id;
+  END IF;
+  IF TG_OP IN ('INSERT', 'UPDATE') THEN
+    PERFORM sr_write_camera_geometry(NULL, NEW.id);
+  END IF;
+  RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS object_geometry_refresh ON room_objects;
+CREATE TRIGGER object_geometry_refresh
+AFTER INSERT OR DELETE OR UPDATE OF id, bbox ON room_objects
+FOR EACH ROW EXECUTE FUNCTION sr_object_geometry_trigger();
+
+DROP TRIGGER IF EXISTS object_geometry_truncate ON room_objects;
+CREATE TRIGGER object_geometry_truncate
+AFTER TRUNCATE ON room_objects
+FOR EACH STATEMENT EXECUTE FUNCTION sr_object_geometry_trigger();
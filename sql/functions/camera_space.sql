@@ -0,0 +1,151 @@
+﻿-- File: functions/camera_space.sql
+-- Closed-form camera-space geometry for the boxes stored in room_objects.
+--
+-- Every bbox is an axis-aligned ST_3DMakeBox, so rotating it about the
+-- camera only needs its 4 footprint corners, its Z-range and the azimuth:
+-- the envelope and the corners follow analytically instead of translating
+-- and rotating all vertices of the surface.  The rotation is the one
+-- ST_Rotate applies (counter-clockwise by theta about the camera):
+--   x' = dx·cos θ − dy·sin θ
+--   y' = dx·sin θ + dy·cos θ
+-- with (dx, dy) the offset of a point from the camera position.
+--
+-- Python counterpart: spatial_engine/geometry.py.  Installed by
+-- db_utils.install_sql_functions().
+
+-- Azimuth from the camera to the footprint centre of the box, as
+-- ST_Azimuth(cam, ST_Centroid(bbox)); NULL when both coincide.
+CREATE OR REPLACE FUNCTION sr_box_azimuth(bbox geometry, cam geometry)
+RETURNS double precision
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+  SELECT CASE
+           WHEN d.dx = 0 AND d.dy = 0 THEN NULL
+           WHEN atan2(d.dx, d.dy) < 0 THEN atan2(d.dx, d.dy) + 2 * pi()
+           ELSE atan2(d.dx, d.dy)
+         END
+  FROM (
+    SELECT
+      (ST_XMin(bbox) + ST_XMax(bbox)) / 2 - ST_X(cam) AS dx,
+      (ST_YMin(bbox) + ST_YMax(bbox)) / 2 - ST_Y(cam) AS dy
+  ) d
+$$;
+
+-- 2D envelope of the box in camera space rotated by theta
+-- (same as ST_Envelope(ST_Rotate(ST_Translate(bbox, -cam), theta))).
+CREATE OR REPLACE FUNCTION sr_box_cam_envelope(
+  bbox  geometry,
+  cam   geometry,
+  theta double precision,
+  OUT minx double precision,
+  OUT maxx double precision,
+  OUT miny double precision,
+  OUT maxy double precision
+)
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+  SELECT r.cx - r.ex, r.cx + r.ex, r.cy - r.ey, r.cy + r.ey
+  FROM (
+    SELECT
+      b.dx * cos(theta) - b.dy * sin(theta)                  AS cx,
+      b.dx * sin(theta) + b.dy * cos(theta)                  AS cy,
+      abs(cos(theta)) * b.hx + abs(sin(theta)) * b.hy        AS ex,
+      abs(sin(theta)) * b.hx + abs(cos(theta)) * b.hy        AS ey
+    FROM (
+      SELECT
+        (ST_XMin(bbox) + ST_XMax(bbox)) / 2 - ST_X(cam)     AS dx,
+        (ST_YMin(bbox) + ST_YMax(bbox)) / 2 - ST_Y(cam)     AS dy,
+        (ST_XMax(bbox) - ST_XMin(bbox)) / 2                 AS hx,
+        (ST_YMax(bbox) - ST_YMin(bbox)) / 2                 AS hy
+    ) b
+  ) r
+$$;
+
+-- The 8 corners of the box in camera space rotated by theta: the 4 rotated
+-- footprint corners at the world Z-min and Z-max (Z is never rotated).
+-- These are the distinct points ST_DumpPoints returns for the rotated box.
+CREATE OR REPLACE FUNCTION sr_box_cam_corners(
+  bbox  geometry,
+  cam   geometry,
+  theta double precision
+)
+RETURNS TABLE (x double precision, y double precision, z double precision)
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+  SELECT
+    (f.px - ST_X(cam)) * cos(theta) - (f.py - ST_Y(cam)) * sin(theta),
+    (f.px - ST_X(cam)) * sin(theta) + (f.py - ST_Y(cam)) * cos(theta),
+    h.pz
+  FROM (
+    VALUES
+      (ST_XMin(bbox), ST_YMin(bbox)),
+      (ST_XMax(bbox), ST_YMin(bbox)),
+      (ST_XMax(bbox), ST_YMax(bbox)),
+      (ST_XMin(bbox), ST_YMax(bbox))
+  ) AS f(px, py)
+  CROSS JOIN (
+    VALUES (ST_ZMin(bbox)), (ST_ZMax(bbox))
+  ) AS h(pz)
+$$;
+
+-- Whether the box lies (at least partly) in the horizontal view cone of a
+-- camera looking along view_azimuth with a field of view of fov degrees.
+-- Conservative: the cone is widened by the largest angle a footprint corner
+-- makes with the direction of the box centre, so a visible box is never
+-- dropped.  TRUE when the direction or fov is unknown, when fov >= 360 and
+-- when the camera stands over the box.
+CREATE OR REPLACE FUNCTION sr_box_in_view(
+  bbox         geometry,
+  cam          geometry,
+  view_azimuth double precision,
+  fov          double precision
+)
+RETURNS boolean
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+  SELECT CASE
+           WHEN view_azimuth IS NULL OR fov IS NULL OR fov >= 360 THEN TRUE
+           WHEN a.theta IS NULL THEN TRUE
+           ELSE abs(atan2(sin(a.theta - view_azimuth), cos(a.theta - view_azimuth)))
+                <= radians(fov) / 2
+                   + (SELECT max(abs(atan2(c.x, c.y)))
+                      FROM sr_box_cam_corners(bbox, cam, a.theta) AS c)
+         END
+  FROM (SELECT sr_box_azimuth(bbox, cam) AS theta) a
+$$;
+
+-- World-space 3D bounding box (as a geometry, for the &&& index operator) of
+-- the camera-space box [x_lo, x_hi] × [y_lo, y_hi] × [z_lo, z_hi] of a camera
+-- rotated by theta, i.e. the index box of a directional prism.
+CREATE OR REPLACE FUNCTION sr_cam_box_world_bbox(
+  cam   geometry,
+  theta double precision,
+  x_lo  double precision,
+  x_hi  double precision,
+  y_lo  double precision,
+  y_hi  double precision,
+  z_lo  double precision,
+  z_hi  double precision,
+  srid  integer
+)
+RETURNS geometry
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+  SELECT ST_SetSRID(
+           ST_3DMakeBox(
+             ST_MakePoint(w.cx - w.ex, w.cy - w.ey, z_lo),
+             ST_MakePoint(w.cx + w.ex, w.cy + w.ey, z_hi)
+           )::geometry,
+           srid
+         )
+  FROM (
+    SELECT
+      -- inverse of the camera rotation: x = x'·cos θ + y'·sin θ, y = −x'·sin θ + y'·cos θ
+      ST_X(cam) + b.mx * cos(theta) + b.my * sin(theta)   AS cx,
+      ST_Y(cam) - b.mx * sin(theta) + b.my * cos(theta)   AS cy,
+      abs(cos(theta)) * b.hx + abs(sin(theta)) * b.hy      AS ex,
+      abs(sin(theta)) * b.hx + abs(cos(theta)) * b.hy      AS ey
+    FROM (
+      SELECT
+        (x_lo + x_hi) / 2 AS mx,
+        (y_lo + y_hi) / 2 AS my,
+        (x_hi - x_lo) / 2 AS hx,
+        (y_hi - y_lo) / 2 AS hy
+    ) b
+  ) w
+$$;
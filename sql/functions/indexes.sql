@@ -0,0 +1,7 @@
+﻿-- File: functions/indexes.sql
+-- Spatial index used by the one-to-many templates in sql/many: an n-D GiST
+-- index, so ST_3DDWithin and the 3D box operators (&&&) filter room_objects
+-- through the index instead of a sequential scan.
+
+CREATE INDEX IF NOT EXISTS room_objects_bbox_nd
+  ON room_objects USING GIST (bbox gist_geometry_ops_nd);
@@ -0,0 +1,81 @@
+﻿-- File: many/behind.sql
+-- One-to-many form of behind.sql: every object behind the reference
+-- object X, in a single query.  The behind prism of X is built once from
+-- camera_object_geometry; its world-space bounding box looks the candidates
+-- up through the n-D GiST index on room_objects.bbox (&&&), and only those
+-- are tested corner by corner exactly as exists/behind.sql does.
+-- Parameters:
+--   1. object_x_id: The reference object ID.
+--   2. camera_id: The camera ID.
+--   3. s: The half-space scale factor.
+--   4. tol: The XY/Z padding tolerance.
+-- Returns one (object_id) row per object Y behind X.
+
+WITH params AS (
+  SELECT
+    CAST(%s AS INTEGER)          AS object_x_id,
+    CAST(%s AS INTEGER)          AS camera_id,
+    CAST(%s AS DOUBLE PRECISION) AS s,
+    CAST(%s AS DOUBLE PRECISION) AS tol
+),
+-- 1. Camera
+cam AS (
+  SELECT position
+  FROM camera
+  WHERE id = (SELECT camera_id FROM params)
+),
+-- 2. Object X in camera space (sr_camera_geometry)
+env AS (
+  SELECT
+    g.azimuth  AS rot_angle,
+    g.cam_minx AS minx,
+    g.cam_maxx AS maxx,
+    g.cam_miny AS miny,
+    g.cam_maxy AS maxy,
+    g.w_minz,
+    g.w_maxz
+  FROM params
+  CROSS JOIN LATERAL sr_camera_geometry(params.camera_id, params.object_x_id) AS g
+),
+-- 3. behind-halfspace: extruded away from the camera by s × depth (≤ 5.0),
+--    padded by tol on the two other axes
+prism AS (
+  SELECT
+    env.rot_angle,
+    env.maxy                                                                 AS y_lo,
+    env.maxy + LEAST(params.s * (env.maxy - env.miny), 5.0)                  AS y_hi,
+    env.minx - params.tol                                                    AS x_lo,
+    env.maxx + params.tol                                                    AS x_hi,
+    env.w_minz - params.tol                                                  AS z_lo,
+    env.w_maxz + params.tol                                                  AS z_hi
+  FROM env
+  CROSS JOIN params
+),
+-- 4. World-space index box of the prism
+index_box AS (
+  SELECT sr_cam_box_world_bbox(
+           cam.position, prism.rot_angle,
+           prism.x_lo, prism.x_hi, prism.y_lo, prism.y_hi, prism.z_lo, prism.z_hi,
+           ST_SRID(x.bbox)
+         ) AS box
+  FROM cam
+  CROSS JOIN prism
+  CROSS JOIN params
+  JOIN room_objects x ON x.id = params.object_x_id
+)
+-- 5. Candidates from the index, kept if ANY corner lies in the prism
+SELECT o.id AS object_id
+FROM index_box
+JOIN room_objects o ON o.bbox &&& index_box.box
+CROSS JOIN params
+CROSS JOIN cam
+CROSS JOIN prism
+WHERE o.id <> params.object_x_id
+  AND EXISTS (
+    SELECT 1
+    FROM sr_box_cam_corners(o.bbox, cam.position, prism.rot_angle) AS c
+    WHERE c.y BETWEEN prism.y_lo AND prism.y_hi
+      AND c.x BETWEEN prism.x_lo AND prism.x_hi
+      AND c.z BETWEEN prism.z_lo AND prism.z_hi
+  )
+ORDER BY o.id;
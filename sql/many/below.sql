@@ -0,0 +1,80 @@
+﻿-- File: many/below.sql
+-- One-to-many form of below.sql seen from the tested object: every object X
+-- that the reference object Y is below, in a single query.  This is the
+-- direction run_spatial_call uses for above/below (the prism belongs to
+-- b_id, the object tested against it is a_id).  The prisms of all candidates
+-- come from camera_object_geometry; a Z-range test drops the candidates
+-- whose prism cannot reach Y before the corners of Y are tested exactly as
+-- exists/below.sql does.
+-- Parameters:
+--   1. object_y_id: The reference object ID (the object that is below).
+--   2. camera_id: The camera ID.
+--   3. s: The half-space scale factor.
+--   4. tol: The XY/Z padding tolerance.
+-- Returns one (object_id) row per object X such that Y is below X.
+
+WITH params AS (
+  SELECT
+    CAST(%s AS INTEGER)          AS object_y_id,
+    CAST(%s AS INTEGER)          AS camera_id,
+    CAST(%s AS DOUBLE PRECISION) AS s,
+    CAST(%s AS DOUBLE PRECISION) AS tol
+),
+-- 1. Camera
+cam AS (
+  SELECT position
+  FROM camera
+  WHERE id = (SELECT camera_id FROM params)
+),
+-- 2. Reference Y and its world Z-range
+ref AS (
+  SELECT o.bbox, ST_ZMin(o.bbox) AS zmin, ST_ZMax(o.bbox) AS zmax
+  FROM room_objects o
+  JOIN params ON o.id = params.object_y_id
+),
+-- 3. Every other object X in camera space (sr_camera_geometry)
+env AS (
+  SELECT
+    o.id       AS object_id,
+    g.azimuth  AS rot_angle,
+    g.cam_minx AS minx,
+    g.cam_maxx AS maxx,
+    g.cam_miny AS miny,
+    g.cam_maxy AS maxy,
+    g.w_minz,
+    g.w_maxz
+  FROM room_objects o
+  JOIN params ON o.id <> params.object_y_id
+  CROSS JOIN LATERAL sr_camera_geometry(params.camera_id, o.id) AS g
+),
+-- 4. below-halfspace: extruded downwards by s × height (height clamped to ≥ tol),
+--    padded by tol on the two other axes
+prism AS (
+  SELECT
+    env.object_id,
+    env.rot_angle,
+    env.w_minz - params.s * GREATEST(env.w_maxz - env.w_minz, params.tol)    AS z_lo,
+    env.w_minz                                                               AS z_hi,
+    env.minx - params.tol                                                    AS x_lo,
+    env.maxx + params.tol                                                    AS x_hi,
+    env.miny - params.tol                                                    AS y_lo,
+    env.maxy + params.tol                                                    AS y_hi
+  FROM env
+  CROSS JOIN params
+)
+-- 5. Keep X if ANY corner of Y lies in its prism (corners sit at Y's Z-min
+--    and Z-max, so Y's Z-range must overlap the prism's first)
+SELECT prism.object_id
+FROM prism
+CROSS JOIN ref
+CROSS JOIN cam
+WHERE ref.zmax >= prism.z_lo
+  AND ref.zmin <= prism.z_hi
+  AND EXISTS (
+    SELECT 1
+    FROM sr_box_cam_corners(ref.bbox, cam.position, prism.rot_angle) AS c
+    WHERE c.z BETWEEN prism.z_lo AND prism.z_hi
+      AND c.x BETWEEN prism.x_lo AND prism.x_hi
+      AND c.y BETWEEN prism.y_lo AND prism.y_hi
+  )
+ORDER BY prism.object_id;
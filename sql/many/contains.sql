@@ -0,0 +1,53 @@
+﻿-- File: many/contains.sql
+-- Batched form of contains.sql: containment ratio of every A in every B for
+-- two sets of ids, in one query.  Pairs are pruned with the 3D bounding-box
+-- overlap operator (&&&, served by the n-D GiST index) and the six extents of
+-- each object are read once instead of once per pair.
+-- Params: 1) array of A ids (object1, the contained side)
+--         2) array of B ids (object2, the container side)
+-- Returns one (a_id, b_id, pct_contained) row per pair with a positive
+-- overlap volume, i.e. every pair contains.sql flags as contained.
+
+WITH p AS (
+  SELECT
+    %s::integer[] AS a_ids,
+    %s::integer[] AS b_ids
+),
+a AS (
+  SELECT
+    o.id, o.bbox,
+    ST_XMin(o.bbox) AS xmin, ST_XMax(o.bbox) AS xmax,
+    ST_YMin(o.bbox) AS ymin, ST_YMax(o.bbox) AS ymax,
+    ST_ZMin(o.bbox) AS zmin, ST_ZMax(o.bbox) AS zmax
+  FROM room_objects o
+  JOIN p ON o.id = ANY (p.a_ids)
+),
+b AS (
+  SELECT
+    o.id, o.bbox,
+    ST_XMin(o.bbox) AS xmin, ST_XMax(o.bbox) AS xmax,
+    ST_YMin(o.bbox) AS ymin, ST_YMax(o.bbox) AS ymax,
+    ST_ZMin(o.bbox) AS zmin, ST_ZMax(o.bbox) AS zmax
+  FROM room_objects o
+  JOIN p ON o.id = ANY (p.b_ids)
+),
+vols AS (
+  SELECT
+    a.id AS a_id,
+    b.id AS b_id,
+    GREATEST(0, LEAST(a.xmax, b.xmax) - GREATEST(a.xmin, b.xmin))
+      * GREATEST(0, LEAST(a.ymax, b.ymax) - GREATEST(a.ymin, b.ymin))
+      * GREATEST(0, LEAST(a.zmax, b.zmax) - GREATEST(a.zmin, b.zmin))  AS vol_i,
+    (a.xmax - a.xmin) * (a.ymax - a.ymin) * (a.zmax - a.zmin)          AS vol_x
+  FROM a
+  JOIN b
+    ON a.id <> b.id
+   AND a.bbox &&& b.bbox
+)
+SELECT
+  a_id,
+  b_id,
+  vol_i / vol_x AS pct_contained
+FROM vols
+WHERE vol_i > 0
+ORDER BY a_id, b_id;
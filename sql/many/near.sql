@@ -0,0 +1,31 @@
+﻿-- File: many/near.sql
+-- One-to-many form of near_far.sql for the "near" relation: every object
+-- closer than the threshold to a reference object, in a single query.
+-- Candidates come from the n-D GiST index on room_objects.bbox
+-- (ST_3DDWithin), the exact ST_3DDistance is then computed once per hit.
+-- Params: 1) reference object id,  2) near/far threshold
+-- Returns one (object_id, distance) row per near object, nearest first.
+
+WITH p AS (
+  SELECT
+    %s::integer            AS ref_id,
+    %s::double precision   AS threshold
+),
+ref AS (
+  SELECT r.bbox
+  FROM room_objects AS r
+  JOIN p ON r.id = p.ref_id
+)
+SELECT
+  o.id     AS object_id,
+  d.dist   AS distance
+FROM p
+CROSS JOIN ref
+JOIN room_objects AS o
+  ON o.id <> p.ref_id
+ AND ST_3DDWithin(o.bbox, ref.bbox, p.threshold)
+CROSS JOIN LATERAL (
+  SELECT ST_3DDistance(o.bbox, ref.bbox) AS dist
+) AS d
+WHERE d.dist < p.threshold
+ORDER BY d.dist, o.id;
@@ -0,0 +1,156 @@
+﻿import threading
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("psycopg2")
+
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_INTRANS
+
+import db_utils
+from db_utils import (
+    DIRECTIONAL_TEMPLATES,
+    SQL_DIR,
+    SQL_FUNCTION_FILES,
+    SQL_FUNCTIONS_DIR,
+    TEMPLATE_MODE_DIRS,
+    template_file,
+)
+
+TEMPLATE_FILES = [f"{name}.sql" for name in sorted(DIRECTIONAL_TEMPLATES)] + ["touches.sql", "near_far.sql", "contains.sql"]
+
+
+@pytest.mark.parametrize("mode", sorted(TEMPLATE_MODE_DIRS))
+@pytest.mark.parametrize("fname", TEMPLATE_FILES)
+def test_every_template_resolves_to_a_file_in_every_mode(mode, fname):
+    assert template_file(mode, fname).is_file()
+
+
+def test_exists_mode_falls_back_to_flags():
+    assert template_file("exists", "front.sql") == SQL_DIR / "exists" / "front.sql"
+    assert template_file("exists", "near_far.sql") == SQL_DIR / "flags" / "near_far.sql"
+    assert template_file("flags", "touches.sql") == SQL_DIR / "flags" / "touches.sql"
+    assert template_file("text", "touches.sql") == SQL_DIR / "touches.sql"
+
+
+def test_a_missing_template_is_not_looked_up_outside_the_fallback_chain():
+    # the text templates are not part of the exists -> flags chain
+    assert template_file("exists", "missing.sql") == SQL_DIR / "flags" / "missing.sql"
+    assert template_file("text", "missing.sql") == SQL_DIR / "missing.sql"
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        self.conn.executed.append(query)
+
+    def fetchall(self):
+        return self.conn.rows
+
+
+class FakeConnection:
+    def __init__(self, rows=()):
+        self.executed, self.rows, self.commits, self.rollbacks = [], list(rows), 0, 0
+        self.closed = 0
+        self.info = SimpleNamespace(dbname="room5", transaction_status=TRANSACTION_STATUS_IDLE)
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.info.transaction_status = TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+
+def test_connecting_does_not_touch_the_schema(monkeypatch):
+    conn = FakeConnection()
+    monkeypatch.setattr(db_utils.psycopg2, "connect", lambda **kwargs: conn)
+    assert db_utils.get_connection("room5") is conn
+    assert conn.executed == [] and conn.commits == 0
+
+
+def test_install_runs_every_function_file_in_order():
+    conn = FakeConnection()
+    db_utils.install_sql_functions(conn)
+    assert conn.executed == [db_utils.load_query(SQL_FUNCTIONS_DIR / f) for f in SQL_FUNCTION_FILES]
+    assert conn.commits == 1
+    assert sorted(SQL_FUNCTION_FILES) == sorted(p.name for p in SQL_FUNCTIONS_DIR.glob("*.sql"))
+
+
+def test_a_database_without_the_functions_is_reported():
+    conn = FakeConnection(rows=[(False,)])
+    with pytest.raises(RuntimeError, match="python db_utils.py room5"):
+        db_utils.ensure_camera_geometry(conn, 1)
+    assert len(conn.executed) == 1
+
+
+@pytest.fixture
+def connections(monkeypatch):
+    """Every FakeConnection psycopg2.connect() opened, in order."""
+    opened = []
+
+    def connect(**kwargs):
+        opened.append(FakeConnection())
+        return opened[-1]
+
+    monkeypatch.setattr(db_utils.psycopg2, "connect", connect)
+    yield opened
+    db_utils.close_connection_pools()
+
+
+def test_pooled_connections_are_reused_and_rolled_back(connections):
+    db_utils.open_connection_pool(2, "room5")
+    assert len(connections) == 2
+    seen = set()
+    for _ in range(5):
+        with db_utils.borrow_connection("room5") as conn:
+            seen.add(id(conn))
+            conn.info.transaction_status = TRANSACTION_STATUS_INTRANS
+    assert len(connections) == 2 and seen <= {id(c) for c in connections}
+    assert sum(c.rollbacks for c in connections) == 5
+    # a connection the server dropped is replaced
+    connections[1].closed = connections[0].closed = 2
+    with db_utils.borrow_connection("room5") as conn:
+        assert not conn.closed and len(connections) == 3
+
+
+def test_borrowing_blocks_while_every_connection_is_in_use(connections):
+    db_utils.open_connection_pool(1, "room5")
+    held, borrowed = threading.Event(), []
+
+    def borrow():
+        with db_utils.borrow_connection("room5") as conn:
+            borrowed.append(conn)
+
+    with db_utils.borrow_connection("room5") as first:
+        waiter = threading.Thread(target=borrow)
+        waiter.start()
+        waiter.join(0.2)
+        assert waiter.is_alive() and borrowed == []
+    waiter.join(5)
+    assert borrowed == [first] and len(connections) == 1
+
+
+def test_closing_the_pools_closes_their_connections(connections):
+    db_utils.open_connection_pool(2, "room5")
+    with db_utils.borrow_connection("room5") as in_use:
+        db_utils.close_connection_pools()
+        assert all(c.closed for c in connections)
+    # no pool left: a connection of its own, closed after the block
+    with db_utils.borrow_connection("room5") as conn:
+        assert conn is connections[-1] and len(connections) == 3
+    assert conn.closed and in_use.closed
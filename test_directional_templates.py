@@ -0,0 +1,162 @@
+﻿"""
+The directional templates against their reference form (validation/reference_sql),
+which recomputes the camera-space geometry of X from room_objects on every
+call, on the same random scene.  Needs a PostGIS database: set SR_TEST_DSN,
+e.g. "dbname=sr_test user=postgres"; everything is created in a scratch
+schema dropped afterwards.
+"""
+import itertools
+import os
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+psycopg2 = pytest.importorskip("psycopg2")
+
+DSN = os.getenv("SR_TEST_DSN")
+if not DSN:
+    pytest.skip("SR_TEST_DSN is not set (a PostGIS database)", allow_module_level=True)
+
+from db_utils import (
+    MULTI_CAMERA_DIR,
+    TEMPLATE_MODE_DIRS,
+    install_sql_functions,
+    load_query,
+    run_directional_many,
+    run_query,
+    sql_functions_installed,
+)
+
+REFERENCE_DIR = Path(__file__).resolve().parent / "validation" / "reference_sql"
+DIRECTIONALS = ["front", "behind", "left", "right", "above", "below"]
+IDS = list(range(1, 13))
+PAIRS = list(itertools.permutations(IDS, 2))
+CAMERAS = [1, 2, 3]
+S, TOL = 5.0, 0.1
+
+
+@pytest.fixture(scope="module")
+def db():
+    conn = psycopg2.connect(DSN)
+    schema = f"sr_template_test_{os.getpid()}"
+    with conn.cursor() as cur:
+        cur.execute("CREATE EXTENSION IF NOT EXISTS postgis;")
+        cur.execute(f"CREATE SCHEMA {schema};")
+        cur.execute(f"SET search_path TO {schema}, public;")
+        cur.execute("""
+            CREATE TABLE camera (
+              id       INTEGER PRIMARY KEY,
+              position GEOMETRY(POINT, 4326),
+              fov      DOUBLE PRECISION
+            );
+            CREATE TABLE room_objects (
+              id           SERIAL PRIMARY KEY,
+              ifc_type     VARCHAR(200),
+              name         VARCHAR(200),
+              ifc_globalid VARCHAR(200),
+              bbox         GEOMETRY(MULTIPOLYGONZ, 4326)
+            );
+        """)
+    install_sql_functions(conn)
+
+    rng = np.random.default_rng(0)
+    lo = rng.uniform(0, 10, (len(IDS), 3))
+    lo[:, 2] = rng.uniform(0, 3, len(IDS))
+    hi = lo + rng.uniform(0.3, 3, (len(IDS), 3))
+    with conn.cursor() as cur:
+        # as BIMtoPostGre/main.py stores them; the triggers write the geometry rows
+        for i, (a, b) in enumerate(zip(lo.tolist(), hi.tolist()), 1):
+            cur.execute(
+                """
+                INSERT INTO room_objects (ifc_type, name, bbox)
+                VALUES ('IfcFurniture', %s, ST_CollectionExtract(
+                  ST_3DMakeBox(ST_MakePoint(%s, %s, %s), ST_MakePoint(%s, %s, %s)), 3
+                )::geometry(MULTIPOLYGONZ, 4326));
+                """,
+                (f"Object {i}", *a, *b)
+            )
+        for cam, (x, y) in zip(CAMERAS, [(-3.0, -4.0), (14.0, 5.0), (5.0, 16.0)]):
+            cur.execute(
+                "INSERT INTO camera (id, position, fov) VALUES (%s, ST_SetSRID(ST_MakePoint(%s, %s), 4326), 60);",
+                (cam, x, y)
+            )
+        # rows the templates have to compute on the fly
+        cur.execute("DELETE FROM camera_object_geometry WHERE camera_id = 2 AND object_id IN (3, 7);")
+    conn.commit()
+    yield conn
+
+    conn.rollback()
+    with conn.cursor() as cur:
+        cur.execute(f"DROP SCHEMA {schema} CASCADE;")
+    conn.commit()
+    conn.close()
+
+
+def reference_flag(conn, rel, x_id, y_id, camera_id):
+    return run_query(conn, load_query(REFERENCE_DIR / f"{rel}.sql"), (x_id, y_id, camera_id, S, TOL))[0][3]
+
+
+def test_the_schema_is_installed(db):
+    assert sql_functions_installed(db)
+    assert run_query(db, "SELECT count(*) FROM camera_object_geometry;")[0][0] == len(IDS) * len(CAMERAS) - 2
+
+
+@pytest.mark.parametrize("rel", DIRECTIONALS)
+def test_single_camera_templates_match_the_reference(db, rel):
+    reference = load_query(REFERENCE_DIR / f"{rel}.sql")
+    templates = {mode: load_query(TEMPLATE_MODE_DIRS[mode] / f"{rel}.sql") for mode in ("text", "flags", "exists")}
+    held = 0
+    for camera_id in CAMERAS:
+        for x_id, y_id in PAIRS:
+            params = (x_id, y_id, camera_id, S, TOL)
+            (expected,) = run_query(db, reference, params)
+            (text,) = run_query(db, templates["text"], params)
+            (flags,) = run_query(db, templates["flags"], params)
+            (exists,) = run_query(db, templates["exists"], params)
+            for row in (text, flags):
+                np.testing.assert_allclose([float(v) for v in row[:3]], [float(v) for v in expected[:3]], atol=1e-9)
+            assert text[3:] == expected[3:]
+            assert flags[3] == exists[0] == expected[3]
+            held += expected[3]
+    assert held
+
+
+@pytest.mark.parametrize("rel", DIRECTIONALS)
+def test_multi_camera_templates_match_the_reference(db, rel):
+    template = load_query(MULTI_CAMERA_DIR / f"{rel}.sql")
+    for x_id, y_id in PAIRS:
+        flags = dict(run_query(db, template, (x_id, y_id, CAMERAS, S, TOL)))
+        assert flags == {cam: reference_flag(db, rel, x_id, y_id, cam) for cam in CAMERAS}
+
+
+@pytest.mark.parametrize("rel", DIRECTIONALS)
+def test_one_to_many_templates_match_the_reference(db, rel):
+    for camera_id in CAMERAS:
+        for ref_id in IDS:
+            others = [i for i in IDS if i != ref_id]
+            if rel in ("above", "below"):
+                # the prism belongs to the candidate, as in run_spatial_call
+                expected = {x for x in others if reference_flag(db, rel, x, ref_id, camera_id)}
+            else:
+                expected = {y for y in others if reference_flag(db, rel, ref_id, y, camera_id)}
+            assert run_directional_many(db, rel, ref_id, camera_id, S, TOL) == expected
+
+
+def test_a_missing_geometry_row_is_computed_as_the_refresh_writes_it(db):
+    fallback = run_query(db, "SELECT * FROM sr_camera_geometry(2, 3);")
+    assert len(fallback) == 1
+    try:
+        run_query(db, "SELECT sr_refresh_camera_geometry(2);")
+        stored = run_query(
+            db,
+            """
+            SELECT azimuth, cam_minx, cam_maxx, cam_miny, cam_maxy, w_minz, w_maxz
+            FROM camera_object_geometry
+            WHERE camera_id = 2 AND object_id = 3;
+            """
+        )
+        np.testing.assert_allclose(stored, fallback)
+    finally:
+        db.rollback()
+    assert run_query(db, "SELECT * FROM sr_camera_geometry(2, 99);") == []
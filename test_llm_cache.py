@@ -0,0 +1,83 @@
+﻿import itertools
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("langchain_core")
+
+import llm_cache
+from llm_cache import CachedChatModel, ResponseCache, messages_key
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Strictly increasing time.time(), so last_used never ties."""
+    ticks = itertools.count(1)
+    monkeypatch.setattr(llm_cache.time, "time", lambda: float(next(ticks)))
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, clock):
+    cache = ResponseCache(tmp_path / "responses.sqlite", max_bytes=10)
+    cache.put("a", "m", "aaaa")
+    cache.put("b", "m", "bbbb")
+    assert cache.get("a") == "aaaa"         # "b" is now the least recently used
+    cache.put("c", "m", "cccc")
+    assert cache.get("b") is None
+    assert cache.get("a") == "aaaa" and cache.get("c") == "cccc"
+    assert cache.stats() == {"hits": 3, "misses": 1, "evictions": 1, "entries": 2, "bytes": 8}
+
+
+def test_an_entry_larger_than_the_store_is_not_kept(tmp_path, clock):
+    cache = ResponseCache(tmp_path / "responses.sqlite", max_bytes=4)
+    cache.put("a", "m", "aa")
+    cache.put("big", "m", "x" * 5)
+    assert cache.stats()["entries"] == 0
+    assert cache.stats()["evictions"] == 2
+
+
+def test_messages_key_depends_on_model_messages_and_arguments():
+    messages = [("system", "decompose"), ("human", "Is the chair near the desk?")]
+    assert messages_key("m1", messages) == messages_key("m1", list(messages))
+    assert messages_key("m1", messages) != messages_key("m2", messages)
+    assert messages_key("m1", messages) != messages_key("m1", messages[:1])
+    assert messages_key("m1", messages) != messages_key("m1", messages, temperature=0)
+
+
+class FakeClient:
+    model_name = "fake-model"
+
+    def __init__(self, delay=0.0):
+        self.calls = 0
+        self.delay = delay
+        self._lock = threading.Lock()
+
+    def invoke(self, messages, **kwargs):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        return llm_cache.AIMessage(content=f"answer to {messages[-1][1]}")
+
+
+def test_cached_chat_model_replays_responses(tmp_path):
+    client = FakeClient()
+    model = CachedChatModel(client, ResponseCache(tmp_path / "responses.sqlite", max_bytes=1 << 20))
+    first = model.invoke([("human", "q1")])
+    second = model.invoke([("human", "q1")])
+    model.invoke([("human", "q1")], model="other-model")
+    assert first.content == second.content == "answer to q1"
+    assert client.calls == 2
+    assert model.model_name == "fake-model"     # passed through to the client
+
+
+def test_concurrent_identical_prompts_call_the_api_once(tmp_path):
+    client = FakeClient(delay=0.05)
+    model = CachedChatModel(client, ResponseCache(tmp_path / "responses.sqlite", max_bytes=1 << 20))
+    prompts = [[("human", f"q{i % 2}")] for i in range(8)]
+    threads = [threading.Thread(target=model.invoke, args=(p,)) for p in prompts]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert client.calls == 2
+    assert model.cache.stats()["hits"] + model.cache.stats()["misses"] == 8
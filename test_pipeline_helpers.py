@@ -0,0 +1,225 @@
+﻿import inspect
+import io
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+for module in ("psycopg2", "langchain_openai", "dotenv"):
+    pytest.importorskip(module)
+
+import pipeline_helpers as ph
+from relation_results import RelationHit, RelationResults
+from spatial_engine.snapshot import ModelSnapshot
+
+
+def test_iter_pair_tiles_covers_the_grid_without_self_pairs():
+    a_ids, b_ids = [1, 2, 3, 4], [2, 3, 5]
+    tiles = list(ph.iter_pair_tiles(a_ids, b_ids, tile_size=4))
+    assert [len(t) for t in tiles] == [4, 4, 2]
+    expected = [(a, b) for a in a_ids for b in b_ids if a != b]
+    assert [pair for tile in tiles for pair in tile] == expected
+
+
+def test_iter_pair_tiles_edge_cases():
+    assert list(ph.iter_pair_tiles([], [1, 2])) == []
+    assert list(ph.iter_pair_tiles([1], [1])) == []
+    assert list(ph.iter_pair_tiles([1, 2], [1, 2], tile_size=1)) == [[(1, 2)], [(2, 1)]]
+    with pytest.raises(ValueError):
+        list(ph.iter_pair_tiles([1], [2], tile_size=0))
+
+
+def test_iter_pair_tiles_is_lazy():
+    def references():
+        yield 1
+        raise AssertionError("the second reference was read before the first tile was used")
+
+    tiles = ph.iter_pair_tiles(references(), [2, 3], tile_size=2)
+    assert next(tiles) == [(1, 2), (1, 3)]
+
+
+@pytest.mark.parametrize("tpl_name, text_row, flags_row, held, metric", [
+    ("touches", (True, "A touches B"), (True,), True, None),
+    ("front", (1.0, 2.0, 3.0, True, "A is in front of B"), (1.0, 2.0, 3.0, True), True, None),
+    ("left", (1.0, 2.0, 3.0, False, None), (1.0, 2.0, 3.0, False), False, None),
+    ("near", ("A is near B", 0.4, True, False), (0.4, True, False), True, 0.4),
+    ("far", ("A is near B", 0.4, True, False), (0.4, True, False), False, None),
+    ("contains", (True, 0.75, "A is contained 0.750 in B"), (True, 0.75), True, 0.75),
+])
+def test_flag_rows_give_the_outcome_of_text_rows(tpl_name, text_row, flags_row, held, metric):
+    text_held, text_metric, text = ph._interpret_spatial_rows(tpl_name, [text_row], "text")
+    flags_held, flags_metric, no_text = ph._interpret_spatial_rows(tpl_name, [flags_row], "flags")
+    assert (text_held, text_metric) == (flags_held, flags_metric) == (held, metric)
+    assert no_text is None
+    assert (text is not None) == (held or tpl_name == "touches")
+
+
+@pytest.mark.parametrize("tpl_name", ["front", "behind", "left", "right", "above", "below"])
+def test_exists_rows_carry_the_flag_alone(tpl_name):
+    assert ph._interpret_spatial_rows(tpl_name, [(True,)], "exists") == (True, None, None)
+    assert ph._interpret_spatial_rows(tpl_name, [(False,)], "exists") == (False, None, None)
+    # templates without an EXISTS variant are read with the flags layout
+    assert ph._interpret_spatial_rows("near", [(0.4, True, False)], "exists") == (True, 0.4, None)
+
+
+def test_composed_relations_keep_their_text_in_every_mode():
+    for mode in ("text", "flags", "exists"):
+        assert ph._interpret_spatial_rows("on_top_of", [(True, "A is on top of B")], mode) == (True, None, "A is on top of B")
+    assert ph._interpret_spatial_rows("near", [], "flags") == (False, None, None)
+
+
+CATALOGUE = {1: ("IfcDoor", "Door"), 2: ("IfcWall", "Wall"), 3: ("IfcWindow", "Window")}
+SUMMARY_PLAN = {"plans": [
+    {"check_index": 0, "relation_text": "door near wall",
+     "reference": {"type": "udt", "reference_ifc_types": ["doors"]},
+     "against": {"type": "udt", "against_ifc_types": ["walls"]},
+     "templates": [{"template": "near"}, {"template": "contains"}]},
+    {"check_index": 1, "relation_text": "anything above the window",
+     "reference": {"type": "any"}, "against": {"type": "any"},
+     "templates": [{"template": "above"}]},
+]}
+SUMMARY_UDTS = {"doors": [1], "walls": [2]}
+
+
+def test_plan_summaries_are_emitted_as_each_check_closes():
+    consumed = []
+
+    def hits():
+        for hit in (RelationHit(0, "near", 1, 2, metric=0.3), RelationHit(1, "above", 3, 1), RelationHit(1, "above", 3, 2)):
+            consumed.append(hit)
+            yield hit
+
+    sink = RelationResults(CATALOGUE)
+    summaries = ph.iter_plan_summaries(SUMMARY_PLAN, hits(), SUMMARY_UDTS, CATALOGUE, sink=sink)
+    chk, block = next(summaries)
+    # check 0 is closed by the first hit of check 1, before the rest is read
+    assert chk == 0 and len(consumed) == 2
+    assert block.splitlines() == [
+        'Plan 0 ("door near wall"): tested [near, contains] against walls instances',
+        "  • Door (ID:1):",
+        "      – near: Wall (ID:2)",
+        "      – contains: none",
+    ]
+    chk, block = next(summaries)
+    assert chk == 1 and block.splitlines()[1:] == [
+        "  • Window (ID:3):",
+        "      – Is above: Door (ID:1), Wall (ID:2)",
+    ]
+    assert list(summaries) == [] and len(sink) == 3
+
+
+def test_plan_summaries_cover_checks_without_results():
+    blocks = list(ph.iter_plan_summaries(SUMMARY_PLAN, iter([]), SUMMARY_UDTS, CATALOGUE))
+    assert [chk for chk, _ in blocks] == [0, 1]
+    assert "      – near: No relation with walls instances" in blocks[0][1].splitlines()
+    assert blocks[1][1].splitlines() == ['Plan 1 ("anything above the window"): tested [above] against any object instances']
+
+
+def test_culled_references_are_reported_as_not_visible():
+    plan = {"plans": [
+        {"check_index": 0, "relation_text": "door left of wall",
+         "reference": {"type": "udt", "reference_ifc_types": ["doors"]},
+         "against": {"type": "udt", "against_ifc_types": ["walls"]},
+         "templates": [{"template": "left"}, {"template": "near"}]},
+    ]}
+    blocks = list(ph.iter_plan_summaries(plan, iter([]), SUMMARY_UDTS, CATALOGUE, culled={0: {1}}, camera_ids=[1]))
+    assert blocks[0][1].splitlines()[1:] == [
+        "  • Door (ID:1):",
+        "      – left: not visible from camera 1",
+        "      – near: No relation with walls instances",
+    ]
+    blocks = ph.summarize_plan_results_to_list(plan, [], SUMMARY_UDTS, CATALOGUE, culled={0: {1}}, camera_ids=[1, 2])
+    assert "      – left: not visible from cameras 1, 2" in blocks[0].splitlines()
+
+
+def test_only_directional_templates_are_culled():
+    entry = {"reference": {"reference_ifc_types": ["doors", "walls"]}, "against": {}}
+    culled = set()
+    for tpl in ("front", "near"):
+        tmpl = {"template": tpl, "a_source": "reference_ifc_types", "b_source": "any_nearby"}
+        a_ids, b_ids = ph._expand_template_ids(entry, tmpl, [1, 2, 3], SUMMARY_UDTS, {1, 3}, io.StringIO(), culled)
+        assert (a_ids, b_ids) == (([1], [1, 3]) if tpl == "front" else ([1, 2], [1, 2, 3]))
+    assert culled == {2}
+    # culling is opt-in
+    for func in (ph.iter_spatial_results, ph.execute_spatial_calls):
+        assert inspect.signature(func).parameters["fov_culling"].default is False
+
+
+def test_plan_summaries_reject_results_out_of_plan_order():
+    hits = [RelationHit(1, "above", 3, 1), RelationHit(0, "near", 1, 2)]
+    with pytest.raises(ValueError):
+        list(ph.iter_plan_summaries(SUMMARY_PLAN, hits, SUMMARY_UDTS, CATALOGUE))
+
+
+def test_list_summaries_accept_legacy_records_in_any_order():
+    hits = [RelationHit(1, "above", 3, 2), RelationHit(0, "near", 1, 2, metric=0.3), RelationHit(1, "above", 3, 1)]
+    store = RelationResults(CATALOGUE)
+    for hit in hits:
+        store.append_hit(hit)
+    streamed = [block for _, block in ph.iter_plan_summaries(
+        SUMMARY_PLAN, sorted(hits, key=lambda h: h.check_index), SUMMARY_UDTS, CATALOGUE
+    )]
+    assert ph.summarize_plan_results_to_list(SUMMARY_PLAN, store, SUMMARY_UDTS, CATALOGUE) == streamed
+    assert ph.summarize_plan_results_to_list(SUMMARY_PLAN, store.to_records(), SUMMARY_UDTS, CATALOGUE) == streamed
+
+
+def test_graph_pairs_carry_the_text_mode_relation_text():
+    boxes = np.array([[0, 0, 0, 1, 1, 1], [1, 0, 0, 2, 1, 1], [2.5, 0, 0, 3, 1, 1]], dtype=float)
+    snapshot = ModelSnapshot([1, 2, 3], boxes)
+    graph = ph.AdjacencyGraph.build(snapshot, 1.0)
+    held = list(ph._evaluate_from_graph(graph, snapshot, "near", [1, 2], [1, 2, 3], True, io.StringIO(), CATALOGUE))
+    assert [(a, b, text) for a, b, _, text, _, _ in held] == [
+        (1, 2, "Door (ID:1) is near Wall (ID:2)"),
+        (2, 1, "Wall (ID:2) is near Door (ID:1)"),
+        (2, 3, "Wall (ID:2) is near Window (ID:3)"),
+    ]
+    not_held = list(ph._evaluate_from_graph(graph, snapshot, "touches", [1], [1, 2, 3], False, io.StringIO(), CATALOGUE))
+    assert [(b, text) for _, b, _, text, _, _ in not_held] == [(3, "Door (ID:1) touches Window (ID:3)")]
+    # flags / exists modes leave the text to the summary
+    assert all(
+        text is None
+        for *_, text, _, _ in ph._evaluate_from_graph(graph, snapshot, "near", [1], [2, 3], True, io.StringIO())
+    )
+
+
+def small_model(n=120, seed=0):
+    rng = np.random.default_rng(seed)
+    lo = rng.uniform(0, 15, (n, 3))
+    lo[:, 2] = rng.choice([0.0, 1.0, 2.0], n)
+    boxes = np.hstack([lo, lo + rng.uniform(0.2, 2, (n, 3))])
+    types = ["IfcWall" if i % 2 else "IfcDoor" for i in range(n)]
+    return ModelSnapshot(range(1, n + 1), boxes, {1: (7.5, -3.0, 60, None), 2: (20.0, 20.0, None, None)}, types)
+
+
+@pytest.mark.parametrize("relation_engine", ["profile", "matrix"])
+def test_sharded_plan_yields_the_serial_order(monkeypatch, tmp_path, relation_engine):
+    snapshot = small_model()
+    ids = [int(i) for i in snapshot.ids]
+    udt_to_ids = {
+        "walls": [i for i, t in zip(ids, snapshot.ifc_types) if t == "IfcWall"],
+        "doors": [i for i, t in zip(ids, snapshot.ifc_types) if t == "IfcDoor"],
+    }
+    plan = {"plans": [
+        {"check_index": 0, "use_positive": True,
+         "reference": {"reference_ifc_types": ["walls"]}, "against": {"against_ifc_types": ["doors"]},
+         "templates": [{"template": t, "a_source": "reference_ifc_types", "b_source": "against_ifc_types"}
+                       for t in ("touches", "above", "near", "contains", "front", "on_top_of")]},
+        {"check_index": 1, "use_positive": False,
+         "reference": {"reference_ifc_types": ["doors"]}, "against": {},
+         "templates": [{"template": t, "a_source": "reference_ifc_types", "b_source": "any_nearby"}
+                       for t in ("touches", "left")]},
+    ]}
+    cameras = [1, 2]
+    evaluators = ph._build_evaluators(snapshot, relation_engine, cameras, 2, 0.2, 1.0, tmp_path / "snapshot.npz")
+    serial = list(ph._iter_plan_entries(
+        None, plan, ids, {}, io.StringIO(), udt_to_ids, 1, 2, 0.2, 1.0, ph.PAIR_TILE_SIZE, "text",
+        cameras, evaluators=evaluators
+    ))
+
+    monkeypatch.setattr(ph, "_SHARD_EVALUATORS", evaluators)
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        sharded = list(ph._iter_plan_entries_sharded(
+            executor, plan, ids, io.StringIO(), udt_to_ids, cameras, shard_size=7
+        ))
+    assert serial and {h.camera_id for h in serial} >= {1, 2}
+    assert sharded == serial
@@ -0,0 +1,84 @@
+﻿from relation_results import RelationHit, RelationResults, render_relation_text
+
+CATALOGUE = {
+    19: ("IfcDoor", "Door"),
+    42: ("IfcWall", "Wall"),
+    98: ("IfcFurniture", "Chair"),
+}
+
+
+def test_render_relation_text_follows_the_sql_phrasing():
+    assert render_relation_text("front", 19, 98, CATALOGUE) == "Object Chair (ID:98) is in front of object Door (ID:19)"
+    assert render_relation_text("above", 98, 19, CATALOGUE) == "Object Chair (ID:98) is above object Door (ID:19)"
+    assert render_relation_text("near", 98, 42, CATALOGUE) == "Chair (ID:98) is near Wall (ID:42)"
+    assert render_relation_text("contains", 98, 42, CATALOGUE, 0.5) == "Chair (ID:98) is contained 0.500 in Wall (ID:42)"
+    assert render_relation_text("contains", 98, 42, CATALOGUE) is None
+    assert render_relation_text("on_top_of", 98, 42, CATALOGUE) is None
+
+
+def test_records_round_trip():
+    records = [
+        {"check_index": 0, "template": "near", "a_id": 98, "a_name": "Chair", "a_type": "IfcFurniture",
+         "b_id": 42, "b_name": "Wall", "b_type": "IfcWall", "relation_value": "Chair is near Wall"},
+        {"check_index": 1, "template": "contains", "a_id": 19, "a_name": "Door", "a_type": "IfcDoor",
+         "b_id": 42, "b_name": "Wall", "b_type": "IfcWall", "relation_value": 0.25},
+        {"check_index": 1, "template": "leans_on", "a_id": 98, "a_name": "Chair", "a_type": "IfcFurniture",
+         "b_id": 42, "b_name": "Wall", "b_type": "IfcWall", "relation_value": "Chair leans on Wall",
+         "camera_id": 3},
+    ]
+    results = RelationResults.from_records(records, CATALOGUE)
+    assert len(results) == 3
+    assert results.metric_value(0) is None
+    assert results.camera_value(0) is None and results.camera_value(2) == 3
+    # the ratio is stored as a metric and rendered back through the phrase table
+    assert results.record(1)["relation_value"] == "Door (ID:19) is contained 0.250 in Wall (ID:42)"
+    assert [results.record(r) for r in (0, 2)] == [records[0], records[2]]
+
+
+def test_relation_value_is_rendered_lazily_for_held_rows_only():
+    results = RelationResults(CATALOGUE)
+    held = results.append(0, "left", 19, 98)
+    not_held = results.append(0, "left", 19, 42, metric=1.5, held=False)
+    assert results.relation_value(held) == "Object Chair (ID:98) is to the left of object Door (ID:19)"
+    assert results.relation_value(not_held) == 1.5
+
+
+def test_hits_round_trip_and_unknown_templates_get_new_codes():
+    results = RelationResults(CATALOGUE)
+    hits = [
+        RelationHit(0, "touches", 98, 42),
+        RelationHit(2, "custom_relation", 19, 98, text="Door custom Chair"),
+        RelationHit(2, "far", 19, 42, metric=7.0, held=False, camera_id=5),
+    ]
+    for hit in hits:
+        results.append_hit(hit)
+    assert list(results.iter_hits()) == hits
+    assert results.template(1) == "custom_relation"
+    assert results.check_indices() == [0, 2]
+
+
+def test_group_by_reference_respects_the_row_range():
+    results = RelationResults(CATALOGUE)
+    results.append(0, "near", 98, 42)
+    results.append(0, "near", 98, 19)
+    results.append(1, "near", 19, 42)
+    results.append(0, "far", 19, 42, metric=9.0)
+
+    groups, a_ids = results.group_by_reference(0)
+    assert a_ids == {98, 19}
+    assert [r["b_id"] for r in groups[(98, "near")]] == [42, 19]
+    assert len(groups[(19, "far")]) == 1
+
+    groups, a_ids = results.group_by_reference(0, start=1, stop=3)
+    assert a_ids == {98}
+    assert [r["b_id"] for r in groups[(98, "near")]] == [19]
+
+
+def test_clear_keeps_the_template_codes():
+    results = RelationResults(CATALOGUE)
+    results.append(0, "custom_relation", 19, 42, text="x")
+    results.clear()
+    assert len(results) == 0 and results.to_records() == []
+    row = results.append(1, "custom_relation", 19, 42)
+    assert results.template(row) == "custom_relation"
+    assert results.relation_value(row) is None
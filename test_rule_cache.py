@@ -0,0 +1,98 @@
+﻿import ast
+from pathlib import Path
+
+import pytest
+
+from rule_cache import ParaphraseCache, checks_key, compatible_rules, valid_decomposition, valid_plan
+
+RULE = "Are all portable fire extinguishers labelled clearly?"
+REWORDED = "Are portable fire extinguishers clearly labelled?"
+DECOMPOSITION = {"checks": [{"reference": "fire extinguisher", "relation": "labelled", "against": "label"}]}
+PLAN = {"plans": [{"check_index": 0, "templates": [{"template": "touches"}]}]}
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ParaphraseCache(tmp_path / "rules.sqlite", threshold=0.7)
+
+
+@pytest.mark.parametrize("a, b", [
+    (RULE, REWORDED),
+    ("Is the chair near the desk?", "Are the chairs near the desks?"),
+])
+def test_compatible_rules_accepts_reorderings_and_inflections(a, b):
+    assert compatible_rules(a, b)
+
+
+@pytest.mark.parametrize("a, b", [
+    ("Are flammable materials stored away from the heater?", "Are flammable materials stored near the heater?"),
+    ("Are fire extinguishers labelled?", "Are fire extinguishers not labelled?"),
+    ("Are fire extinguishers labelled?", "Fire extinguishers aren't labelled?"),
+])
+def test_compatible_rules_rejects_different_checks(a, b):
+    assert not compatible_rules(a, b)
+
+
+def test_decomposition_is_reused_for_a_rewording_only(cache):
+    assert cache.decomposition(RULE) is None
+    cache.store_decomposition(RULE, DECOMPOSITION)
+    assert cache.decomposition(RULE) == DECOMPOSITION
+    assert cache.decomposition(REWORDED) == DECOMPOSITION
+    assert cache.decomposition("Are portable fire extinguishers not labelled clearly?") is None
+    assert cache.stats() == {
+        "decomposition_hits": 2, "decomposition_misses": 2, "plan_hits": 0, "plan_misses": 0,
+        "rules": 1, "plans": 0,
+    }
+
+
+def gold_rule_versions():
+    """{check name: [rule text of versions A-E]} of the first model of validation/gold_standards.py."""
+    path = Path(__file__).resolve().parent / "validation" / "gold_standards.py"
+    tree = ast.parse(path.read_text(encoding="utf-8-sig"))
+    versions = [ast.literal_eval(node.value) for node in tree.body if isinstance(node, ast.Assign)][:5]
+    return {name: [v[name]["rule_text"] for v in versions if name in v] for name in versions[0]}
+
+
+def test_gold_paraphrases_reuse_an_entry_of_their_own_check_only(cache):
+    rules = gold_rule_versions()
+    for name, texts in rules.items():
+        cache.store_decomposition(texts[0], {"checks": [{"reference": name, "relation": "r", "against": "x"}]})
+    reused = set()
+    for name, texts in rules.items():
+        for version, text in zip("BCDE", texts[1:]):
+            found = cache.decomposition(text)
+            if found is not None:
+                assert found["checks"][0]["reference"] == name
+                reused.add((name, version))
+    assert {("extinguisher_check2", "B"), ("extinguisher_check3", "C")} <= reused
+
+
+def test_invalid_decomposition_is_not_stored(cache):
+    cache.store_decomposition(RULE, {"checks": [{"reference": "extinguisher"}]})
+    assert cache.stats()["rules"] == 0
+
+
+def test_plan_is_keyed_by_the_matched_rule_and_the_checks(cache, tmp_path):
+    enriched = [{"reference": "IfcFireSuppressionTerminal", "against": "IfcSign"}]
+    cache.store_decomposition(RULE, DECOMPOSITION)
+    cache.store_plan(REWORDED, enriched, PLAN, templates=["touches", "near"])
+    assert cache.plan(RULE, enriched) == PLAN
+    assert cache.plan(REWORDED, [{"reference": "IfcFireSuppressionTerminal", "against": "IfcWall"}]) is None
+    # the store survives a reopen
+    reopened = ParaphraseCache(tmp_path / "rules.sqlite", threshold=0.7)
+    assert reopened.plan(REWORDED, enriched) == PLAN
+    stats = cache.stats()
+    assert (stats["plan_hits"], stats["plan_misses"], stats["decomposition_hits"]) == (1, 1, 0)
+
+
+def test_plans_with_unknown_templates_are_rejected():
+    assert valid_plan(PLAN, ["touches"])
+    assert not valid_plan(PLAN, ["near"])
+    assert not valid_plan({"plans": [{"templates": "touches"}]}, ["touches"])
+    assert valid_decomposition(DECOMPOSITION)
+    assert not valid_decomposition({"checks": []})
+
+
+def test_checks_key_ignores_key_order():
+    assert checks_key({"a": 1, "b": [2]}) == checks_key({"b": [2], "a": 1})
+    assert checks_key({"a": 1}) != checks_key({"a": 2})